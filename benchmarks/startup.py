@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Benchmark package import time and time to first classification.
+
+Every sample runs in a fresh interpreter, the way short-lived batch jobs and
+config-validation hooks start. Without --model a backend that always picks the
+first option is used, which isolates the library's own startup cost.
+
+Usage:
+    python benchmarks/startup.py --config examples/tree_config.yaml --tree sentiment
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SAMPLE = r"""
+import json, sys, time
+start = time.perf_counter()
+import llm_tree_classifier
+imported = time.perf_counter()
+from llm_tree_classifier import LLMBackend, TreeClassifier
+from llm_tree_classifier.classifier import load_trees
+config, tree, model = sys.argv[1], sys.argv[2] or None, sys.argv[3] or None
+trees = load_trees(config)
+parsed = time.perf_counter()
+if model:
+    from llm_tree_classifier import LlamaCppBackend
+    llm = LlamaCppBackend(model)
+else:
+    class FirstOptionBackend(LLMBackend):
+        def get_response(self, prompt, valid_responses):
+            return valid_responses[0]
+    llm = FirstOptionBackend()
+classifier = TreeClassifier(config, llm, tree_name=tree)
+loaded = time.perf_counter()
+classifier.classify("The quick brown fox jumps over the lazy dog.")
+done = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "parse_s": parsed - imported,
+    "load_s": loaded - parsed,
+    "first_classification_s": done - loaded,
+}))
+"""
+
+IMPORT_ONLY = "import sys, llm_tree_classifier; print(int('llama_cpp' in sys.modules))"
+
+
+def run_sample(
+    config: Path, tree: Optional[str], model: Optional[Path]
+) -> Dict[str, float]:
+    """Run one cold start in a fresh interpreter.
+
+    Args:
+        config: Tree configuration
+        tree: Tree name
+        model: Optional model path
+
+    Returns:
+        Phase timings in seconds, including total process wall time
+    """
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", SAMPLE, str(config), tree or "", str(model or "")],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    ).stdout
+    wall = time.perf_counter() - start
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process_s"] = wall
+    return timings
+
+
+def summarize(samples: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """Summarize samples per phase.
+
+    Args:
+        samples: Timings from run_sample
+
+    Returns:
+        Median, minimum and maximum per phase
+    """
+    return {
+        key: {
+            "median": statistics.median(sample[key] for sample in samples),
+            "min": min(sample[key] for sample in samples),
+            "max": max(sample[key] for sample in samples),
+        }
+        for key in samples[0]
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark and print a JSON report.
+
+    Args:
+        argv: Command line arguments
+
+    Returns:
+        Exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--config", type=Path, default=ROOT / "examples" / "tree_config.yaml"
+    )
+    parser.add_argument("--tree", type=str, default="sentiment")
+    parser.add_argument(
+        "--model", type=Path, help="Use LlamaCppBackend with this model"
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", type=Path, help="Also write the report here")
+    args = parser.parse_args(argv)
+
+    heavy_import = subprocess.run(
+        [sys.executable, "-c", IMPORT_ONLY],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    ).stdout.strip()
+    samples = [
+        run_sample(args.config, args.tree, args.model) for _ in range(args.repeat)
+    ]
+    report = {
+        "python": sys.version.split()[0],
+        "model": str(args.model) if args.model else None,
+        "repeat": args.repeat,
+        "llama_cpp_loaded_on_import": heavy_import == "1",
+        "timings": summarize(samples),
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output is not None:
+        args.output.write_text(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Benchmark the traversal engine with a simulated backend.
+
+Runs synthetic trees of varying depth and fan-out through the single,
+batch, async and parallel classification paths and reports throughput,
+per-document latency, backend calls per document and peak memory. The
+simulated backend answers deterministically, so every path reaches the
+same labels and runs can be compared.
+
+Latency is the wall time of the call that produced a document's result:
+one classify call, the classify_batch call holding the document, or one
+aclassify task. It is not reported for the parallel path, where documents
+are chunked across processes. Peak memory is traced with tracemalloc in a
+separate pass without simulated latency, and only for in-process paths.
+
+Usage:
+    python benchmarks/traversal.py --output results.json
+    python benchmarks/traversal.py --baseline results.json
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from llm_tree_classifier import (  # noqa: E402
+    ParallelTreeClassifier,
+    SimulatedLLMBackend,
+    TreeClassifier,
+)
+
+PATHS = ("single", "batch", "async", "parallel")
+
+
+def make_config(depth: int, fanout: int) -> Dict[str, Any]:
+    """Build a complete tree configuration.
+
+    Every question is unique and sibling leaves alternate between "yes" and
+    "no", so the optimizer cannot fold any question away.
+
+    Args:
+        depth: Number of questions on every path
+        fanout: Number of options per question
+
+    Returns:
+        Configuration with a single tree named "synthetic"
+    """
+
+    def node(level: int, path: str) -> Dict[str, Any]:
+        if level == depth:
+            return {"label": "yes" if int(path[-1]) % 2 == 0 else "no"}
+        return {
+            "question": f"Does the text satisfy condition {path or 'root'}?",
+            "options": [
+                {"value": f"option{i}", "next": node(level + 1, f"{path}{i}")}
+                for i in range(fanout)
+            ],
+        }
+
+    return {"trees": [{"name": "synthetic", "root": node(0, "")}]}
+
+
+def make_texts(n: int, words: int) -> List[str]:
+    """Build deterministic synthetic documents.
+
+    Args:
+        n: Number of documents
+        words: Words per document
+
+    Returns:
+        Documents
+    """
+    vocabulary = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta"]
+    return [
+        " ".join(vocabulary[(i * 7 + j * 3) % len(vocabulary)] for j in range(words))
+        + f" #{i}"
+        for i in range(n)
+    ]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Return the q-th percentile (0-100) with linear interpolation."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def run_single(
+    classifier: TreeClassifier, texts: List[str], batch_size: int
+) -> Tuple[List[List[str]], List[float]]:
+    """Classify texts one at a time."""
+    results, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        results.append(classifier.classify(text))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def run_batch(
+    classifier: TreeClassifier, texts: List[str], batch_size: int
+) -> Tuple[List[List[str]], List[float]]:
+    """Classify texts in batches."""
+    results, latencies = [], []
+    for offset in range(0, len(texts), batch_size):
+        chunk = texts[offset : offset + batch_size]
+        start = time.perf_counter()
+        results.extend(classifier.classify_batch(chunk))
+        latencies.extend([time.perf_counter() - start] * len(chunk))
+    return results, latencies
+
+
+def run_async(
+    classifier: TreeClassifier, texts: List[str], batch_size: int
+) -> Tuple[List[List[str]], List[float]]:
+    """Classify texts as concurrent asyncio tasks, batch_size at a time."""
+    latencies = [0.0] * len(texts)
+
+    async def run_all() -> List[List[str]]:
+        semaphore = asyncio.Semaphore(batch_size)
+
+        async def run(i: int, text: str) -> List[str]:
+            async with semaphore:
+                start = time.perf_counter()
+                result = await classifier.aclassify(text)
+                latencies[i] = time.perf_counter() - start
+                return result
+
+        return list(await asyncio.gather(*(run(i, t) for i, t in enumerate(texts))))
+
+    results = asyncio.run(run_all())
+    classifier.async_llm.close()
+    return results, latencies
+
+
+RUNNERS: Dict[str, Callable[..., Tuple[List[List[str]], List[float]]]] = {
+    "single": run_single,
+    "batch": run_batch,
+    "async": run_async,
+}
+
+
+def bench_in_process(
+    path: str,
+    config: Dict[str, Any],
+    texts: List[str],
+    args: argparse.Namespace,
+) -> Dict[str, Any]:
+    """Benchmark one in-process path.
+
+    Args:
+        path: "single", "batch" or "async"
+        config: Tree configuration
+        texts: Documents
+        args: Parsed arguments
+
+    Returns:
+        Measurements
+    """
+    runner = RUNNERS[path]
+    llm = SimulatedLLMBackend(
+        latency=args.latency, token_latency=args.token_latency, seed=args.seed
+    )
+    classifier = TreeClassifier(config, llm)
+
+    start = time.perf_counter()
+    results, latencies = runner(classifier, texts, args.batch_size)
+    elapsed = time.perf_counter() - start
+
+    # Memory pass without simulated latency
+    memory_llm = SimulatedLLMBackend(seed=args.seed)
+    memory_classifier = TreeClassifier(config, memory_llm)
+    tracemalloc.start()
+    runner(memory_classifier, texts, args.batch_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "throughput": len(texts) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "calls_per_doc": llm.calls / len(texts),
+        "prompts_per_doc": llm.prompts / len(texts),
+        "peak_memory_kb": peak / 1024,
+        "matched": sum(1 for result in results if result) / len(texts),
+    }
+
+
+def bench_parallel(
+    config: Dict[str, Any], texts: List[str], args: argparse.Namespace
+) -> Dict[str, Any]:
+    """Benchmark the process pool path, excluding worker startup.
+
+    Args:
+        config: Tree configuration
+        texts: Documents
+        args: Parsed arguments
+
+    Returns:
+        Measurements
+    """
+    factory = functools.partial(
+        SimulatedLLMBackend,
+        latency=args.latency,
+        token_latency=args.token_latency,
+        seed=args.seed,
+    )
+    with ParallelTreeClassifier(
+        config,
+        backend_factory=factory,
+        n_workers=args.workers,
+        chunk_size=args.batch_size,
+    ) as classifier:
+        # Wait until every worker has loaded the tree
+        classifier.classify_batch(texts[:1] * args.workers * args.batch_size)
+        start = time.perf_counter()
+        results = classifier.classify_batch(texts)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "throughput": len(texts) / elapsed,
+        "p50_ms": None,
+        "p99_ms": None,
+        "calls_per_doc": None,
+        "prompts_per_doc": None,
+        "peak_memory_kb": None,
+        "matched": sum(1 for result in results if result) / len(texts),
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: Path) -> None:
+    """Print throughput changes against an earlier run.
+
+    Args:
+        results: Results of this run
+        baseline_path: JSON report of an earlier run
+    """
+    baseline = {
+        (r["path"], r["depth"], r["fanout"]): r
+        for r in json.loads(baseline_path.read_text())["results"]
+    }
+    for result in results:
+        old = baseline.get((result["path"], result["depth"], result["fanout"]))
+        if old is None:
+            continue
+        change = result["throughput"] / old["throughput"] - 1
+        print(
+            f"{result['path']:>8} depth={result['depth']} fanout={result['fanout']}: "
+            f"{old['throughput']:.0f} -> {result['throughput']:.0f} docs/s "
+            f"({change:+.1%})",
+            file=sys.stderr,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark grid and print a JSON report.
+
+    Args:
+        argv: Command line arguments
+
+    Returns:
+        Exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--fanouts", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds per backend call"
+    )
+    parser.add_argument(
+        "--token-latency", type=float, default=0.0, help="Seconds per prompt token"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Also write the report here")
+    parser.add_argument("--baseline", type=Path, help="Earlier report to compare")
+    args = parser.parse_args(argv)
+
+    texts = make_texts(args.docs, args.words)
+    results = []
+    for depth in args.depths:
+        for fanout in args.fanouts:
+            config = make_config(depth, fanout)
+            for path in args.paths:
+                if path == "parallel":
+                    measurements = bench_parallel(config, texts, args)
+                else:
+                    measurements = bench_in_process(path, config, texts, args)
+                results.append(
+                    {"path": path, "depth": depth, "fanout": fanout, **measurements}
+                )
+                print(
+                    f"{path:>8} depth={depth} fanout={fanout}: "
+                    f"{measurements['throughput']:.0f} docs/s",
+                    file=sys.stderr,
+                )
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            key: str(value) if isinstance(value, Path) else value
+            for key, value in vars(args).items()
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output is not None:
+        args.output.write_text(text + "\n")
+    if args.baseline is not None:
+        compare(results, args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
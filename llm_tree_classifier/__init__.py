@@ -1,34 +1,114 @@
-"""LLM Tree Classifier package."""
+"""LLM Tree Classifier package.
+
+Tree parsing and the classifier are imported eagerly. LLM backends and the
+process pool are imported on first attribute access, so tools that only load
+or validate trees never import llama_cpp.
+"""
 
 import logging
-from typing import List
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, Dict, List
 
-from llm_tree_classifier.classifier import TreeClassifier, load_from_yaml
+from llm_tree_classifier.classifier import (
+    MultiTreeClassifier,
+    TreeClassifier,
+    load_from_yaml,
+)
 from llm_tree_classifier.exceptions import (
-    LLMTreeClassifierError,
-    TreeNotFoundError,
     InvalidTreeConfigError,
+    JobError,
     LLMError,
+    LLMTreeClassifierError,
+    TreeNotFoundError,
 )
-from llm_tree_classifier.llm import LlamaCppBackend
-from llm_tree_classifier.tree import DecisionNode, DecisionTree
+from llm_tree_classifier.llm.base import AsyncLLMBackend, LLMBackend
+from llm_tree_classifier.optimizer import OptimizationReport, optimize_tree
+from llm_tree_classifier.tree import CompiledTree, DecisionNode, DecisionTree
+
+if TYPE_CHECKING:
+    from llm_tree_classifier.corpus import Corpus
+    from llm_tree_classifier.dedup import Deduplicator
+    from llm_tree_classifier.llm import (
+        AsyncBackendAdapter,
+        CachingBackend,
+        CascadeBackend,
+        DistilledBackend,
+        HttpLLMBackend,
+        LlamaCppBackend,
+        MicroBatchingBackend,
+        ModelRegistry,
+        RecordingBackend,
+        ReplayBackend,
+        SimulatedLLMBackend,
+    )
+    from llm_tree_classifier.parallel import ParallelTreeClassifier
 
 __version__ = "0.1.0"
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+# Applications configure logging; the library only adds a no-op handler
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+# Attribute name -> module that defines it
+_LAZY_ATTRIBUTES: Dict[str, str] = {
+    "AsyncBackendAdapter": "llm_tree_classifier.llm.async_adapter",
+    "CachingBackend": "llm_tree_classifier.llm.cache",
+    "CascadeBackend": "llm_tree_classifier.llm.cascade",
+    "DistilledBackend": "llm_tree_classifier.llm.distilled",
+    "HttpLLMBackend": "llm_tree_classifier.llm.http_backend",
+    "LlamaCppBackend": "llm_tree_classifier.llm.llama_cpp",
+    "MicroBatchingBackend": "llm_tree_classifier.llm.batching",
+    "RecordingBackend": "llm_tree_classifier.llm.recording",
+    "ReplayBackend": "llm_tree_classifier.llm.recording",
+    "SimulatedLLMBackend": "llm_tree_classifier.llm.simulated",
+    "ModelRegistry": "llm_tree_classifier.llm.registry",
+    "ParallelTreeClassifier": "llm_tree_classifier.parallel",
+    "Corpus": "llm_tree_classifier.corpus",
+    "Deduplicator": "llm_tree_classifier.dedup",
+}
+
+
+def __getattr__(name: str) -> Any:
+    """Import lazily loaded classes on first access."""
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
 
 __all__: List[str] = [
-    "TreeClassifier",
-    "load_from_yaml",
-    "LlamaCppBackend",
+    "AsyncBackendAdapter",
+    "AsyncLLMBackend",
+    "CachingBackend",
+    "CascadeBackend",
+    "CompiledTree",
+    "Corpus",
     "DecisionNode",
     "DecisionTree",
-    "LLMTreeClassifierError",
-    "TreeNotFoundError",
+    "Deduplicator",
+    "DistilledBackend",
+    "HttpLLMBackend",
     "InvalidTreeConfigError",
+    "JobError",
+    "LLMBackend",
     "LLMError",
-] 
\ No newline at end of file
+    "LLMTreeClassifierError",
+    "LlamaCppBackend",
+    "MicroBatchingBackend",
+    "ModelRegistry",
+    "MultiTreeClassifier",
+    "OptimizationReport",
+    "ParallelTreeClassifier",
+    "RecordingBackend",
+    "ReplayBackend",
+    "SimulatedLLMBackend",
+    "TreeClassifier",
+    "TreeNotFoundError",
+    "load_from_yaml",
+    "optimize_tree",
+]
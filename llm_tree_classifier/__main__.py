@@ -4,15 +4,16 @@ import argparse
 import logging
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import IO, Optional
 
 from llm_tree_classifier import (
-    LLMError,
-    LlamaCppBackend,
-    TreeNotFoundError,
     InvalidTreeConfigError,
+    LLMBackend,
+    LLMError,
     TreeClassifier,
+    TreeNotFoundError,
 )
+from llm_tree_classifier.streaming import classify_jsonl
 
 
 def parse_args() -> argparse.Namespace:
@@ -36,16 +37,96 @@ def parse_args() -> argparse.Namespace:
         required=True,
         help="Path to LLaMA model file",
     )
+    parser.add_argument(
+        "--n-ctx",
+        type=int,
+        default=2048,
+        help=(
+            "Context window of the model in tokens (default: 2048); trees "
+            "can bound document length with a 'documents' token_budget"
+        ),
+    )
+    parser.add_argument(
+        "--escalation-model",
+        type=Path,
+        help=(
+            "Larger model asked when --model is unsure; --model then scores "
+            "options by log-probability"
+        ),
+    )
+    parser.add_argument(
+        "--escalation-margin",
+        type=float,
+        default=1.0,
+        help=(
+            "Log-probability margin below which prompts escalate, for nodes "
+            "without a cascade_margin (default: 1.0)"
+        ),
+    )
     parser.add_argument(
         "--tree",
         type=str,
         help="Specific tree to use for classification (required if config contains multiple trees)",
     )
-    parser.add_argument(
+    input_group = parser.add_mutually_exclusive_group()
+    input_group.add_argument(
         "--text",
         type=str,
         help="Text to classify (if not provided, reads from stdin)",
     )
+    input_group.add_argument(
+        "--input-jsonl",
+        type=str,
+        help="Classify JSON records from this file, one per line ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--output-jsonl",
+        type=str,
+        default="-",
+        help="Write classified JSON records to this file (default: '-' for stdout)",
+    )
+    parser.add_argument(
+        "--text-field",
+        type=str,
+        default="text",
+        help="Record field holding the text to classify (default: text)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Number of records classified together in JSONL mode (default: 32)",
+    )
+    parser.add_argument(
+        "--scoring",
+        choices=["grammar", "logprob"],
+        help=(
+            "How answers are chosen: 'grammar' samples each prompt on its "
+            "own, 'logprob' decodes batches together (default: logprob in "
+            "JSONL mode with --batch-size above 1 or with --escalation-model, "
+            "else grammar)"
+        ),
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=["exact", "near"],
+        help=(
+            "Classify one text per group of exact (or also near) duplicates "
+            "and copy its result to the others"
+        ),
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.8,
+        help="Minimum estimated Jaccard similarity of near duplicates (default: 0.8)",
+    )
+    parser.add_argument(
+        "--flush-every",
+        type=int,
+        default=1000,
+        help="Flush JSONL output after this many records (default: 1000)",
+    )
     parser.add_argument(
         "--verbose",
         "-v",
@@ -55,6 +136,25 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def resolve_scoring(args: argparse.Namespace) -> str:
+    """Return the scoring mode of the backend.
+
+    Batched JSONL classification only decodes prompts together when
+    options are scored by log-probability, and the escalation cascade needs
+    the scores, so both default to logprob.
+
+    Args:
+        args: Parsed arguments
+
+    Returns:
+        "grammar" or "logprob"
+    """
+    if args.scoring is not None:
+        return str(args.scoring)
+    batching = args.input_jsonl is not None and args.batch_size > 1
+    return "logprob" if batching or args.escalation_model else "grammar"
+
+
 def setup_logging(verbose: bool) -> None:
     """Set up logging configuration.
 
@@ -84,27 +184,128 @@ def get_input_text(text: Optional[str]) -> str:
     return sys.stdin.read().strip()
 
 
-def main() -> int:
+def open_stream(path: str, mode: str) -> IO[str]:
+    """Open a file for streaming, with '-' meaning stdin or stdout.
+
+    Args:
+        path: File path or '-'
+        mode: 'r' or 'w'
+
+    Returns:
+        Text stream
+    """
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    return open(path, mode, encoding="utf-8")
+
+
+def run_jsonl(classifier: TreeClassifier, args: argparse.Namespace) -> int:
+    """Classify a JSONL stream with an already loaded classifier.
+
+    Args:
+        classifier: Classifier to use
+        args: Parsed arguments
+
+    Returns:
+        Exit code
+    """
+    input_stream = open_stream(args.input_jsonl, "r")
+    output_stream = open_stream(args.output_jsonl, "w")
+    try:
+        count = classify_jsonl(
+            classifier,
+            input_stream,
+            output_stream,
+            text_field=args.text_field,
+            batch_size=args.batch_size,
+            flush_every=args.flush_every,
+        )
+    finally:
+        for stream in (input_stream, output_stream):
+            if stream not in (sys.stdin, sys.stdout):
+                stream.close()
+    logging.getLogger(__name__).info("Classified %d records", count)
+    return 0
+
+
+def main() -> int:  # noqa: PLR0911
     """Run the CLI.
 
     Returns:
         Exit code (0 for success, non-zero for error)
     """
+    if sys.argv[1:2] == ["serve"]:
+        from llm_tree_classifier.server import main as serve_main
+
+        return serve_main(sys.argv[2:])
+    if sys.argv[1:2] == ["distill"]:
+        from llm_tree_classifier.distill import main as distill_main
+
+        return distill_main(sys.argv[2:])
+    if sys.argv[1:2] == ["job"]:
+        from llm_tree_classifier.jobs import main as job_main
+
+        return job_main(sys.argv[2:])
+
     args = parse_args()
     setup_logging(args.verbose)
 
     try:
+        # Imported here so that argument errors and --help stay fast
+        from llm_tree_classifier.llm.cascade import CascadeBackend
+        from llm_tree_classifier.llm.llama_cpp import LlamaCppBackend
+
         # Initialize LLM
-        llm = LlamaCppBackend(
+        llm: LLMBackend = LlamaCppBackend(
             model_path=str(args.model),
-            n_ctx=2048,
+            n_ctx=args.n_ctx,
             n_batch=512,
             n_threads=None,
             n_gpu_layers=0,
+            scoring=resolve_scoring(args),
         )
+        if args.escalation_model is not None:
+            large = LlamaCppBackend(
+                model_path=str(args.escalation_model),
+                n_ctx=args.n_ctx,
+                n_batch=512,
+                n_threads=None,
+                n_gpu_layers=0,
+            )
+            llm = CascadeBackend.from_config(
+                llm, large, args.config, margin=args.escalation_margin
+            )
+
+        dedup = None
+        if args.dedup is not None:
+            from llm_tree_classifier.dedup import Deduplicator
+
+            dedup = Deduplicator(
+                near=args.dedup == "near", threshold=args.dedup_threshold
+            )
 
         # Create classifier
-        classifier = TreeClassifier(args.config, llm, tree_name=args.tree)
+        classifier = TreeClassifier(args.config, llm, tree_name=args.tree, dedup=dedup)
+
+        if args.input_jsonl is not None:
+            status = run_jsonl(classifier, args)
+            if dedup is not None:
+                stats = dedup.stats()
+                logging.getLogger(__name__).info(
+                    "Deduplicated %.1f%% of texts (%d exact, %d near)",
+                    100 * stats["dedup_rate"],
+                    stats["exact_hits"],
+                    stats["near_hits"],
+                )
+            if isinstance(llm, CascadeBackend):
+                stats = llm.stats()
+                logging.getLogger(__name__).info(
+                    "Escalated %d of %d decisions (%.1f%%)",
+                    stats["escalations"],
+                    stats["calls"],
+                    100 * stats["escalation_rate"],
+                )
+            return status
 
         # Get input text
         text = get_input_text(args.text)
@@ -129,4 +330,4 @@ def main() -> int:
 
 
 if __name__ == "__main__":
-    sys.exit(main()) 
\ No newline at end of file
+    sys.exit(main())
@@ -2,52 +2,100 @@
 
 import logging
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 
 import yaml
 
-from llm_tree_classifier.exceptions import TreeNotFoundError, InvalidTreeConfigError
-from llm_tree_classifier.llm.base import LLMBackend
-from llm_tree_classifier.tree import DecisionTree
+from llm_tree_classifier.exceptions import InvalidTreeConfigError, TreeNotFoundError
+from llm_tree_classifier.llm.base import AsyncLLMBackend, LLMBackend
+from llm_tree_classifier.tree import DecisionTree, classify_trees
+
+if TYPE_CHECKING:
+    from llm_tree_classifier.dedup import Deduplicator
 
 logger = logging.getLogger(__name__)
 
 
+def load_trees(config: Union[str, Path, Dict]) -> Dict[str, DecisionTree]:
+    """Load all trees from a configuration.
+
+    Args:
+        config: Path to YAML file or dictionary containing tree configuration
+
+    Returns:
+        Mapping of tree name to tree, in configuration order
+
+    Raises:
+        InvalidTreeConfigError: If configuration contains no trees
+    """
+    # Load configuration
+    if isinstance(config, (str, Path)):
+        with open(config) as f:
+            data: Dict = yaml.safe_load(f)
+    else:
+        data = config
+
+    # Load trees from configuration
+    trees = {}
+    for tree_config in data.get("trees", []):
+        tree = DecisionTree.from_dict(tree_config)
+        trees[tree.name] = tree
+
+    if not trees:
+        raise InvalidTreeConfigError("No trees found in configuration")
+    return trees
+
+
+def _sync_backend(llm: Union[LLMBackend, AsyncLLMBackend]) -> LLMBackend:
+    """Return the backend for synchronous classification.
+
+    Args:
+        llm: Backend given to the classifier
+
+    Returns:
+        The backend
+
+    Raises:
+        TypeError: If the backend is an AsyncLLMBackend
+    """
+    if isinstance(llm, AsyncLLMBackend):
+        raise TypeError(
+            f"{type(llm).__name__} is an AsyncLLMBackend; use aclassify instead"
+        )
+    return llm
+
+
 class TreeClassifier:
     """Classifier that uses a decision tree with LLM-based decisions."""
 
     def __init__(
         self,
         config: Union[str, Path, Dict],
-        llm: LLMBackend,
+        llm: Union[LLMBackend, AsyncLLMBackend],
         tree_name: Optional[str] = None,
+        dedup: Optional["Deduplicator"] = None,
     ) -> None:
         """Initialize the classifier.
 
         Args:
             config: Path to YAML file or dictionary containing tree configuration
-            llm: LLM backend to use for decisions
+            llm: LLM backend to use for decisions. An AsyncLLMBackend can only
+                be used with aclassify and aclassify_many.
             tree_name: Name of the tree to use (required if config contains multiple trees)
+            dedup: Deduplicator grouping duplicate texts in classify_batch and
+                aclassify_many, so each group is classified once
 
         Raises:
             InvalidTreeConfigError: If configuration is invalid
             TreeNotFoundError: If specified tree is not found
         """
         self.llm = llm
-
-        # Load configuration
-        if isinstance(config, (str, Path)):
-            with open(config) as f:
-                config = yaml.safe_load(f)
-
-        # Load trees from configuration
-        trees = {}
-        for tree_config in config.get("trees", []):
-            tree = DecisionTree.from_dict(tree_config)
-            trees[tree.name] = tree
-
-        if not trees:
-            raise InvalidTreeConfigError("No trees found in configuration")
+        self.dedup = dedup
+        self._async_llm: Optional[AsyncLLMBackend] = (
+            llm if isinstance(llm, AsyncLLMBackend) else None
+        )
+        trees = load_trees(config)
+        self.trees = trees
 
         # Select tree
         if tree_name is not None:
@@ -63,6 +111,8 @@ class TreeClassifier:
                 f"Multiple trees found in configuration. Please specify tree_name. Available trees: {list(trees.keys())}"
             )
 
+        llm.warm_up(self.tree.compiled.decisions())
+
         logger.info("Initialized TreeClassifier with tree '%s'", self.tree.name)
 
     def classify(self, text: str) -> List[str]:
@@ -73,6 +123,233 @@ class TreeClassifier:
 
         Returns:
             List of classification results
+
+        Raises:
+            TypeError: If the classifier was given an AsyncLLMBackend
         """
         logger.info("Classifying text using tree '%s'", self.tree.name)
-        return self.tree.classify(text, self.llm) 
\ No newline at end of file
+        if self.tree.classify(text, _sync_backend(self.llm)):
+            return [self.tree.name]
+        return []
+
+    def classify_batch(self, texts: List[str]) -> List[List[str]]:
+        """Classify several texts using the tree.
+
+        Texts are advanced through the tree together, so backends that
+        support batching evaluate all texts at one tree level at once.
+
+        Args:
+            texts: Texts to classify
+
+        Returns:
+            List of classification results for each text
+
+        Raises:
+            TypeError: If the classifier was given an AsyncLLMBackend
+        """
+        logger.info("Classifying %d texts using tree '%s'", len(texts), self.tree.name)
+        _sync_backend(self.llm)
+        if self.dedup is not None:
+            return self.dedup.classify(texts, self._classify_batch)
+        return self._classify_batch(texts)
+
+    def _classify_batch(self, texts: List[str]) -> List[List[str]]:
+        llm = _sync_backend(self.llm)
+        return [
+            [self.tree.name] if matched else []
+            for matched in self.tree.classify_batch(texts, llm)
+        ]
+
+    @property
+    def async_llm(self) -> AsyncLLMBackend:
+        """Async view of the backend.
+
+        A synchronous backend is wrapped in an AsyncBackendAdapter with a
+        dedicated worker thread on first use.
+
+        Returns:
+            Async backend used by aclassify
+        """
+        if self._async_llm is None:
+            from llm_tree_classifier.llm.async_adapter import AsyncBackendAdapter
+
+            self._async_llm = AsyncBackendAdapter(_sync_backend(self.llm))
+        return self._async_llm
+
+    async def aclassify(self, text: str) -> List[str]:
+        """Classify text using the tree without blocking the event loop.
+
+        Args:
+            text: Text to classify
+
+        Returns:
+            List of classification results
+        """
+        logger.debug("Classifying text using tree '%s'", self.tree.name)
+        if await self.tree.aclassify(text, self.async_llm):
+            return [self.tree.name]
+        return []
+
+    async def aclassify_many(
+        self, texts: List[str], concurrency: int = 8
+    ) -> List[List[str]]:
+        """Classify several texts concurrently.
+
+        Args:
+            texts: Texts to classify
+            concurrency: Maximum number of texts in flight at once
+
+        Returns:
+            List of classification results for each text, in input order
+        """
+        import asyncio
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(text: str) -> List[str]:
+            async with semaphore:
+                return await self.aclassify(text)
+
+        if self.dedup is None:
+            return list(await asyncio.gather(*(run(text) for text in texts)))
+        plan = self.dedup.plan(texts)
+        return plan.resolve(await asyncio.gather(*(run(text) for text in plan.texts)))
+
+
+class MultiTreeClassifier:
+    """Classifier that runs several trees on every text."""
+
+    def __init__(
+        self,
+        config: Union[str, Path, Dict],
+        llm: Union[LLMBackend, AsyncLLMBackend],
+        tree_names: Optional[List[str]] = None,
+        dedup: Optional["Deduplicator"] = None,
+    ) -> None:
+        """Initialize the classifier.
+
+        Args:
+            config: Path to YAML file or dictionary containing tree configuration
+            llm: LLM backend to use for decisions. An AsyncLLMBackend can only
+                be used with aclassify.
+            tree_names: Names of the trees to run, in result order (default:
+                all trees of the configuration)
+            dedup: Deduplicator grouping duplicate texts in classify_batch
+
+        Raises:
+            InvalidTreeConfigError: If configuration is invalid
+            TreeNotFoundError: If a specified tree is not found
+        """
+        self.llm = llm
+        self.dedup = dedup
+        self._async_llm: Optional[AsyncLLMBackend] = (
+            llm if isinstance(llm, AsyncLLMBackend) else None
+        )
+        trees = load_trees(config)
+
+        if tree_names is None:
+            tree_names = list(trees)
+        missing = [name for name in tree_names if name not in trees]
+        if missing:
+            raise TreeNotFoundError(
+                f"Trees {missing} not found. Available trees: {list(trees.keys())}"
+            )
+        if not tree_names:
+            raise InvalidTreeConfigError("No trees selected")
+        self.trees = {name: trees[name] for name in tree_names}
+        self._compiled = [tree.compiled for tree in self.trees.values()]
+        llm.warm_up(
+            [decision for tree in self._compiled for decision in tree.decisions()]
+        )
+
+        logger.info("Initialized MultiTreeClassifier with trees %s", tree_names)
+
+    def classify(self, text: str) -> Dict[str, str]:
+        """Run every selected tree on a text.
+
+        The document is shared by the prompts of all trees, and the current
+        node of every tree is sent to the backend in one batch per level.
+
+        Args:
+            text: Text to classify
+
+        Returns:
+            Mapping of tree name to the label reached in that tree
+
+        Raises:
+            TypeError: If the classifier was given an AsyncLLMBackend
+        """
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: List[str]) -> List[Dict[str, str]]:
+        """Run every selected tree on several texts.
+
+        Args:
+            texts: Texts to classify
+
+        Returns:
+            Mapping of tree name to label for each text
+
+        Raises:
+            TypeError: If the classifier was given an AsyncLLMBackend
+        """
+        logger.info("Classifying %d texts using trees %s", len(texts), list(self.trees))
+        _sync_backend(self.llm)
+        if self.dedup is not None:
+            return self.dedup.classify(texts, self._classify_batch)
+        return self._classify_batch(texts)
+
+    def _classify_batch(self, texts: List[str]) -> List[Dict[str, str]]:
+        llm = _sync_backend(self.llm)
+        return [
+            dict(zip(self.trees, labels, strict=True))
+            for labels in classify_trees(self._compiled, texts, llm)
+        ]
+
+    @property
+    def async_llm(self) -> AsyncLLMBackend:
+        """Async view of the backend.
+
+        Returns:
+            Async backend used by aclassify
+        """
+        if self._async_llm is None:
+            from llm_tree_classifier.llm.async_adapter import AsyncBackendAdapter
+
+            self._async_llm = AsyncBackendAdapter(_sync_backend(self.llm))
+        return self._async_llm
+
+    async def aclassify(self, text: str) -> Dict[str, str]:
+        """Run every selected tree on a text, with the trees walked concurrently.
+
+        Args:
+            text: Text to classify
+
+        Returns:
+            Mapping of tree name to the label reached in that tree
+        """
+        import asyncio
+
+        llm = self.async_llm
+        labels = await asyncio.gather(
+            *(compiled.aclassify(text, llm) for compiled in self._compiled)
+        )
+        return dict(zip(self.trees, labels, strict=True))
+
+
+def load_from_yaml(
+    config: Union[str, Path, Dict],
+    llm: LLMBackend,
+    tree_name: Optional[str] = None,
+) -> TreeClassifier:
+    """Create a classifier from a YAML file or an already parsed configuration.
+
+    Args:
+        config: Path to YAML file or dictionary containing tree configuration
+        llm: LLM backend to use for decisions
+        tree_name: Name of the tree to use (required if config contains multiple trees)
+
+    Returns:
+        Configured TreeClassifier instance
+    """
+    return TreeClassifier(config, llm, tree_name=tree_name)
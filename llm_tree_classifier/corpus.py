@@ -0,0 +1,424 @@
+"""Memory-mapped access to large newline-delimited text and JSONL files.
+
+A Corpus maps its file into memory and locates lines through an index of
+line start offsets. The index is built once, with NumPy scanning the mapped
+bytes for newlines, and saved beside the file as "<file>.lines.npy". Later
+opens load it memory-mapped as well, so opening a 100 GB corpus costs
+neither a scan nor reading the index into memory. The index is rebuilt when
+the file's size or modification time no longer match it.
+
+Records and shards are handed out as CorpusView objects: line ranges that
+read and decode their lines only when iterated. A view pickles as the file
+path and its range, so worker processes map the file themselves instead of
+receiving the text:
+
+    corpus = Corpus("corpus.jsonl")
+    for shard in corpus.shards(8):
+        for record in shard.records():
+            ...
+"""
+
+import itertools
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".lines.npy"
+# Saved indexes start with the file's size and mtime
+HEADER_SIZE = 2
+NEWLINE = 0x0A
+CARRIAGE_RETURN = 0x0D
+# Bytes scanned for newlines at a time while building an index
+SCAN_BLOCK = 64 * 1024 * 1024
+
+
+def index_path(path: Union[str, Path]) -> Path:
+    """Return where the line index of a file is saved.
+
+    Args:
+        path: Corpus file
+
+    Returns:
+        Path of the index file
+    """
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _newlines(data: Union[mmap.mmap, bytes]) -> Iterator[np.ndarray]:
+    """Yield the offsets of newline bytes, one array per scanned block."""
+    for base in range(0, len(data), SCAN_BLOCK):
+        block = np.frombuffer(
+            data, dtype=np.uint8, count=min(SCAN_BLOCK, len(data) - base), offset=base
+        )
+        yield np.flatnonzero(block == NEWLINE) + base
+
+
+class Corpus:
+    """Memory-mapped newline-delimited file with a saved line index.
+
+    Index layout (int64): file size, file mtime_ns, then the start offset of
+    every line followed by the file size, so line i spans
+    [offsets[i], offsets[i + 1]) including its newline.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        save_index: bool = True,
+    ) -> None:
+        """Map a file and load or build its line index.
+
+        Args:
+            path: Newline-delimited text or JSONL file
+            save_index: Whether to save a newly built index beside the file
+
+        Raises:
+            OSError: If the file cannot be opened
+        """
+        self.path = Path(path)
+        self.save_index = save_index
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self._file = open(self.path, "rb")
+        self._mmap: Optional[mmap.mmap] = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.size
+            else None
+        )
+        self._data: Union[mmap.mmap, bytes] = self._mmap if self._mmap else b""
+        self.offsets = self._load_index(stat.st_mtime_ns)
+
+    def __reduce__(self) -> Any:
+        """Pickle as the path; the receiving process maps the file again."""
+        return (Corpus, (self.path, self.save_index))
+
+    def __len__(self) -> int:
+        """Return the number of lines."""
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        """Return a line, without its line ending.
+
+        Args:
+            index: Line number, starting at 0 (negative counts from the end)
+
+        Returns:
+            Decoded line
+        """
+        return bytes(self.raw(index)).decode("utf-8", errors="replace")
+
+    def raw(self, index: int) -> memoryview:
+        """Return a line as a zero-copy view of the mapped file.
+
+        Args:
+            index: Line number, starting at 0 (negative counts from the end)
+
+        Returns:
+            Bytes of the line, without its line ending
+
+        Raises:
+            IndexError: If the line does not exist
+        """
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError(f"line {index} out of range for {n} lines")
+        start = int(self.offsets[index])
+        end = int(self.offsets[index + 1])
+        view = memoryview(self._data)[start:end]
+        if end > start and view[-1] == NEWLINE:
+            view = view[:-1]
+        if len(view) and view[-1] == CARRIAGE_RETURN:
+            view = view[:-1]
+        return view
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """Parse a line as a JSON object.
+
+        Args:
+            index: Line number, starting at 0
+
+        Returns:
+            The parsed record
+
+        Raises:
+            ValueError: If the line is not a JSON object
+        """
+        record = json.loads(bytes(self.raw(index)))
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {index + 1} is not a JSON object")
+        return record
+
+    def view(self, start: int = 0, stop: Optional[int] = None) -> "CorpusView":
+        """Return a view of a range of lines.
+
+        Args:
+            start: First line
+            stop: Line after the last one (default: end of the file)
+
+        Returns:
+            View of lines [start, stop)
+        """
+        n = len(self)
+        stop = n if stop is None else min(stop, n)
+        return CorpusView(self, max(0, min(start, stop)), stop)
+
+    def shards(self, n: int) -> List["CorpusView"]:
+        """Split the corpus into views of about equal byte size.
+
+        Args:
+            n: Number of shards
+
+        Returns:
+            Up to n non-empty views covering every line, in order
+
+        Raises:
+            ValueError: If n is not positive
+        """
+        if n < 1:
+            raise ValueError("Number of shards must be positive")
+        targets = np.linspace(0, self.size, n + 1)[1:-1]
+        bounds = np.searchsorted(self.offsets[:-1], targets, side="left")
+        edges = [0] + [int(b) for b in bounds] + [len(self)]
+        return [
+            CorpusView(self, start, stop)
+            for start, stop in itertools.pairwise(edges)
+            if stop > start
+        ]
+
+    def split(self, shard_bytes: int) -> List["CorpusView"]:
+        """Split the corpus into views of a target byte size.
+
+        Each view ends with the first line that reaches shard_bytes from its
+        start, so views depend only on the file content and shard_bytes.
+
+        Args:
+            shard_bytes: Target view size in bytes
+
+        Returns:
+            Non-empty views covering every line, in order
+
+        Raises:
+            ValueError: If shard_bytes is not positive
+        """
+        if shard_bytes < 1:
+            raise ValueError("shard_bytes must be positive")
+        n = len(self)
+        views = []
+        start = 0
+        while start < n:
+            target = int(self.offsets[start]) + shard_bytes
+            stop = int(np.searchsorted(self.offsets, target, side="left"))
+            stop = min(max(stop, start + 1), n)
+            views.append(CorpusView(self, start, stop))
+            start = stop
+        return views
+
+    def view_bytes(self, start: int, end: int) -> "CorpusView":
+        """Return the view of the lines in a byte range.
+
+        Args:
+            start: Byte offset where the first line starts
+            end: Byte offset after the last line
+
+        Returns:
+            View of the lines in [start, end)
+
+        Raises:
+            ValueError: If start or end is not at a line boundary
+        """
+        first, stop = (
+            int(i) for i in np.searchsorted(self.offsets, [start, end], side="left")
+        )
+        if (
+            stop >= len(self.offsets)
+            or int(self.offsets[first]) != start
+            or int(self.offsets[stop]) != end
+        ):
+            raise ValueError(f"Bytes {start}-{end} are not at line boundaries")
+        return CorpusView(self, first, stop)
+
+    def close(self) -> None:
+        """Unmap the file.
+
+        Lines returned by raw() keep the mapping alive until they are
+        released; it is then unmapped by the garbage collector.
+        """
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self._data = b""
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                logger.debug("Corpus %s still has views; unmapping later", self.path)
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self) -> "Corpus":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _load_index(self, mtime_ns: int) -> np.ndarray:
+        """Load the saved line index, rebuilding it if it is missing or stale.
+
+        Args:
+            mtime_ns: Modification time of the corpus file
+
+        Returns:
+            Line start offsets followed by the file size
+        """
+        path = index_path(self.path)
+        try:
+            index: np.ndarray = np.load(path, mmap_mode="r")
+            if (
+                index.dtype == np.int64
+                and len(index) > HEADER_SIZE
+                and int(index[0]) == self.size
+                and int(index[1]) == mtime_ns
+            ):
+                return index[HEADER_SIZE:]
+            logger.info("Line index %s is stale, rebuilding it", path)
+        except (OSError, ValueError):
+            pass
+
+        if self.save_index:
+            # Per process, so concurrent openers never write the same file
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp.npy")
+            try:
+                self._build_index(mtime_ns, tmp)
+                os.replace(tmp, path)
+                saved: np.ndarray = np.load(path, mmap_mode="r")
+                return saved[HEADER_SIZE:]
+            except OSError as e:
+                logger.warning("Could not save line index %s: %s", path, e)
+                tmp.unlink(missing_ok=True)
+        return self._build_index(mtime_ns)[HEADER_SIZE:]
+
+    def _build_index(self, mtime_ns: int, target: Optional[Path] = None) -> np.ndarray:
+        """Scan the file for newlines.
+
+        Two passes over the mapped bytes: one counts the lines so the index
+        is allocated once, the other fills it. With a target the index is
+        written straight into a memory-mapped .npy file, so large indexes
+        never have to fit in memory.
+
+        Args:
+            mtime_ns: Modification time of the corpus file
+            target: .npy file to build the index in (None for memory)
+
+        Returns:
+            Index array including the size and mtime header
+        """
+        size = self.size
+        count = sum(len(block) for block in _newlines(self._data))
+        unterminated = size > 0 and self._data[size - 1] != NEWLINE
+        n_lines = count + unterminated
+
+        shape = (n_lines + 3,)
+        index = (
+            np.lib.format.open_memmap(target, mode="w+", dtype=np.int64, shape=shape)
+            if target is not None
+            else np.empty(shape, dtype=np.int64)
+        )
+        index[:3] = (size, mtime_ns, 0)
+        # Every newline starts the next line; the one ending the file (if
+        # any) gives the end offset
+        position = 3
+        for block in _newlines(self._data):
+            index[position : position + len(block)] = block + 1
+            position += len(block)
+        if unterminated:
+            index[-1] = size
+        if isinstance(index, np.memmap):
+            index.flush()
+        logger.info("Indexed %d lines of %s", n_lines, self.path)
+        return index
+
+
+class CorpusView:
+    """Lazy view of a range of lines of a Corpus."""
+
+    __slots__ = ("corpus", "start", "stop")
+
+    def __init__(self, corpus: Corpus, start: int, stop: int) -> None:
+        """Create a view of lines [start, stop).
+
+        Args:
+            corpus: Corpus the lines belong to
+            start: First line
+            stop: Line after the last one
+        """
+        self.corpus = corpus
+        self.start = start
+        self.stop = stop
+
+    def __reduce__(self) -> Any:
+        """Pickle as the corpus path and the line range."""
+        return (CorpusView, (self.corpus, self.start, self.stop))
+
+    def __len__(self) -> int:
+        """Return the number of lines in the view."""
+        return self.stop - self.start
+
+    def __getitem__(self, index: int) -> str:
+        """Return a line of the view.
+
+        Args:
+            index: Line number within the view
+
+        Returns:
+            Decoded line
+
+        Raises:
+            IndexError: If the line is outside the view
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"line {index} out of range for {len(self)} lines")
+        return self.corpus[self.start + index]
+
+    def __iter__(self) -> Iterator[str]:
+        """Yield the decoded lines of the view."""
+        for index in range(self.start, self.stop):
+            yield self.corpus[index]
+
+    @property
+    def byte_range(self) -> Tuple[int, int]:
+        """Return the (start, end) byte offsets the view covers."""
+        offsets = self.corpus.offsets
+        return int(offsets[self.start]), int(offsets[self.stop])
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Parse the lines of the view as JSON records.
+
+        Blank lines are skipped. Lines that are not JSON objects are yielded
+        as records with an "error" key, as in streaming.iter_jsonl.
+
+        Yields:
+            Parsed records
+        """
+        for index in range(self.start, self.stop):
+            line = bytes(self.corpus.raw(index))
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield {"error": f"Invalid JSON on line {index + 1}: {e}"}
+                continue
+            if not isinstance(record, dict):
+                yield {"error": f"Line {index + 1} is not a JSON object"}
+                continue
+            yield record
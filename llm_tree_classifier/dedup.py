@@ -0,0 +1,458 @@
+"""Exact and near-duplicate text deduplication.
+
+Repeated and templated texts (retweets, boilerplate, signatures) walk the
+same tree path and cost the same LLM calls every time. A Deduplicator groups
+the texts of a batch so that only one representative per group is
+classified, and fans the representative's result out to the other members.
+
+Exact duplicates are found by hashing the text after Unicode (NFKC) and
+whitespace normalization. With near=True, texts are also compared by
+MinHash signatures of their character shingles, computed with NumPy and
+looked up through locality-sensitive hashing (LSH) bands. A text joins a
+group when its estimated Jaccard similarity to the representative reaches
+the threshold.
+
+Results of recent representatives are remembered across batches, so
+duplicates spread over a JSONL stream are classified once:
+
+    classifier = TreeClassifier(config, llm, dedup=Deduplicator(near=True))
+    for record in classify_records(classifier, records):
+        ...
+"""
+
+import copy
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_WHITESPACE = re.compile(r"\s+")
+# Prime modulus of the MinHash permutations, small enough that a * x + b
+# never overflows uint64
+_PRIME = (1 << 31) - 1
+# Shingles hashed per permutation block, bounding the temporary matrix
+_SHINGLE_BLOCK = 4096
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a text for exact duplicate detection.
+
+    Applies NFKC normalization, collapses runs of whitespace to one space
+    and strips both ends. Case is kept, since trees may depend on it.
+
+    Args:
+        text: Text to normalize
+
+    Returns:
+        Normalized text
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def text_key(text: str) -> bytes:
+    """Return the exact duplicate key of a text.
+
+    Args:
+        text: Text to hash
+
+    Returns:
+        Digest of the normalized text
+    """
+    return hashlib.blake2b(
+        normalize_text(text).encode("utf-8"), digest_size=16
+    ).digest()
+
+
+class MinHasher:
+    """MinHash signatures of byte shingles of case-folded, normalized text."""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        """Draw the hash permutations.
+
+        Args:
+            num_perm: Number of permutations (signature length)
+            shingle_size: Length of the byte shingles
+            seed: Random seed of the permutations
+
+        Raises:
+            ValueError: If num_perm or shingle_size is not positive
+        """
+        if num_perm < 1 or shingle_size < 1:
+            raise ValueError("num_perm and shingle_size must be positive")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        # Polynomial rolling hash weights of the bytes of a shingle
+        self._weights = np.array(
+            [pow(257, i, 1 << 64) for i in reversed(range(shingle_size))],
+            dtype=np.uint64,
+        )
+
+    def shingles(self, text: str) -> np.ndarray:
+        """Hash the distinct byte shingles of a text.
+
+        Texts shorter than a shingle form a single shingle.
+
+        Args:
+            text: Text to shingle
+
+        Returns:
+            Sorted distinct shingle hashes below the prime modulus
+        """
+        data = np.frombuffer(
+            normalize_text(text).casefold().encode("utf-8"), dtype=np.uint8
+        )
+        size = min(self.shingle_size, len(data))
+        if size == 0:
+            return np.zeros(1, dtype=np.uint64)
+        windows = sliding_window_view(data, size).astype(np.uint64)
+        # Integer matmul wraps around modulo 2**64
+        hashes = windows @ self._weights[-size:]
+        return np.unique(hashes % _PRIME)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Compute the MinHash signature of a text.
+
+        Args:
+            text: Text to sign
+
+        Returns:
+            uint32 array of num_perm minimum hash values
+        """
+        shingles = self.shingles(text)
+        result = np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        for start in range(0, len(shingles), _SHINGLE_BLOCK):
+            block = shingles[None, start : start + _SHINGLE_BLOCK]
+            hashed = (self._a * block + self._b) % _PRIME
+            np.minimum(result, hashed.min(axis=1), out=result)
+        return result.astype(np.uint32)
+
+
+class _LSHIndex:
+    """Buckets of signature bands, mapping to the keys sharing them."""
+
+    __slots__ = ("_buckets", "bands", "rows")
+
+    def __init__(self, bands: int, rows: int) -> None:
+        self.bands = bands
+        self.rows = rows
+        self._buckets: Dict[bytes, Dict[Hashable, None]] = {}
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            band.to_bytes(2, "little")
+            + signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def add(self, key: Hashable, signature: np.ndarray) -> None:
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, {})[key] = None
+
+    def remove(self, key: Hashable, signature: np.ndarray) -> None:
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def candidates(self, signature: np.ndarray) -> Dict[Hashable, None]:
+        """Return the keys sharing at least one band, oldest first."""
+        found: Dict[Hashable, None] = {}
+        for band_key in self._band_keys(signature):
+            found.update(self._buckets.get(band_key, ()))
+        return found
+
+
+class DedupPlan(Generic[T]):
+    """Representatives of one batch and how to fan their results out.
+
+    Obtained from Deduplicator.plan. Classify plan.texts, then pass the
+    results to resolve() to get one result per input text.
+    """
+
+    __slots__ = ("_dedup", "_members", "_new", "_slots", "texts")
+
+    def __init__(self, dedup: "Deduplicator") -> None:
+        self._dedup = dedup
+        self.texts: List[str] = []
+        # Per input text: (index into texts, None) or (-1, remembered result)
+        self._slots: List[Tuple[int, Any]] = []
+        # Exact key and signature of each representative
+        self._new: List[Tuple[bytes, Optional[np.ndarray]]] = []
+        # Exact keys of near-duplicate members and their representative
+        self._members: List[Tuple[bytes, int]] = []
+
+    def resolve(self, results: Sequence[T]) -> List[T]:
+        """Fan the representatives' results out to all texts of the batch.
+
+        The results are remembered for later batches. Each text gets its own
+        shallow copy, so callers may modify the results.
+
+        Args:
+            results: Result of each text of plan.texts, in order
+
+        Returns:
+            Result of each input text, in input order
+
+        Raises:
+            ValueError: If the number of results does not match plan.texts
+        """
+        if len(results) != len(self.texts):
+            raise ValueError(f"Expected {len(self.texts)} results, got {len(results)}")
+        self._dedup._remember(self._new, self._members, results)
+        used = [False] * len(results)
+        resolved: List[T] = []
+        for index, known in self._slots:
+            if index < 0:
+                resolved.append(copy.copy(known))
+            elif used[index]:
+                resolved.append(copy.copy(results[index]))
+            else:
+                used[index] = True
+                resolved.append(results[index])
+        return resolved
+
+
+class Deduplicator:
+    """Groups duplicate texts so that each group is classified once.
+
+    Thread-safe; one instance belongs to one classifier, since remembered
+    results are only valid for the tree and model that produced them.
+    """
+
+    def __init__(
+        self,
+        near: bool = False,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 5,
+        max_entries: int = 100_000,
+        seed: int = 1,
+    ) -> None:
+        """Initialize the deduplicator.
+
+        Args:
+            near: Whether to group near-duplicates as well as exact ones
+            threshold: Minimum estimated Jaccard similarity of near-duplicates
+            num_perm: MinHash signature length
+            bands: Number of LSH bands; num_perm must be a multiple of it.
+                More bands find less similar candidates.
+            shingle_size: Length of the byte shingles compared
+            max_entries: Maximum number of results remembered across batches
+                (0 to only deduplicate within a batch). Least recently used
+                results are forgotten first.
+            seed: Random seed of the MinHash permutations
+
+        Raises:
+            ValueError: If a setting is out of range
+        """
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+        if bands < 1 or num_perm % bands:
+            raise ValueError("num_perm must be a positive multiple of bands")
+        if max_entries < 0:
+            raise ValueError("max_entries must not be negative")
+        self.near = near
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hasher = MinHasher(num_perm, shingle_size, seed) if near else None
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+        self._bands = bands
+        # Exact key -> (result, signature); signature is None for entries
+        # that only stand for an exact text and are not in the LSH index
+        self._memory: OrderedDict[bytes, Tuple[Any, Optional[np.ndarray]]] = (
+            OrderedDict()
+        )
+        self._index = _LSHIndex(bands, num_perm // bands)
+        self._lock = threading.Lock()
+
+    def plan(self, texts: Sequence[str]) -> DedupPlan:
+        """Group a batch of texts.
+
+        Args:
+            texts: Texts to classify
+
+        Returns:
+            Plan listing the representatives to classify
+        """
+        plan: DedupPlan = DedupPlan(self)
+        local_keys: Dict[bytes, int] = {}
+        local_signatures: List[Optional[np.ndarray]] = []
+        local_index = _LSHIndex(self._bands, self._index.rows) if self.near else None
+        exact = near = 0
+
+        with self._lock:
+            for text in texts:
+                key = text_key(text)
+                entry = self._memory.get(key)
+                if entry is not None:
+                    self._memory.move_to_end(key)
+                    plan._slots.append((-1, entry[0]))
+                    exact += 1
+                    continue
+                if key in local_keys:
+                    plan._slots.append((local_keys[key], None))
+                    exact += 1
+                    continue
+
+                signature = None
+                if self.hasher is not None:
+                    signature = self.hasher.signature(text)
+                    match = self._match(signature, self._index, self._signature)
+                    if match is not None:
+                        self._memory.move_to_end(match)
+                        result = self._memory[match][0]
+                        plan._slots.append((-1, result))
+                        self._store(key, result, None)
+                        near += 1
+                        continue
+                    local = self._match(
+                        signature, local_index, local_signatures.__getitem__
+                    )
+                    if local is not None:
+                        plan._slots.append((local, None))
+                        plan._members.append((key, local))
+                        local_keys[key] = local
+                        near += 1
+                        continue
+
+                index = len(plan.texts)
+                plan.texts.append(text)
+                plan._slots.append((index, None))
+                plan._new.append((key, signature))
+                local_keys[key] = index
+                local_signatures.append(signature)
+                if local_index is not None and signature is not None:
+                    local_index.add(index, signature)
+
+            self.exact_hits += exact
+            self.near_hits += near
+            self.misses += len(plan.texts)
+
+        if len(plan.texts) < len(texts):
+            logger.debug(
+                "Deduplicated %d texts to %d (%d exact, %d near)",
+                len(texts),
+                len(plan.texts),
+                exact,
+                near,
+            )
+        return plan
+
+    def classify(
+        self, texts: Sequence[str], classify_batch: Callable[[List[str]], List[T]]
+    ) -> List[T]:
+        """Classify the representatives of a batch and fan out their results.
+
+        Args:
+            texts: Texts to classify
+            classify_batch: Function classifying a list of texts
+
+        Returns:
+            Result of each text, in input order
+        """
+        plan = self.plan(texts)
+        return plan.resolve(classify_batch(plan.texts) if plan.texts else [])
+
+    def stats(self) -> Dict[str, Any]:
+        """Return deduplication statistics.
+
+        Returns:
+            Exact and near hits, misses (texts classified), the share of
+            texts not classified and the number of remembered results
+        """
+        with self._lock:
+            total = self.exact_hits + self.near_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "dedup_rate": (total - self.misses) / total if total else 0.0,
+                "entries": len(self._memory),
+            }
+
+    def clear(self) -> None:
+        """Forget all remembered results."""
+        with self._lock:
+            self._memory.clear()
+            self._index = _LSHIndex(self._bands, self._index.rows)
+
+    def _signature(self, key: bytes) -> Optional[np.ndarray]:
+        return self._memory[key][1]
+
+    def _match(
+        self,
+        signature: np.ndarray,
+        index: Optional[_LSHIndex],
+        signature_of: Callable[[Any], Optional[np.ndarray]],
+    ) -> Any:
+        """Return the most similar indexed key at or above the threshold."""
+        if index is None:
+            return None
+        best, best_similarity = None, 0.0
+        for key in index.candidates(signature):
+            other = signature_of(key)
+            similarity = float(np.count_nonzero(other == signature)) / len(signature)
+            # Ties go to the oldest candidate
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = key, similarity
+        return best
+
+    def _remember(
+        self,
+        new: List[Tuple[bytes, Optional[np.ndarray]]],
+        members: List[Tuple[bytes, int]],
+        results: Sequence[Any],
+    ) -> None:
+        """Remember the results of a resolved plan."""
+        if not self.max_entries:
+            return
+        with self._lock:
+            for (key, signature), result in zip(new, results, strict=True):
+                self._store(key, copy.copy(result), signature)
+            for key, index in members:
+                self._store(key, copy.copy(results[index]), None)
+
+    def _store(self, key: bytes, result: Any, signature: Optional[np.ndarray]) -> None:
+        """Add a result to memory, evicting the least recently used ones."""
+        if not self.max_entries:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None and previous[1] is not None:
+            self._index.remove(key, previous[1])
+        self._memory[key] = (result, signature)
+        if signature is not None:
+            self._index.add(key, signature)
+        while len(self._memory) > self.max_entries:
+            old_key, (_, old_signature) = self._memory.popitem(last=False)
+            if old_signature is not None:
+                self._index.remove(old_key, old_signature)
@@ -0,0 +1,540 @@
+"""Distilled per-node classifiers trained from recorded LLM decisions.
+
+Each decision node (identified by its question and options) gets a
+multinomial logistic regression over hashed word n-grams of the document.
+Models are trained with NumPy only, from recordings written by
+RecordingBackend, and saved in one .npz file next to the tree
+configuration. DistilledBackend answers nodes with these models when they
+are confident and asks the LLM otherwise.
+
+Train from the command line:
+
+    python -m llm_tree_classifier distill --config tree_config.yaml \\
+        --recording run.jsonl
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import re
+import zlib
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FEATURES = 2**18
+WORD_PATTERN = re.compile(r"\w+")
+# Fewer examples than this are all used for training, without a holdout
+MIN_HOLDOUT_EXAMPLES = 20
+
+# (question, options)
+NodeKey = Tuple[str, Tuple[str, ...]]
+
+
+class HashedFeatures(NamedTuple):
+    """Sparse rows of hashed n-gram features, in CSR layout."""
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    values: np.ndarray
+
+    @property
+    def n_rows(self) -> int:
+        """Number of documents."""
+        return len(self.indptr) - 1
+
+    def row_ids(self) -> np.ndarray:
+        """Return the row of every stored value."""
+        return np.repeat(np.arange(self.n_rows), np.diff(self.indptr))
+
+    def take(self, rows: np.ndarray) -> "HashedFeatures":
+        """Return the selected rows.
+
+        Args:
+            rows: Row indices
+
+        Returns:
+            Features of those rows, in the given order
+        """
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        indptr = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        # Position in the new rows, shifted to the start of the old row
+        picks = np.arange(indptr[-1]) + np.repeat(starts - indptr[:-1], lengths)
+        return HashedFeatures(indptr, self.indices[picks], self.values[picks])
+
+
+def hash_features(
+    texts: Sequence[str], n_features: int = DEFAULT_FEATURES, ngram: int = 2
+) -> HashedFeatures:
+    """Turn texts into hashed, log-scaled, L2-normalized n-gram counts.
+
+    Args:
+        texts: Documents
+        n_features: Size of the hashed feature space
+        ngram: Longest word n-gram to include
+
+    Returns:
+        Sparse feature rows
+    """
+    indptr = [0]
+    indices: List[int] = []
+    values: List[float] = []
+    for text in texts:
+        words = WORD_PATTERN.findall(text.lower())
+        counts: Dict[int, int] = {}
+        for n in range(1, ngram + 1):
+            for start in range(len(words) - n + 1):
+                gram = " ".join(words[start : start + n])
+                index = zlib.crc32(gram.encode("utf-8")) % n_features
+                counts[index] = counts.get(index, 0) + 1
+        row = np.log1p(np.fromiter(counts.values(), np.float32, len(counts)))
+        norm = float(np.sqrt(row @ row)) if len(row) else 0.0
+        indices.extend(counts)
+        values.extend(row / norm if norm else row)
+        indptr.append(len(indices))
+    return HashedFeatures(
+        np.asarray(indptr, np.int64),
+        np.asarray(indices, np.int64),
+        np.asarray(values, np.float32),
+    )
+
+
+class NodeModel:
+    """Logistic regression answering one decision node."""
+
+    def __init__(
+        self,
+        question: str,
+        options: Sequence[str],
+        weights: np.ndarray,
+        bias: np.ndarray,
+        accuracy: Optional[float] = None,
+        samples: int = 0,
+    ) -> None:
+        """Initialize the model.
+
+        Args:
+            question: Node question
+            options: Node options, one class each
+            weights: Weight matrix of shape (n_features, len(options))
+            bias: Bias vector of shape (len(options),)
+            accuracy: Agreement with the LLM on held-out decisions
+            samples: Number of recorded decisions it was trained on
+        """
+        self.question = question
+        self.options = tuple(options)
+        self.weights = weights
+        self.bias = bias
+        self.accuracy = accuracy
+        self.samples = samples
+
+    @property
+    def key(self) -> NodeKey:
+        """(question, options) identifying the node."""
+        return self.question, self.options
+
+    def predict_proba(self, features: HashedFeatures) -> np.ndarray:
+        """Return option probabilities for feature rows.
+
+        Args:
+            features: Hashed document features
+
+        Returns:
+            Array of shape (rows, options)
+        """
+        return _softmax(_logits(self.weights, self.bias, features))
+
+
+class DistilledModels:
+    """Distilled node models of one tree configuration."""
+
+    def __init__(
+        self,
+        models: Iterable[NodeModel],
+        n_features: int = DEFAULT_FEATURES,
+        ngram: int = 2,
+    ) -> None:
+        """Initialize the collection.
+
+        Args:
+            models: Node models
+            n_features: Size of the hashed feature space the models use
+            ngram: Longest word n-gram of the features
+        """
+        self.models: Dict[NodeKey, NodeModel] = {model.key: model for model in models}
+        self.n_features = n_features
+        self.ngram = ngram
+
+    def __len__(self) -> int:
+        """Return the number of node models."""
+        return len(self.models)
+
+    def get(self, question: str, options: Sequence[str]) -> Optional[NodeModel]:
+        """Return the model of a node, if there is one.
+
+        Args:
+            question: Node question
+            options: Node options
+
+        Returns:
+            The node model or None
+        """
+        return self.models.get((question, tuple(options)))
+
+    def features(self, texts: Sequence[str]) -> HashedFeatures:
+        """Hash documents into the models' feature space.
+
+        Args:
+            texts: Documents
+
+        Returns:
+            Sparse feature rows
+        """
+        return hash_features(texts, self.n_features, self.ngram)
+
+    @property
+    def digest(self) -> str:
+        """Short hash of all weights, identifying this set of models."""
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(f"{self.n_features}:{self.ngram}".encode())
+        for key in sorted(self.models):
+            model = self.models[key]
+            digest.update(repr(key).encode("utf-8"))
+            digest.update(model.weights.tobytes())
+            digest.update(model.bias.tobytes())
+        return digest.hexdigest()
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Save the models to a compressed .npz file.
+
+        Args:
+            path: Output file
+        """
+        meta: Dict[str, Any] = {
+            "n_features": self.n_features,
+            "ngram": self.ngram,
+            "nodes": [],
+        }
+        arrays: Dict[str, Any] = {}
+        for i, model in enumerate(self.models.values()):
+            meta["nodes"].append(
+                {
+                    "question": model.question,
+                    "options": list(model.options),
+                    "accuracy": model.accuracy,
+                    "samples": model.samples,
+                }
+            )
+            arrays[f"weights_{i}"] = model.weights
+            arrays[f"bias_{i}"] = model.bias
+        with open(path, "wb") as f:
+            np.savez_compressed(f, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "DistilledModels":
+        """Load models saved with save.
+
+        Args:
+            path: .npz file
+
+        Returns:
+            The loaded models
+        """
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            models = [
+                NodeModel(
+                    node["question"],
+                    node["options"],
+                    data[f"weights_{i}"],
+                    data[f"bias_{i}"],
+                    accuracy=node["accuracy"],
+                    samples=node["samples"],
+                )
+                for i, node in enumerate(meta["nodes"])
+            ]
+        return cls(models, n_features=meta["n_features"], ngram=meta["ngram"])
+
+
+def distilled_path(config_path: Union[str, Path]) -> Path:
+    """Return where the distilled models of a configuration are saved.
+
+    Args:
+        config_path: Path of the tree configuration
+
+    Returns:
+        "<config>.distilled.npz" next to the configuration
+    """
+    config_path = Path(config_path)
+    return config_path.with_name(config_path.stem + ".distilled.npz")
+
+
+def train_node_model(
+    question: str,
+    options: Sequence[str],
+    texts: Sequence[str],
+    answers: Sequence[str],
+    n_features: int = DEFAULT_FEATURES,
+    ngram: int = 2,
+    epochs: int = 10,
+    learning_rate: float = 1.0,
+    l2: float = 1e-4,
+    batch_size: int = 256,
+    holdout: float = 0.1,
+    seed: int = 0,
+) -> NodeModel:
+    """Train a logistic regression reproducing the LLM's answers at a node.
+
+    Training uses mini-batch gradient descent with AdaGrad step sizes on the
+    softmax cross-entropy. Updates only touch the weight rows of features
+    present in the batch.
+
+    Args:
+        question: Node question
+        options: Node options
+        texts: Document of each recorded decision
+        answers: LLM answer of each recorded decision
+        n_features: Size of the hashed feature space
+        ngram: Longest word n-gram of the features
+        epochs: Passes over the training data
+        learning_rate: Base step size
+        l2: L2 penalty, applied to the rows touched by a batch
+        batch_size: Decisions per gradient step
+        holdout: Fraction of decisions kept aside to measure accuracy
+        seed: Seed for shuffling and the held-out split
+
+    Returns:
+        The trained model
+
+    Raises:
+        ValueError: If an answer is not one of the options
+    """
+    column = {option: k for k, option in enumerate(options)}
+    try:
+        labels = np.asarray([column[answer] for answer in answers], np.int64)
+    except KeyError as e:
+        raise ValueError(f"Answer {e} is not one of {list(options)}") from e
+    features = hash_features(texts, n_features, ngram)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(labels))
+    n_holdout = int(len(labels) * holdout) if len(labels) >= MIN_HOLDOUT_EXAMPLES else 0
+    test, train = order[:n_holdout], order[n_holdout:]
+
+    weights = np.zeros((n_features, len(options)), np.float32)
+    # Sum of squared gradients per weight, for AdaGrad step sizes
+    history = np.zeros_like(weights)
+    # Start from the answer frequencies
+    counts = np.bincount(labels[train], minlength=len(options)) + 1.0
+    bias = np.log(counts / counts.sum()).astype(np.float32)
+
+    for _ in range(epochs):
+        rng.shuffle(train)
+        for start in range(0, len(train), batch_size):
+            batch = features.take(train[start : start + batch_size])
+            y = labels[train[start : start + batch_size]]
+            gradient = _softmax(_logits(weights, bias, batch))
+            gradient[np.arange(len(y)), y] -= 1.0
+            gradient /= len(y)
+
+            touched, inverse = np.unique(batch.indices, return_inverse=True)
+            rows = batch.row_ids()
+            update = np.zeros((len(touched), len(options)), np.float32)
+            for k in range(len(options)):
+                update[:, k] = np.bincount(
+                    inverse,
+                    weights=batch.values * gradient[rows, k],
+                    minlength=len(touched),
+                )
+            update += l2 * weights[touched]
+            history[touched] += update**2
+            weights[touched] -= (
+                learning_rate * update / (np.sqrt(history[touched]) + 1e-8)
+            )
+            bias -= learning_rate * gradient.sum(axis=0)
+
+    accuracy = None
+    if n_holdout:
+        predicted = _logits(weights, bias, features.take(test)).argmax(axis=1)
+        accuracy = float((predicted == labels[test]).mean())
+    return NodeModel(
+        question, options, weights, bias, accuracy=accuracy, samples=len(labels)
+    )
+
+
+def train_from_recording(
+    paths: Iterable[Union[str, Path]],
+    min_samples: int = 100,
+    n_features: int = DEFAULT_FEATURES,
+    ngram: int = 2,
+    **kwargs: Any,
+) -> DistilledModels:
+    """Train a model for every node with enough recorded decisions.
+
+    Args:
+        paths: Recording files written by RecordingBackend
+        min_samples: Nodes with fewer recorded decisions get no model
+        n_features: Size of the hashed feature space
+        ngram: Longest word n-gram of the features
+        **kwargs: Further arguments for train_node_model
+
+    Returns:
+        The trained models
+    """
+    from llm_tree_classifier.llm.recording import read_recording
+
+    # Node -> latest answer per document
+    decisions: Dict[NodeKey, Dict[str, str]] = {}
+    for path in paths:
+        for document, question, responses, answer in read_recording(path):
+            decisions.setdefault((question, tuple(responses)), {})[document] = answer
+
+    models = []
+    for (question, options), answers in decisions.items():
+        if len(answers) < min_samples:
+            logger.info(
+                "Skipping node %r: %d decisions (< %d)",
+                question,
+                len(answers),
+                min_samples,
+            )
+            continue
+        model = train_node_model(
+            question,
+            options,
+            list(answers),
+            list(answers.values()),
+            n_features=n_features,
+            ngram=ngram,
+            **kwargs,
+        )
+        logger.info(
+            "Trained node %r on %d decisions, held-out accuracy %s",
+            question,
+            model.samples,
+            "n/a" if model.accuracy is None else f"{model.accuracy:.3f}",
+        )
+        models.append(model)
+    return DistilledModels(models, n_features=n_features, ngram=ngram)
+
+
+def _logits(
+    weights: np.ndarray, bias: np.ndarray, features: HashedFeatures
+) -> np.ndarray:
+    """Return features @ weights + bias for sparse feature rows."""
+    rows = features.row_ids()
+    contributions = weights[features.indices] * features.values[:, None]
+    logits = np.empty((features.n_rows, weights.shape[1]), np.float32)
+    for k in range(weights.shape[1]):
+        logits[:, k] = np.bincount(
+            rows, weights=contributions[:, k], minlength=features.n_rows
+        )
+    logits += bias
+    return logits
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    """Row-wise softmax."""
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probabilities: np.ndarray = shifted / shifted.sum(axis=1, keepdims=True)
+    return probabilities
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments of the distill command.
+
+    Args:
+        argv: Arguments after 'distill' (defaults to sys.argv)
+
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m llm_tree_classifier distill",
+        description="Train distilled node classifiers from recorded decisions.",
+    )
+    parser.add_argument(
+        "--config",
+        type=Path,
+        required=True,
+        help="Tree configuration; models are saved next to it",
+    )
+    parser.add_argument(
+        "--recording",
+        type=Path,
+        action="append",
+        required=True,
+        help="Recording written by RecordingBackend (repeatable)",
+    )
+    parser.add_argument(
+        "--output", type=Path, help="Output file (default: <config>.distilled.npz)"
+    )
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=100,
+        help="Minimum recorded decisions for a node to get a model (default: 100)",
+    )
+    parser.add_argument(
+        "--features",
+        type=int,
+        default=DEFAULT_FEATURES,
+        help=f"Hashed feature space size (default: {DEFAULT_FEATURES})",
+    )
+    parser.add_argument(
+        "--ngram", type=int, default=2, help="Longest word n-gram (default: 2)"
+    )
+    parser.add_argument(
+        "--epochs", type=int, default=10, help="Training epochs (default: 10)"
+    )
+    parser.add_argument(
+        "--verbose", "-v", action="store_true", help="Enable verbose logging"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Train and save distilled models.
+
+    Args:
+        argv: Arguments after 'distill'
+
+    Returns:
+        Exit code (0 for success, non-zero for error)
+    """
+    from llm_tree_classifier.exceptions import LLMError
+
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    try:
+        models = train_from_recording(
+            args.recording,
+            min_samples=args.min_samples,
+            n_features=args.features,
+            ngram=args.ngram,
+            epochs=args.epochs,
+        )
+    except (LLMError, ValueError) as e:
+        logger.error("Training failed: %s", e)
+        return 1
+    output = args.output or distilled_path(args.config)
+    models.save(output)
+    logger.info("Saved %d node models to %s", len(models), output)
+    return 0
@@ -0,0 +1,286 @@
+"""Token-budgeted preparation of long documents.
+
+A tree can bound the number of document tokens sent with every prompt:
+
+    trees:
+      - name: topic
+        documents:
+          token_budget: 1500
+          strategy: chunk        # head, tail, head_tail (default) or chunk
+          overlap: 64            # chunk only
+          max_chunks: 8          # chunk only
+          reduce: any            # chunk only: majority (default) or any
+          any_option: "yes"      # answer when any chunk answers it
+        root: ...
+
+Documents within the budget are used unchanged. Longer documents are cut to
+their head, tail, or head and tail, or split into chunks. With chunks, every
+node asks one prompt per chunk in a single batch and reduces the answers.
+Texts are tokenized with the backend's tokenizer (whitespace-separated words
+when the backend has none), and tokenizers cache recent texts, so measuring
+a document costs one tokenization however many trees and nodes see it.
+"""
+
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+STRATEGIES = ("head", "tail", "head_tail", "chunk")
+REDUCERS = ("majority", "any")
+
+# Marks the cut between head and tail
+ELLIPSIS = "\n...\n"
+
+
+class Tokenizer(ABC):
+    """Base class for tokenizers used to budget documents.
+
+    Subclasses implement encode and decode; tokenize adds a thread-safe LRU
+    cache of recently tokenized texts.
+    """
+
+    def __init__(self, cache_size: int = 1024) -> None:
+        """Initialize the tokenizer.
+
+        Args:
+            cache_size: Number of tokenized texts kept
+        """
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, Sequence[Hashable]] = OrderedDict()
+
+    @abstractmethod
+    def encode(self, text: str) -> Sequence[Hashable]:
+        """Split text into tokens.
+
+        Args:
+            text: Text to tokenize
+
+        Returns:
+            Tokens
+        """
+        pass
+
+    @abstractmethod
+    def decode(self, tokens: Sequence[Hashable]) -> str:
+        """Turn a contiguous run of tokens back into text.
+
+        Args:
+            tokens: Tokens returned by encode, or a slice of them
+
+        Returns:
+            Text
+        """
+        pass
+
+    def tokenize(self, text: str) -> Sequence[Hashable]:
+        """Return the tokens of a text, from the cache when possible.
+
+        Args:
+            text: Text to tokenize
+
+        Returns:
+            Tokens
+        """
+        with self._lock:
+            tokens = self._cache.get(text)
+            if tokens is not None:
+                self._cache.move_to_end(text)
+                return tokens
+        tokens = self.encode(text)
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache[text] = tokens
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return tokens
+
+
+class WhitespaceTokenizer(Tokenizer):
+    """Tokenizer counting whitespace-separated words.
+
+    Each token keeps its trailing whitespace, so decoding a slice restores
+    the original text.
+    """
+
+    _pattern = re.compile(r"\s*\S+\s*")
+
+    def encode(self, text: str) -> Sequence[Hashable]:
+        """Split text into words with their surrounding whitespace."""
+        return self._pattern.findall(text)
+
+    def decode(self, tokens: Sequence[Hashable]) -> str:
+        """Join words back into text."""
+        return "".join(tokens)  # type: ignore[arg-type]
+
+
+# Used for backends that do not expose a tokenizer
+default_tokenizer = WhitespaceTokenizer()
+
+
+def tokenizer_for(llm: Any) -> Tokenizer:
+    """Return the tokenizer of a backend, or the whitespace tokenizer.
+
+    Args:
+        llm: LLM backend (sync or async)
+
+    Returns:
+        Tokenizer to budget documents with
+    """
+    return getattr(llm, "tokenizer", None) or default_tokenizer
+
+
+class DocumentPolicy:
+    """How documents longer than a tree's token budget are prepared."""
+
+    __slots__ = (
+        "any_option",
+        "head_ratio",
+        "max_chunks",
+        "overlap",
+        "reduce",
+        "strategy",
+        "token_budget",
+    )
+
+    def __init__(
+        self,
+        token_budget: int,
+        strategy: str = "head_tail",
+        head_ratio: float = 0.5,
+        overlap: int = 0,
+        max_chunks: Optional[int] = None,
+        reduce: str = "majority",
+        any_option: Optional[str] = None,
+    ) -> None:
+        """Initialize the policy.
+
+        Args:
+            token_budget: Maximum document tokens per prompt
+            strategy: "head", "tail", "head_tail" or "chunk"
+            head_ratio: Share of the budget given to the head with head_tail
+            overlap: Tokens shared by consecutive chunks
+            max_chunks: Maximum chunks per document (None for no limit);
+                chunks are spread evenly over longer documents
+            reduce: How chunk answers are combined: "majority" (ties go to
+                the earlier option) or "any"
+            any_option: With reduce "any", the option answered when any
+                chunk answers it; nodes without this option use majority
+
+        Raises:
+            ValueError: If a setting is invalid
+        """
+        if token_budget < 1:
+            raise ValueError(f"token_budget must be positive, got {token_budget}")
+        if strategy not in STRATEGIES:
+            raise ValueError(
+                f"Unknown document strategy '{strategy}'. Expected one of {STRATEGIES}"
+            )
+        if not 0 <= overlap < token_budget:
+            raise ValueError("overlap must be at least 0 and below token_budget")
+        if reduce not in REDUCERS:
+            raise ValueError(
+                f"Unknown reduce mode '{reduce}'. Expected one of {REDUCERS}"
+            )
+        if reduce == "any" and any_option is None:
+            raise ValueError("reduce 'any' needs an any_option")
+        if max_chunks is not None and max_chunks < 1:
+            raise ValueError("max_chunks must be positive")
+        self.token_budget = token_budget
+        self.strategy = strategy
+        self.head_ratio = min(max(head_ratio, 0.0), 1.0)
+        self.overlap = overlap
+        self.max_chunks = max_chunks
+        self.reduce = reduce
+        self.any_option = any_option
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "DocumentPolicy":
+        """Create a policy from the 'documents' section of a tree.
+
+        Args:
+            config: Policy settings; 'token_budget' is required
+
+        Returns:
+            A new DocumentPolicy
+
+        Raises:
+            ValueError: If a setting is missing or invalid
+        """
+        if "token_budget" not in config:
+            raise ValueError("Tree 'documents' settings need a token_budget")
+        return cls(
+            token_budget=int(config["token_budget"]),
+            strategy=config.get("strategy", "head_tail"),
+            head_ratio=float(config.get("head_ratio", 0.5)),
+            overlap=int(config.get("overlap", 0)),
+            max_chunks=config.get("max_chunks"),
+            reduce=config.get("reduce", "majority"),
+            any_option=config.get("any_option"),
+        )
+
+    def prepare(self, text: str, tokenizer: Tokenizer) -> List[str]:
+        """Fit a text into the token budget.
+
+        Args:
+            text: The text being classified
+            tokenizer: Tokenizer matching the backend
+
+        Returns:
+            The text itself if it fits, otherwise one truncated text or,
+            with the chunk strategy, several chunks
+        """
+        tokens = tokenizer.tokenize(text)
+        budget = self.token_budget
+        if len(tokens) <= budget:
+            return [text]
+        if self.strategy == "head":
+            return [tokenizer.decode(tokens[:budget])]
+        if self.strategy == "tail":
+            return [tokenizer.decode(tokens[-budget:])]
+        if self.strategy == "head_tail":
+            head = int(budget * self.head_ratio)
+            tail = budget - head
+            parts = [tokenizer.decode(tokens[:head]) if head else ""]
+            parts.append(tokenizer.decode(tokens[-tail:]) if tail else "")
+            return [ELLIPSIS.join(part for part in parts if part)]
+
+        step = budget - self.overlap
+        starts = list(range(0, len(tokens) - self.overlap, step))
+        if self.max_chunks is not None and len(starts) > self.max_chunks:
+            # Spread the allowed chunks evenly, always keeping both ends
+            last = len(starts) - 1
+            picks = (
+                [0]
+                if self.max_chunks == 1
+                else [
+                    round(i * last / (self.max_chunks - 1))
+                    for i in range(self.max_chunks)
+                ]
+            )
+            starts = [starts[i] for i in picks]
+        return [tokenizer.decode(tokens[start : start + budget]) for start in starts]
+
+    def combine(self, responses: Sequence[str], valid_responses: List[str]) -> str:
+        """Reduce the answers of a node's chunk prompts to one answer.
+
+        Args:
+            responses: Answer per chunk
+            valid_responses: Options of the node
+
+        Returns:
+            The combined answer
+        """
+        if self.reduce == "any" and self.any_option in valid_responses:
+            if self.any_option in responses:
+                return self.any_option
+        counts: Dict[str, int] = {}
+        for response in responses:
+            counts[response] = counts.get(response, 0) + 1
+        # Options first, in order, then anything the backend made up
+        candidates = list(valid_responses) + [
+            response for response in counts if response not in valid_responses
+        ]
+        return max(candidates, key=lambda option: counts.get(option, 0))
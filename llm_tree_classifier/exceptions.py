@@ -14,4 +14,8 @@ class InvalidTreeConfigError(LLMTreeClassifierError):
 
 
 class LLMError(LLMTreeClassifierError):
-    """Raised when there is an error with the LLM backend.""" 
\ No newline at end of file
+    """Raised when there is an error with the LLM backend."""
+
+
+class JobError(LLMTreeClassifierError):
+    """Raised when a bulk classification job cannot be started or resumed."""
@@ -0,0 +1,306 @@
+"""Traversal and backend instrumentation.
+
+Instrumentation is process-wide and off by default. Install hooks with
+set_hooks (or enable, which installs a MetricsRecorder); traversal code reads
+the module-level ``hooks`` once per call and only takes the instrumented
+path when it is set, so disabled instrumentation costs one attribute lookup
+per classify call.
+"""
+
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Hooks:
+    """Callbacks invoked during classification.
+
+    All methods do nothing by default; subclass and override the ones you
+    need. Callbacks may run on several threads at once.
+    """
+
+    def node_enter(self, tree: str, node: int) -> None:
+        """Called before the LLM is asked at a decision node.
+
+        Args:
+            tree: Tree name
+            node: Compiled node id
+        """
+
+    def node_exit(
+        self,
+        tree: str,
+        node: int,
+        question: str,
+        response: str,
+        seconds: float,
+        fallback: bool,
+    ) -> None:
+        """Called after a decision node was answered.
+
+        Args:
+            tree: Tree name
+            node: Compiled node id
+            question: Node question
+            response: Response returned by the backend
+            seconds: Time spent in the backend for this node. In batch
+                traversal the batch time is split evenly over its prompts.
+            fallback: Whether the response matched no option and the first
+                option's child was taken
+        """
+
+    def rule_hit(self, tree: str, node: int, question: str, response: str) -> None:
+        """Called when a node rule picked an option without asking the LLM.
+
+        Args:
+            tree: Tree name
+            node: Compiled node id
+            question: Node question
+            response: Option picked by the rule
+        """
+
+    def tokens(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """Called by backends after evaluating prompts.
+
+        Args:
+            prompt_tokens: Number of prompt tokens evaluated
+            completion_tokens: Number of generated or scored option tokens
+        """
+
+    def cache(self, hit: bool) -> None:
+        """Called by caching backends for every lookup.
+
+        Args:
+            hit: Whether the decision was found in the cache
+        """
+
+    def backend_fallback(self) -> None:
+        """Called when a backend could not match generated text to an option."""
+
+
+class _NodeStats:
+    """Aggregated measurements of one node."""
+
+    __slots__ = (
+        "fallbacks",
+        "max_seconds",
+        "question",
+        "rule_hits",
+        "seconds",
+        "visits",
+    )
+
+    def __init__(self, question: str) -> None:
+        self.question = question
+        self.visits = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.fallbacks = 0
+        self.rule_hits = 0
+
+
+class MetricsRecorder(Hooks):
+    """Hooks that aggregate per-node and backend metrics in memory."""
+
+    def __init__(self) -> None:
+        """Initialize an empty recorder."""
+        self._lock = threading.Lock()
+        self._nodes: Dict[Tuple[str, int], _NodeStats] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.backend_fallbacks = 0
+
+    def node_exit(
+        self,
+        tree: str,
+        node: int,
+        question: str,
+        response: str,
+        seconds: float,
+        fallback: bool,
+    ) -> None:
+        """Record one answered node."""
+        with self._lock:
+            stats = self._stats(tree, node, question)
+            stats.visits += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.fallbacks += fallback
+
+    def rule_hit(self, tree: str, node: int, question: str, response: str) -> None:
+        """Record one node decided by a rule."""
+        with self._lock:
+            self._stats(tree, node, question).rule_hits += 1
+
+    def tokens(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """Record evaluated tokens."""
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def cache(self, hit: bool) -> None:
+        """Record a cache lookup."""
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def backend_fallback(self) -> None:
+        """Record a backend fallback."""
+        with self._lock:
+            self.backend_fallbacks += 1
+
+    def reset(self) -> None:
+        """Clear all measurements."""
+        with self._lock:
+            self._nodes.clear()
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self.backend_fallbacks = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return all measurements as a JSON-serializable dictionary.
+
+        Returns:
+            Backend counters and per-node statistics, slowest nodes first
+        """
+        with self._lock:
+            nodes: List[Dict[str, Any]] = [
+                {
+                    "tree": tree,
+                    "node": node,
+                    "question": stats.question,
+                    "visits": stats.visits,
+                    "seconds": stats.seconds,
+                    "mean_seconds": (
+                        stats.seconds / stats.visits if stats.visits else 0.0
+                    ),
+                    "max_seconds": stats.max_seconds,
+                    "fallbacks": stats.fallbacks,
+                    "rule_hits": stats.rule_hits,
+                }
+                for (tree, node), stats in self._nodes.items()
+            ]
+            counters = {
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "backend_fallbacks": self.backend_fallbacks,
+            }
+        nodes.sort(key=lambda entry: entry["seconds"], reverse=True)
+        return {**counters, "nodes": nodes}
+
+    def to_json(self) -> str:
+        """Export the measurements as JSON.
+
+        Returns:
+            JSON document of snapshot()
+        """
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self) -> str:
+        """Export the measurements in the Prometheus text format.
+
+        Returns:
+            Exposition text
+        """
+        snapshot = self.snapshot()
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for key, help_text in (
+            ("prompt_tokens", "Prompt tokens evaluated by the backend."),
+            ("completion_tokens", "Completion or option tokens evaluated."),
+            ("cache_hits", "Decision cache hits."),
+            ("cache_misses", "Decision cache misses."),
+            ("backend_fallbacks", "Backend answers that matched no option."),
+        ):
+            name = f"llm_tree_{key}_total"
+            metric(name, "counter", help_text)
+            lines.append(f"{name} {snapshot[key]}")
+
+        node_metrics = (
+            ("visits", "llm_tree_node_visits_total", "counter", "Node visits."),
+            (
+                "seconds",
+                "llm_tree_node_seconds_total",
+                "counter",
+                "Backend time spent at the node.",
+            ),
+            (
+                "max_seconds",
+                "llm_tree_node_max_seconds",
+                "gauge",
+                "Slowest backend time at the node.",
+            ),
+            (
+                "fallbacks",
+                "llm_tree_node_fallbacks_total",
+                "counter",
+                "Responses that matched no option at the node.",
+            ),
+            (
+                "rule_hits",
+                "llm_tree_node_rule_hits_total",
+                "counter",
+                "Decisions made by node rules without the LLM.",
+            ),
+        )
+        for key, name, kind, help_text in node_metrics:
+            metric(name, kind, help_text)
+            for entry in snapshot["nodes"]:
+                labels = f'tree="{_escape_label(entry["tree"])}",node="{entry["node"]}"'
+                lines.append(f"{name}{{{labels}}} {entry[key]}")
+
+        return "\n".join(lines) + "\n"
+
+    def _stats(self, tree: str, node: int, question: str) -> _NodeStats:
+        """Return the statistics of a node; the caller holds the lock."""
+        stats = self._nodes.get((tree, node))
+        if stats is None:
+            stats = self._nodes[(tree, node)] = _NodeStats(question)
+        return stats
+
+
+def _escape_label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Installed hooks, or None when instrumentation is disabled
+hooks: Optional[Hooks] = None
+
+
+def set_hooks(new_hooks: Optional[Hooks]) -> None:
+    """Install process-wide hooks, or disable instrumentation with None.
+
+    Args:
+        new_hooks: Hooks to install
+    """
+    global hooks  # noqa: PLW0603
+    hooks = new_hooks
+
+
+def enable() -> MetricsRecorder:
+    """Install a new MetricsRecorder.
+
+    Returns:
+        The installed recorder
+    """
+    recorder = MetricsRecorder()
+    set_hooks(recorder)
+    return recorder
+
+
+def disable() -> None:
+    """Remove installed hooks."""
+    set_hooks(None)
@@ -0,0 +1,523 @@
+"""Resumable, checkpointed classification of large JSONL files.
+
+A job reads its input through a memory-mapped Corpus, whose line index is
+saved beside the input, so planning shards and resuming a job never scan
+the file again. The input is split into shards of roughly equal byte size,
+cut at line boundaries, and classified in order. Each shard is written to its own
+output file in the job directory, atomically (temporary file, fsync,
+rename), and then marked done in the job manifest, which is replaced
+atomically as well. A job that stops partway is continued with resume=True
+(--resume on the command line): completed shards are skipped and a shard
+that was interrupted is classified again from its start.
+
+Shard boundaries depend only on the input file and the shard size. Within
+a shard, records are classified in input order in batches of a fixed size,
+and the classifier's Deduplicator (if any) is cleared before every shard,
+so a shard's output depends on its records, the trees, the model and the
+batch size, but not on the number of workers or on which shards an earlier
+run completed. merge_outputs concatenates the shards into one file in input
+order.
+
+Resuming trusts what is on disk: a shard marked done in the manifest whose
+output file exists is never classified again. The manifest identifies the
+input by path, size and modification time, and the caller's fingerprint
+should cover everything else that changes the output. The command line
+fingerprint covers the tree configuration, the model file, the tree name,
+the scoring mode and the deduplication settings, but not the package
+version or backend settings such as the context size, so changing those
+between runs yields a mixed output. An interrupted shard is classified
+again from its start; a backend that is not deterministic (for example
+with GPU offload) may then answer some of its records differently than the
+first time. Log-probabilities decoded in a multi-sequence batch can also
+differ in their last bits with the batch's composition, which may flip an
+answer whose options score almost equally.
+
+    python -m llm_tree_classifier job --config trees.yaml --model model.gguf \
+        --input corpus.jsonl --output-dir corpus.job --workers 4 --resume
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, List, NamedTuple, Optional, Union
+
+from llm_tree_classifier.corpus import Corpus, CorpusView
+from llm_tree_classifier.exceptions import JobError
+from llm_tree_classifier.streaming import classify_records
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+DEFAULT_SHARD_BYTES = 64 * 1024 * 1024
+
+
+class Shard(NamedTuple):
+    """Byte range [start, end) of the input, starting at a line boundary."""
+
+    shard_id: int
+    start: int
+    end: int
+
+
+class JobReport(NamedTuple):
+    """Outcome of run_job."""
+
+    shards: int
+    skipped: int
+    records: int
+    seconds: float
+
+
+def plan_shards(path: Union[str, Path], shard_bytes: int) -> List[Shard]:
+    """Split a file into line-aligned byte ranges.
+
+    Each shard ends after the first newline at or beyond shard_bytes from
+    its start, so no line is split and the plan only depends on the file
+    content and shard_bytes. The file's line index is built and saved on
+    first use.
+
+    Args:
+        path: Input file
+        shard_bytes: Target shard size in bytes
+
+    Returns:
+        Shards covering the whole file, in order
+
+    Raises:
+        ValueError: If shard_bytes is not positive
+    """
+    with Corpus(path) as corpus:
+        return _plan(corpus, shard_bytes)
+
+
+def _plan(corpus: Corpus, shard_bytes: int) -> List[Shard]:
+    """Plan the shards of an open corpus."""
+    return [
+        Shard(shard_id, *view.byte_range)
+        for shard_id, view in enumerate(corpus.split(shard_bytes))
+    ]
+
+
+def shard_path(output_dir: Union[str, Path], index: int) -> Path:
+    """Return the output file of a shard.
+
+    Args:
+        output_dir: Job directory
+        index: Shard index
+
+    Returns:
+        Path of the shard's output file
+    """
+    return Path(output_dir) / f"part-{index:05d}.jsonl"
+
+
+def _input_identity(path: Union[str, Path]) -> Dict[str, Any]:
+    """Return what identifies the input file across runs."""
+    stat = os.stat(path)
+    return {
+        "path": str(Path(path).resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def _write_atomic(path: Path, write: Any) -> None:
+    """Write a file through a temporary file, fsync it and rename it.
+
+    Args:
+        path: Destination
+        write: Callable receiving the open text stream
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_manifest(output_dir: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """Load the manifest of a job directory.
+
+    Args:
+        output_dir: Job directory
+
+    Returns:
+        The manifest, or None if the directory holds no job
+    """
+    path = Path(output_dir) / MANIFEST_NAME
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest: Dict[str, Any] = json.load(f)
+    return manifest
+
+
+def _save_manifest(output_dir: Path, manifest: Dict[str, Any]) -> None:
+    """Replace the manifest atomically."""
+    _write_atomic(
+        output_dir / MANIFEST_NAME, lambda f: json.dump(manifest, f, indent=1)
+    )
+
+
+def run_job(
+    classifier: Any,
+    input_path: Union[str, Path],
+    output_dir: Union[str, Path],
+    shard_bytes: int = DEFAULT_SHARD_BYTES,
+    text_field: str = "text",
+    batch_size: int = 32,
+    resume: bool = False,
+    fingerprint: str = "",
+) -> JobReport:
+    """Classify a JSONL file shard by shard, checkpointing after each shard.
+
+    Args:
+        classifier: Object with classify_batch, such as a TreeClassifier or
+            ParallelTreeClassifier. With a ParallelTreeClassifier, use a
+            batch_size of several chunks per worker to keep all workers busy.
+            Its dedup attribute, if set, is cleared before every shard.
+        input_path: JSONL input file
+        output_dir: Job directory for the manifest and output shards
+        shard_bytes: Target shard size in bytes
+        text_field: Record field holding the text to classify
+        batch_size: Number of records classified (and deduplicated)
+            together; keep it fixed across runs of a job
+        resume: Continue the job in output_dir instead of refusing to
+            overwrite it
+        fingerprint: Identity of the trees and model; a job is only resumed
+            with the same fingerprint
+
+    Returns:
+        Report with the number of shards, skipped shards and records written
+
+    Raises:
+        JobError: If output_dir holds a job and resume is False, or if the
+            job cannot be resumed with this input, settings or fingerprint
+    """
+    start_time = time.perf_counter()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    settings = {
+        "input": _input_identity(input_path),
+        "shard_bytes": shard_bytes,
+        "text_field": text_field,
+        "fingerprint": fingerprint,
+    }
+
+    manifest = load_manifest(output_dir)
+    if manifest is not None and not resume:
+        raise JobError(
+            f"{output_dir} already holds a job; resume it or use another directory"
+        )
+    if manifest is not None:
+        changed = [
+            key
+            for key, value in settings.items()
+            if manifest.get("settings", {}).get(key) != value
+        ]
+        if manifest.get("version") != MANIFEST_VERSION or changed:
+            raise JobError(
+                f"Cannot resume the job in {output_dir}: "
+                f"{', '.join(changed) or 'version'} changed"
+            )
+
+    with Corpus(input_path) as corpus:
+        if manifest is None:
+            manifest = {
+                "version": MANIFEST_VERSION,
+                "settings": settings,
+                "shards": [
+                    {"start": s.start, "end": s.end, "records": None}
+                    for s in _plan(corpus, shard_bytes)
+                ],
+            }
+            _save_manifest(output_dir, manifest)
+
+        entries = manifest["shards"]
+        dedup = getattr(classifier, "dedup", None)
+        skipped = 0
+        records = 0
+        for index, entry in enumerate(entries):
+            path = shard_path(output_dir, index)
+            if entry["records"] is not None and path.exists():
+                skipped += 1
+                records += entry["records"]
+                continue
+
+            # Duplicates are only grouped within a shard, so its output does
+            # not depend on the shards classified before it in this run
+            if dedup is not None:
+                dedup.clear()
+            view = corpus.view_bytes(entry["start"], entry["end"])
+            count = 0
+
+            def write(f: IO[str], view: CorpusView = view) -> None:
+                nonlocal count
+                for record in classify_records(
+                    classifier, view.records(), text_field, batch_size
+                ):
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    count += 1
+
+            _write_atomic(path, write)
+            entry["records"] = count
+            _save_manifest(output_dir, manifest)
+            records += count
+            logger.info("Shard %d/%d done: %d records", index + 1, len(entries), count)
+
+    return JobReport(
+        shards=len(entries),
+        skipped=skipped,
+        records=records,
+        seconds=time.perf_counter() - start_time,
+    )
+
+
+def merge_outputs(output_dir: Union[str, Path], destination: Union[str, Path]) -> int:
+    """Concatenate the output shards of a finished job in input order.
+
+    Args:
+        output_dir: Job directory
+        destination: File to write
+
+    Returns:
+        Number of records written
+
+    Raises:
+        JobError: If the directory holds no job or the job is unfinished
+    """
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        raise JobError(f"{output_dir} holds no job")
+    if any(entry["records"] is None for entry in manifest["shards"]):
+        raise JobError(f"The job in {output_dir} is not finished")
+
+    def write(f: IO[str]) -> None:
+        for index in range(len(manifest["shards"])):
+            with open(shard_path(output_dir, index), encoding="utf-8") as part:
+                for line in part:
+                    f.write(line)
+
+    _write_atomic(Path(destination), write)
+    return sum(entry["records"] for entry in manifest["shards"])
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments of the job command.
+
+    Args:
+        argv: Arguments after 'job' (defaults to sys.argv)
+
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m llm_tree_classifier job",
+        description="Classify a large JSONL file in resumable, checkpointed shards.",
+    )
+    parser.add_argument(
+        "--config", type=Path, required=True, help="Path to YAML configuration file"
+    )
+    parser.add_argument(
+        "--model", type=Path, required=True, help="Path to LLaMA model file"
+    )
+    parser.add_argument(
+        "--tree",
+        type=str,
+        help="Tree to use (required if config contains multiple trees)",
+    )
+    parser.add_argument("--input", type=Path, required=True, help="JSONL input file")
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        required=True,
+        help="Job directory for the manifest and output shards",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the job in --output-dir, skipping completed shards",
+    )
+    parser.add_argument(
+        "--merge",
+        type=Path,
+        help="Write all output shards to this file, in input order, when done",
+    )
+    parser.add_argument(
+        "--shard-mb",
+        type=float,
+        default=DEFAULT_SHARD_BYTES / (1024 * 1024),
+        help="Target shard size in MiB (default: 64)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes, each with its own model context (default: 1)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help=(
+            "Records classified and deduplicated together, split among the "
+            "workers (default: 256)"
+        ),
+    )
+    parser.add_argument(
+        "--scoring",
+        choices=["grammar", "logprob"],
+        help=(
+            "How answers are chosen: 'logprob' decodes each worker's chunk as "
+            "one multi-sequence batch, 'grammar' samples every prompt on its "
+            "own (default: logprob, or grammar with a --batch-size of 1)"
+        ),
+    )
+    parser.add_argument(
+        "--text-field",
+        type=str,
+        default="text",
+        help="Record field holding the text to classify (default: text)",
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=["exact", "near"],
+        help=(
+            "Classify one text per group of exact (or also near) duplicates "
+            "and copy its result to the others"
+        ),
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.8,
+        help="Minimum estimated Jaccard similarity of near duplicates (default: 0.8)",
+    )
+    parser.add_argument(
+        "--n-ctx",
+        type=int,
+        default=2048,
+        help="Context window of the model in tokens (default: 2048)",
+    )
+    parser.add_argument(
+        "--verbose", "-v", action="store_true", help="Enable verbose logging"
+    )
+    return parser.parse_args(argv)
+
+
+def _scoring(args: argparse.Namespace) -> str:
+    """Return the scoring mode, batching decodes unless batches are single."""
+    if args.scoring is not None:
+        return str(args.scoring)
+    return "logprob" if args.batch_size > 1 else "grammar"
+
+
+def _fingerprint(args: argparse.Namespace) -> str:
+    """Identify the trees and model a job was started with."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(args.config.read_bytes())
+    stat = os.stat(args.model)
+    digest.update(
+        f"{args.model.name}:{stat.st_size}:{stat.st_mtime_ns}:{args.tree}".encode()
+    )
+    # The scoring mode can change answers
+    digest.update(f":{_scoring(args)}".encode())
+    if args.dedup is not None:
+        # Near duplicates get their representative's result, which depends
+        # on how records are grouped into batches
+        digest.update(
+            f":{args.dedup}:{args.dedup_threshold}:{args.batch_size}".encode()
+        )
+    return digest.hexdigest()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run or resume a bulk classification job.
+
+    Args:
+        argv: Arguments after 'job'
+
+    Returns:
+        Exit code (0 for success, non-zero for error)
+    """
+    from llm_tree_classifier.exceptions import LLMTreeClassifierError
+
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    try:
+        dedup = None
+        if args.dedup is not None:
+            from llm_tree_classifier.dedup import Deduplicator
+
+            dedup = Deduplicator(
+                near=args.dedup == "near", threshold=args.dedup_threshold
+            )
+        if args.workers > 1:
+            from llm_tree_classifier.parallel import ParallelTreeClassifier
+
+            classifier: Any = ParallelTreeClassifier(
+                args.config,
+                model_path=args.model,
+                tree_name=args.tree,
+                n_workers=args.workers,
+                # Two chunks in flight per worker cover one batch
+                chunk_size=max(1, args.batch_size // (2 * args.workers)),
+                backend_kwargs={"n_ctx": args.n_ctx, "scoring": _scoring(args)},
+                dedup=dedup,
+            )
+        else:
+            from llm_tree_classifier.classifier import TreeClassifier
+            from llm_tree_classifier.llm.llama_cpp import LlamaCppBackend
+
+            llm = LlamaCppBackend(
+                model_path=str(args.model), n_ctx=args.n_ctx, scoring=_scoring(args)
+            )
+            classifier = TreeClassifier(
+                args.config, llm, tree_name=args.tree, dedup=dedup
+            )
+
+        try:
+            report = run_job(
+                classifier,
+                args.input,
+                args.output_dir,
+                shard_bytes=max(1, int(args.shard_mb * 1024 * 1024)),
+                text_field=args.text_field,
+                batch_size=args.batch_size,
+                resume=args.resume,
+                fingerprint=_fingerprint(args),
+            )
+        finally:
+            if hasattr(classifier, "close"):
+                classifier.close()
+        logger.info(
+            "Classified %d records in %d shards (%d already done) in %.1fs",
+            report.records,
+            report.shards,
+            report.skipped,
+            report.seconds,
+        )
+        if dedup is not None:
+            stats = dedup.stats()
+            logger.info(
+                "Deduplicated %.1f%% of texts (%d exact, %d near)",
+                100 * stats["dedup_rate"],
+                stats["exact_hits"],
+                stats["near_hits"],
+            )
+        if args.merge is not None:
+            merge_outputs(args.output_dir, args.merge)
+            logger.info("Merged output written to %s", args.merge)
+    except (LLMTreeClassifierError, OSError) as e:
+        logger.error("Job failed: %s", e)
+        return 1
+    return 0
@@ -1,6 +1,69 @@
-"""LLM backends for the LLM Tree Classifier."""
+"""LLM backends for the LLM Tree Classifier.
 
-from llm_tree_classifier.llm.base import LLMBackend
-from llm_tree_classifier.llm.llama_cpp import LlamaCppBackend
+Backends are imported on first attribute access, so importing this package
+does not load native libraries such as llama_cpp until a backend that needs
+them is used.
+"""
 
-__all__ = ["LLMBackend", "LlamaCppBackend"] 
\ No newline at end of file
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from llm_tree_classifier.llm.base import AsyncLLMBackend, LLMBackend
+
+if TYPE_CHECKING:
+    from llm_tree_classifier.llm.async_adapter import AsyncBackendAdapter
+    from llm_tree_classifier.llm.batching import MicroBatchingBackend
+    from llm_tree_classifier.llm.cache import CachingBackend
+    from llm_tree_classifier.llm.cascade import CascadeBackend
+    from llm_tree_classifier.llm.distilled import DistilledBackend
+    from llm_tree_classifier.llm.http_backend import HttpLLMBackend
+    from llm_tree_classifier.llm.llama_cpp import LlamaCppBackend
+    from llm_tree_classifier.llm.recording import RecordingBackend, ReplayBackend
+    from llm_tree_classifier.llm.registry import ModelRegistry
+    from llm_tree_classifier.llm.simulated import SimulatedLLMBackend
+
+# Attribute name -> module that defines it
+_LAZY_ATTRIBUTES: Dict[str, str] = {
+    "AsyncBackendAdapter": "llm_tree_classifier.llm.async_adapter",
+    "CachingBackend": "llm_tree_classifier.llm.cache",
+    "CascadeBackend": "llm_tree_classifier.llm.cascade",
+    "DistilledBackend": "llm_tree_classifier.llm.distilled",
+    "HttpLLMBackend": "llm_tree_classifier.llm.http_backend",
+    "LlamaCppBackend": "llm_tree_classifier.llm.llama_cpp",
+    "MicroBatchingBackend": "llm_tree_classifier.llm.batching",
+    "RecordingBackend": "llm_tree_classifier.llm.recording",
+    "ReplayBackend": "llm_tree_classifier.llm.recording",
+    "SimulatedLLMBackend": "llm_tree_classifier.llm.simulated",
+    "ModelRegistry": "llm_tree_classifier.llm.registry",
+}
+
+
+def __getattr__(name: str) -> Any:
+    """Import lazily loaded backends on first access."""
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
+
+__all__ = [
+    "AsyncBackendAdapter",
+    "AsyncLLMBackend",
+    "CachingBackend",
+    "CascadeBackend",
+    "DistilledBackend",
+    "HttpLLMBackend",
+    "LLMBackend",
+    "LlamaCppBackend",
+    "MicroBatchingBackend",
+    "ModelRegistry",
+    "RecordingBackend",
+    "ReplayBackend",
+    "SimulatedLLMBackend",
+]
@@ -0,0 +1,109 @@
+"""Adapter running synchronous LLM backends from asyncio code."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from llm_tree_classifier.documents import Tokenizer
+from llm_tree_classifier.llm.base import AsyncLLMBackend, LLMBackend
+
+
+class AsyncBackendAdapter(AsyncLLMBackend):
+    """Expose a synchronous backend through the AsyncLLMBackend interface.
+
+    Calls run on a dedicated thread pool, so the event loop is never
+    blocked. The default single worker thread suits backends that are not
+    thread-safe, such as LlamaCppBackend. To overlap calls of many
+    in-flight documents, wrap the backend in a MicroBatchingBackend and give
+    the adapter as many workers as concurrent documents.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        max_workers: int = 1,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ) -> None:
+        """Initialize the adapter.
+
+        Args:
+            backend: The synchronous backend to run
+            max_workers: Number of threads of the dedicated executor
+            executor: Executor to use instead of a dedicated one
+        """
+        self.backend = backend
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="llm-backend"
+        )
+
+    @property
+    def model_id(self) -> str:
+        """Identity of the wrapped backend's model."""
+        return self.backend.model_id
+
+    @property
+    def tokenizer(self) -> Optional[Tokenizer]:
+        """Tokenizer of the wrapped backend's model."""
+        return self.backend.tokenizer
+
+    def warm_up(self, nodes: Sequence[Tuple[str, List[str]]]) -> None:
+        """Prepare the wrapped backend for the given nodes."""
+        self.backend.warm_up(nodes)
+
+    async def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        """Get a response from the wrapped backend without blocking the loop.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            The selected response from valid_responses
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.backend.get_response, prompt, valid_responses
+        )
+
+    async def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Get responses for several prompts in one call to the wrapped backend.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            self.backend.get_responses_batch,
+            prompts,
+            valid_responses_list,
+        )
+
+    async def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Score every valid response with the wrapped backend.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            Mapping of each valid response to its score
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.backend.score_responses, prompt, valid_responses
+        )
+
+    def close(self) -> None:
+        """Shut the dedicated executor down."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
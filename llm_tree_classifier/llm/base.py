@@ -1,12 +1,47 @@
 """Base interface for LLM backends."""
 
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from llm_tree_classifier.documents import Tokenizer
 
 
 class LLMBackend(ABC):
     """Base class for LLM backends."""
 
+    @property
+    def model_id(self) -> str:
+        """Identity of the model behind this backend.
+
+        Used to key cached decisions; backends should include everything
+        that can change an answer (model file, scoring mode, ...).
+
+        Returns:
+            String identifying the model
+        """
+        return type(self).__name__
+
+    @property
+    def tokenizer(self) -> Optional[Tokenizer]:
+        """Tokenizer of the model, used to fit documents into token budgets.
+
+        Returns:
+            The model's tokenizer, or None to count whitespace-separated words
+        """
+        return None
+
+    def warm_up(self, nodes: Sequence[Tuple[str, List[str]]]) -> None:
+        """Prepare per-node state before the first text is classified.
+
+        Called when a classifier loads its trees. Backends can build
+        grammars, prompt templates or tokenized options here instead of on
+        the first request. The default does nothing.
+
+        Args:
+            nodes: Question and valid responses of every decision node
+        """
+        return None
+
     @abstractmethod
     def get_response(self, prompt: str, valid_responses: List[str]) -> str:
         """Get a response from the LLM.
@@ -18,4 +53,167 @@ class LLMBackend(ABC):
         Returns:
             The selected response from valid_responses
         """
-        pass 
\ No newline at end of file
+        pass
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Get responses for several prompts.
+
+        Backends that can evaluate prompts together override this. The
+        default implementation calls get_response for each prompt.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+        """
+        return [
+            self.get_response(prompt, valid_responses)
+            for prompt, valid_responses in zip(
+                prompts, valid_responses_list, strict=True
+            )
+        ]
+
+    def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Score every valid response.
+
+        Backends with access to token probabilities return the
+        log-probability of each response. The default implementation asks
+        get_response and scores the chosen response 0.0 and all others -inf.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            Mapping of each valid response to its score (higher is better)
+        """
+        answer = self.get_response(prompt, valid_responses)
+        return {
+            response: 0.0 if response == answer else float("-inf")
+            for response in valid_responses
+        }
+
+    def score_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[Dict[str, float]]:
+        """Score the valid responses of several prompts.
+
+        Backends that can evaluate prompts together override this. The
+        default implementation calls score_responses for each prompt.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            Mapping of each valid response to its score, per prompt
+        """
+        return [
+            self.score_responses(prompt, valid_responses)
+            for prompt, valid_responses in zip(
+                prompts, valid_responses_list, strict=True
+            )
+        ]
+
+
+class AsyncLLMBackend(ABC):
+    """Base class for asyncio-native LLM backends."""
+
+    @property
+    def model_id(self) -> str:
+        """Identity of the model behind this backend.
+
+        Returns:
+            String identifying the model
+        """
+        return type(self).__name__
+
+    @property
+    def tokenizer(self) -> Optional[Tokenizer]:
+        """Tokenizer of the model, used to fit documents into token budgets.
+
+        Returns:
+            The model's tokenizer, or None to count whitespace-separated words
+        """
+        return None
+
+    def warm_up(self, nodes: Sequence[Tuple[str, List[str]]]) -> None:
+        """Prepare per-node state before the first text is classified.
+
+        Called when a classifier loads its trees. Backends can build
+        grammars, prompt templates or tokenized options here instead of on
+        the first request. The default does nothing.
+
+        Args:
+            nodes: Question and valid responses of every decision node
+        """
+        return None
+
+    @abstractmethod
+    async def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        """Get a response from the LLM.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            The selected response from valid_responses
+        """
+
+    async def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Get responses for several prompts.
+
+        The default implementation awaits get_response for all prompts
+        concurrently.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+        """
+        # asyncio is already loaded whenever this runs; importing it here
+        # keeps it out of the package import
+        import asyncio
+
+        return list(
+            await asyncio.gather(
+                *(
+                    self.get_response(prompt, valid_responses)
+                    for prompt, valid_responses in zip(
+                        prompts, valid_responses_list, strict=True
+                    )
+                )
+            )
+        )
+
+    async def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Score every valid response.
+
+        The default implementation awaits get_response and scores the chosen
+        response 0.0 and all others -inf.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            Mapping of each valid response to its score (higher is better)
+        """
+        answer = await self.get_response(prompt, valid_responses)
+        return {
+            response: 0.0 if response == answer else float("-inf")
+            for response in valid_responses
+        }
@@ -0,0 +1,200 @@
+"""Dynamic micro-batching wrapper for LLM backends."""
+
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from llm_tree_classifier.documents import Tokenizer
+from llm_tree_classifier.exceptions import LLMError
+from llm_tree_classifier.llm.base import LLMBackend
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    """A prompt waiting for the batching thread."""
+
+    __slots__ = ("done", "error", "prompt", "response", "valid_responses")
+
+    def __init__(self, prompt: str, valid_responses: List[str]) -> None:
+        self.prompt = prompt
+        self.valid_responses = valid_responses
+        self.response: Optional[str] = None
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+
+class MicroBatchingBackend(LLMBackend):
+    """LLM backend wrapper that merges concurrent calls into batches.
+
+    Callers from many threads (e.g. one per HTTP request) block in
+    get_response while a single worker thread collects pending prompts and
+    sends them to the wrapped backend with one get_responses_batch call. A
+    batch is dispatched once it holds max_batch_size prompts or max_wait
+    seconds after its first prompt arrived. The wrapped backend is only ever
+    used from the worker thread, so it does not need to be thread-safe.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+    ) -> None:
+        """Initialize the wrapper and start the worker thread.
+
+        Args:
+            backend: The backend answering the merged batches
+            max_batch_size: Maximum number of prompts per batch
+            max_wait: Maximum time in seconds a prompt waits for others
+        """
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.prompts = 0
+
+        self._queue: queue.Queue[Optional[_Pending]] = queue.Queue()
+        self._backend_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="micro-batcher", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def model_id(self) -> str:
+        """Identity of the wrapped backend's model."""
+        return self.backend.model_id
+
+    @property
+    def tokenizer(self) -> Optional[Tokenizer]:
+        """Tokenizer of the wrapped backend's model."""
+        return self.backend.tokenizer
+
+    def warm_up(self, nodes: Sequence[Tuple[str, List[str]]]) -> None:
+        """Prepare the wrapped backend for the given nodes."""
+        self.backend.warm_up(nodes)
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        """Get a response, batched with other concurrent calls.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            The selected response from valid_responses
+        """
+        return self.get_responses_batch([prompt], [valid_responses])[0]
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Get responses for several prompts, batched with concurrent calls.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+
+        Raises:
+            LLMError: If the wrapper is closed or the backend failed
+        """
+        if self._closed:
+            raise LLMError("Micro-batching backend is closed")
+
+        pending = [
+            _Pending(prompt, valid_responses)
+            for prompt, valid_responses in zip(
+                prompts, valid_responses_list, strict=True
+            )
+        ]
+        for item in pending:
+            self._queue.put(item)
+
+        responses = []
+        for item in pending:
+            item.done.wait()
+            if item.error is not None:
+                raise LLMError(f"Batched request failed: {item.error}")
+            responses.append(item.response)
+        return responses  # type: ignore[return-value]
+
+    def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Score every valid response with the wrapped backend (not batched).
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            Mapping of each valid response to its score
+        """
+        with self._backend_lock:
+            return self.backend.score_responses(prompt, valid_responses)
+
+    def close(self) -> None:
+        """Stop the worker thread after pending prompts are answered."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        """Collect pending prompts into batches until closed."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        item = self._queue.get(timeout=timeout)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch: List[_Pending]) -> None:
+        """Answer one batch and wake up its callers.
+
+        Args:
+            batch: Pending prompts to answer together
+        """
+        try:
+            with self._backend_lock:
+                responses = self.backend.get_responses_batch(
+                    [item.prompt for item in batch],
+                    [item.valid_responses for item in batch],
+                )
+            for item, response in zip(batch, responses, strict=True):
+                item.response = response
+        except Exception as e:
+            logger.error("Error answering batch of %d prompts: %s", len(batch), e)
+            for item in batch:
+                item.error = e
+        finally:
+            self.batches += 1
+            self.prompts += len(batch)
+            for item in batch:
+                item.done.set()
@@ -0,0 +1,364 @@
+"""Decision cache wrapper for LLM backends."""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from llm_tree_classifier import instrumentation
+from llm_tree_classifier.documents import Tokenizer
+from llm_tree_classifier.exceptions import LLMError
+from llm_tree_classifier.llm.base import LLMBackend
+
+logger = logging.getLogger(__name__)
+
+# Keys per IN (...) query, below SQLite's limit on bound parameters
+_MAX_PARAMS = 500
+# Database hits whose recency is updated together
+_ACCESS_FLUSH = 256
+
+
+def decision_key(model_id: str, prompt: str, valid_responses: List[str]) -> str:
+    """Compute the cache key of a decision.
+
+    Args:
+        model_id: Identity of the model answering the prompt
+        prompt: The prompt sent to the LLM
+        valid_responses: List of valid response options
+
+    Returns:
+        Hex digest identifying the decision
+    """
+    digest = hashlib.sha256()
+    for part in (model_id, prompt, *valid_responses):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CachingBackend(LLMBackend):
+    """LLM backend wrapper that caches decisions.
+
+    Decisions are kept in an in-memory LRU and, if a database path is given,
+    in a SQLite file that can be shared by several processes. Entries are
+    keyed by the wrapped backend's model_id, the prompt and the valid
+    responses, so changing any of them never returns a stale answer.
+
+    Database lookups do not write: the access times used to evict least
+    recently used entries are updated in bulk with the next store, or
+    once enough hits have accumulated.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        max_entries: int = 100_000,
+        db_path: Optional[Union[str, Path]] = None,
+        max_db_entries: Optional[int] = None,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            backend: The backend answering cache misses
+            max_entries: Maximum number of decisions kept in memory
+            db_path: Optional SQLite file for the persistent tier
+            max_db_entries: Maximum number of decisions kept in the SQLite
+                file (None for unbounded). Least recently used entries are
+                evicted first.
+        """
+        self.backend = backend
+        self.max_entries = max_entries
+        self.db_path = str(db_path) if db_path is not None else None
+        self.max_db_entries = max_db_entries
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+        self._model_id = backend.model_id
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        # Database hits whose access time is not updated yet
+        self._accessed: Dict[str, None] = {}
+
+        if self.db_path is not None:
+            self._connect()
+
+    @property
+    def model_id(self) -> str:
+        """Identity of the wrapped backend's model."""
+        return self._model_id
+
+    @property
+    def tokenizer(self) -> Optional[Tokenizer]:
+        """Tokenizer of the wrapped backend's model."""
+        return self.backend.tokenizer
+
+    def warm_up(self, nodes: Sequence[Tuple[str, List[str]]]) -> None:
+        """Prepare the wrapped backend for the given nodes."""
+        self.backend.warm_up(nodes)
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        """Get a response, answering from the cache when possible.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            The selected response from valid_responses
+        """
+        key = decision_key(self._model_id, prompt, valid_responses)
+        response = self._lookup([key])[0]
+        hooks = instrumentation.hooks
+        if hooks is not None:
+            hooks.cache(response is not None)
+        if response is None:
+            response = self.backend.get_response(prompt, valid_responses)
+            self._store({key: response})
+        return response
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Get responses for several prompts, sending only misses to the backend.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+        """
+        keys = [
+            decision_key(self._model_id, prompt, valid_responses)
+            for prompt, valid_responses in zip(
+                prompts, valid_responses_list, strict=True
+            )
+        ]
+        responses = self._lookup(keys)
+        hooks = instrumentation.hooks
+        if hooks is not None:
+            for response in responses:
+                hooks.cache(response is not None)
+
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            answers = self.backend.get_responses_batch(
+                [prompts[i] for i in missing],
+                [valid_responses_list[i] for i in missing],
+            )
+            for i, answer in zip(missing, answers, strict=True):
+                responses[i] = answer
+            self._store(
+                {keys[i]: answer for i, answer in zip(missing, answers, strict=True)}
+            )
+
+        return responses  # type: ignore[return-value]
+
+    def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Score every valid response with the wrapped backend (not cached).
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            Mapping of each valid response to its score
+        """
+        return self.backend.score_responses(prompt, valid_responses)
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache counters.
+
+        Returns:
+            Dictionary with memory hits, database hits, misses and the
+            number of decisions held in memory
+        """
+        return {
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "entries": len(self._memory),
+        }
+
+    def clear(self) -> None:
+        """Drop all cached decisions from memory and the database."""
+        with self._lock:
+            self._memory.clear()
+        if self.db_path is not None:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM decisions")
+
+    def _lookup(self, keys: List[str]) -> List[Optional[str]]:
+        """Look decisions up in memory, then the rest in the database.
+
+        Args:
+            keys: Decision keys
+
+        Returns:
+            The cached response for each key, or None on a miss
+        """
+        responses: List[Optional[str]] = []
+        with self._lock:
+            for key in keys:
+                response = self._memory.get(key)
+                if response is not None:
+                    self._memory.move_to_end(key)
+                responses.append(response)
+            self.hits += sum(response is not None for response in responses)
+
+        missing = list(
+            dict.fromkeys(
+                key for key, r in zip(keys, responses, strict=True) if r is None
+            )
+        )
+        found: Dict[str, str] = {}
+        if self.db_path is not None and missing:
+            conn = self._connection()
+            for start in range(0, len(missing), _MAX_PARAMS):
+                chunk = missing[start : start + _MAX_PARAMS]
+                found.update(
+                    conn.execute(
+                        "SELECT key, response FROM decisions WHERE key IN "
+                        f"({', '.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+            for key, response in found.items():
+                self._remember(key, response)
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                if responses[i] is None and key in found:
+                    responses[i] = found[key]
+                    self.db_hits += 1
+                elif responses[i] is None:
+                    self.misses += 1
+            self._accessed.update(dict.fromkeys(found))
+            flush = len(self._accessed) >= _ACCESS_FLUSH
+        if flush:
+            with self._connection() as conn:
+                self._flush_accessed(conn)
+        return responses
+
+    def _store(self, decisions: Dict[str, str]) -> None:
+        """Store new decisions in memory and in the database.
+
+        Args:
+            decisions: Mapping of decision key to response
+        """
+        for key, response in decisions.items():
+            self._remember(key, response)
+
+        if self.db_path is None or not decisions:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._writes += len(decisions)
+            # Evict in bulk every so often rather than counting on each write
+            evict = self.max_db_entries is not None and self._writes >= max(
+                1, self.max_db_entries // 10
+            )
+            if evict:
+                self._writes = 0
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO decisions (key, response, accessed) "
+                "VALUES (?, ?, ?)",
+                [(key, response, now) for key, response in decisions.items()],
+            )
+            self._flush_accessed(conn)
+            if evict:
+                conn.execute(
+                    "DELETE FROM decisions WHERE key IN ("
+                    "SELECT key FROM decisions ORDER BY accessed DESC "
+                    "LIMIT -1 OFFSET ?)",
+                    (self.max_db_entries,),
+                )
+
+    def _flush_accessed(self, conn: sqlite3.Connection) -> None:
+        """Write the access time of recent database hits.
+
+        Args:
+            conn: Connection inside an open transaction
+        """
+        with self._lock:
+            keys = list(self._accessed)
+            self._accessed.clear()
+        now = time.time()
+        for start in range(0, len(keys), _MAX_PARAMS):
+            chunk = keys[start : start + _MAX_PARAMS]
+            conn.execute(
+                "UPDATE decisions SET accessed = ? WHERE key IN "
+                f"({', '.join('?' * len(chunk))})",
+                [now, *chunk],
+            )
+
+    def _remember(self, key: str, response: str) -> None:
+        """Add a decision to the in-memory LRU.
+
+        Args:
+            key: Decision key
+            response: Cached response
+        """
+        with self._lock:
+            self._memory[key] = response
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's database connection.
+
+        Connections are opened per thread and reopened after a fork, since
+        SQLite connections must not be shared across either.
+
+        Returns:
+            SQLite connection usable as a transaction context manager
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database for this thread and create the table if needed.
+
+        Returns:
+            SQLite connection
+
+        Raises:
+            LLMError: If the database cannot be opened
+        """
+        assert self.db_path is not None
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            # WAL lets readers in other processes proceed during writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS decisions ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                    "accessed REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS decisions_accessed "
+                    "ON decisions (accessed)"
+                )
+        except sqlite3.Error as e:
+            raise LLMError(f"Failed to open decision cache {self.db_path}: {e}") from e
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
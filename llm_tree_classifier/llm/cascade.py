@@ -0,0 +1,237 @@
+"""Model cascade backend."""
+
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from llm_tree_classifier.documents import Tokenizer
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.prompts import split_prompt
+
+logger = logging.getLogger(__name__)
+
+
+def score_margin(scores: Dict[str, float]) -> float:
+    """Return the gap between the best and second-best option score.
+
+    Args:
+        scores: Score per option (log-probabilities)
+
+    Returns:
+        Margin in nats; infinite when there is a single option or the
+        runner-up has zero probability
+    """
+    if len(scores) <= 1:
+        return float("inf")
+    first, second = sorted(scores.values(), reverse=True)[:2]
+    if second == float("-inf"):
+        return float("inf")
+    return first - second
+
+
+class CascadeBackend(LLMBackend):
+    """Backend asking a small model first and a large model when it is unsure.
+
+    Every prompt is scored by the small backend. If the margin between its
+    best and second-best option is at least the margin configured for the
+    node, the small model's answer is used; otherwise the prompt is
+    escalated to the large backend. The small backend should score with
+    log-probabilities (for example LlamaCppBackend(..., scoring="logprob"));
+    backends without scores never escalate.
+
+    Margins are configured per node question, typically from the
+    'cascade_margin' settings of a tree configuration (see from_config).
+    """
+
+    def __init__(
+        self,
+        small: LLMBackend,
+        large: LLMBackend,
+        margin: float = 1.0,
+        margins: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """Initialize the cascade.
+
+        Args:
+            small: Fast backend asked first
+            large: Backend answering escalated prompts
+            margin: Default margin (in nats) below which prompts escalate
+            margins: Margin per node question, overriding the default
+        """
+        self.small = small
+        self.large = large
+        self.margin = margin
+        self.margins = dict(margins or {})
+
+        self._lock = threading.Lock()
+        # Question -> [calls, escalations]
+        self._counts: Dict[str, List[int]] = {}
+
+    @classmethod
+    def from_config(
+        cls,
+        small: LLMBackend,
+        large: LLMBackend,
+        config: Union[str, Path, Dict[str, Any]],
+        margin: float = 1.0,
+    ) -> "CascadeBackend":
+        """Create a cascade using the margins of a tree configuration.
+
+        Trees may set 'cascade_margin' for all of their nodes, and nodes may
+        override it with their own 'cascade_margin'.
+
+        Args:
+            small: Fast backend asked first
+            large: Backend answering escalated prompts
+            config: Path to YAML file or dictionary containing tree configuration
+            margin: Margin for nodes without a configured one
+
+        Returns:
+            The cascade backend
+        """
+        from llm_tree_classifier.classifier import load_trees
+
+        margins: Dict[str, float] = {}
+        for tree in load_trees(config).values():
+            margins.update(tree.cascade_margins)
+        return cls(small, large, margin=margin, margins=margins)
+
+    @property
+    def model_id(self) -> str:
+        """Identity of both models and the escalation margins."""
+        margins = hashlib.blake2b(
+            repr(sorted(self.margins.items())).encode("utf-8"), digest_size=8
+        ).hexdigest()
+        return (
+            f"cascade:{self.small.model_id}:{self.large.model_id}:"
+            f"{self.margin}:{margins}"
+        )
+
+    @property
+    def tokenizer(self) -> Optional[Tokenizer]:
+        """Tokenizer of the small model."""
+        return self.small.tokenizer
+
+    def warm_up(self, nodes: Sequence[Tuple[str, List[str]]]) -> None:
+        """Prepare both models for the given nodes."""
+        self.small.warm_up(nodes)
+        self.large.warm_up(nodes)
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        """Answer with the small model, escalating when it is unsure.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            The selected response from valid_responses
+        """
+        return self.get_responses_batch([prompt], [valid_responses])[0]
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Answer with the small model, escalating unsure prompts in one batch.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+        """
+        answers, escalate = self._cascade(prompts, valid_responses_list)
+        if escalate:
+            escalated = self.large.get_responses_batch(
+                [prompts[i] for i in escalate],
+                [valid_responses_list[i] for i in escalate],
+            )
+            for i, answer in zip(escalate, escalated, strict=True):
+                answers[i] = answer
+        return answers
+
+    def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Score with the small model, or with the large one when it is unsure.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            Mapping of each valid response to its score
+        """
+        scores = self.small.score_responses(prompt, valid_responses)
+        if self._escalates(prompt, scores):
+            return self.large.score_responses(prompt, valid_responses)
+        return scores
+
+    def stats(self) -> Dict[str, Any]:
+        """Return escalation counters.
+
+        Returns:
+            Total calls, escalations and escalation rate, and the same
+            counters per node question
+        """
+        with self._lock:
+            counts = {question: tuple(c) for question, c in self._counts.items()}
+        calls = sum(c[0] for c in counts.values())
+        escalations = sum(c[1] for c in counts.values())
+        return {
+            "calls": calls,
+            "escalations": escalations,
+            "escalation_rate": escalations / calls if calls else 0.0,
+            "questions": {
+                question: {
+                    "calls": c[0],
+                    "escalations": c[1],
+                    "escalation_rate": c[1] / c[0],
+                }
+                for question, c in counts.items()
+            },
+        }
+
+    def reset_stats(self) -> None:
+        """Clear the escalation counters."""
+        with self._lock:
+            self._counts.clear()
+
+    def close(self) -> None:
+        """Close both backends."""
+        for backend in (self.small, self.large):
+            close = getattr(backend, "close", None)
+            if close is not None:
+                close()
+
+    def _cascade(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> Tuple[List[str], List[int]]:
+        """Score prompts with the small model.
+
+        Returns:
+            Tuple of (small model answer per prompt, indices to escalate)
+        """
+        scores_list = self.small.score_responses_batch(prompts, valid_responses_list)
+        answers = [max(scores, key=scores.__getitem__) for scores in scores_list]
+        escalate = [
+            i
+            for i, (prompt, scores) in enumerate(zip(prompts, scores_list, strict=True))
+            if self._escalates(prompt, scores)
+        ]
+        if escalate:
+            logger.debug("Escalating %d of %d prompts", len(escalate), len(prompts))
+        return answers, escalate
+
+    def _escalates(self, prompt: str, scores: Dict[str, float]) -> bool:
+        """Decide whether a prompt goes to the large model and count it."""
+        question = split_prompt(prompt)[1]
+        escalate = score_margin(scores) < self.margins.get(question, self.margin)
+        with self._lock:
+            counts = self._counts.setdefault(question, [0, 0])
+            counts[0] += 1
+            counts[1] += escalate
+        return escalate
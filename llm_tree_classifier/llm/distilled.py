@@ -0,0 +1,226 @@
+"""Backend answering nodes with distilled classifiers."""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from llm_tree_classifier.distill import DistilledModels, distilled_path
+from llm_tree_classifier.documents import Tokenizer
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.prompts import split_prompt
+
+logger = logging.getLogger(__name__)
+
+
+class DistilledBackend(LLMBackend):
+    """Backend that answers confident nodes locally and defers the rest.
+
+    Prompts of nodes with a distilled model are scored in one vectorized
+    pass per node and batch. When the most likely option reaches the
+    confidence threshold it is returned; otherwise the prompt is sent to
+    the wrapped backend. Nodes without a model always go to the backend.
+    """
+
+    def __init__(
+        self,
+        models: Union[DistilledModels, str, Path],
+        backend: LLMBackend,
+        threshold: float = 0.9,
+    ) -> None:
+        """Initialize the backend.
+
+        Args:
+            models: Distilled models, or the .npz file they were saved to
+            backend: Backend answering the prompts the models are unsure of
+            threshold: Minimum probability of the best option for a local
+                answer
+        """
+        if not isinstance(models, DistilledModels):
+            models = DistilledModels.load(models)
+        self.models = models
+        self.backend = backend
+        self.threshold = threshold
+        self._digest = models.digest
+
+        self._lock = threading.Lock()
+        # Question -> [calls, local answers]
+        self._counts: Dict[str, List[int]] = {}
+
+    @classmethod
+    def for_config(
+        cls,
+        config_path: Union[str, Path],
+        backend: LLMBackend,
+        threshold: float = 0.9,
+    ) -> "DistilledBackend":
+        """Load the models saved next to a tree configuration.
+
+        Args:
+            config_path: Path of the tree configuration
+            backend: Backend answering the prompts the models are unsure of
+            threshold: Minimum probability of the best option
+
+        Returns:
+            The backend
+        """
+        return cls(distilled_path(config_path), backend, threshold=threshold)
+
+    @property
+    def model_id(self) -> str:
+        """Identity of the models, threshold and wrapped backend."""
+        return f"distilled:{self._digest}:{self.threshold}:{self.backend.model_id}"
+
+    @property
+    def tokenizer(self) -> Optional[Tokenizer]:
+        """Tokenizer of the wrapped backend's model."""
+        return self.backend.tokenizer
+
+    def warm_up(self, nodes: Sequence[Tuple[str, List[str]]]) -> None:
+        """Prepare the wrapped backend for the given nodes."""
+        self.backend.warm_up(nodes)
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        """Answer locally when confident, otherwise ask the wrapped backend.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            The selected response from valid_responses
+        """
+        return self.get_responses_batch([prompt], [valid_responses])[0]
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Answer confident prompts locally and defer the rest in one batch.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+        """
+        answers: List[Optional[str]] = [None] * len(prompts)
+        for i, (probabilities, options) in self._predict(
+            prompts, valid_responses_list
+        ).items():
+            best = int(probabilities.argmax())
+            if probabilities[best] >= self.threshold:
+                answers[i] = options[best]
+
+        deferred = [i for i, answer in enumerate(answers) if answer is None]
+        self._count(prompts, answers)
+        if deferred:
+            live = self.backend.get_responses_batch(
+                [prompts[i] for i in deferred],
+                [valid_responses_list[i] for i in deferred],
+            )
+            for i, answer in zip(deferred, live, strict=True):
+                answers[i] = answer
+        return answers  # type: ignore[return-value]
+
+    def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Return the model's log-probabilities when confident.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            Mapping of each valid response to its score
+        """
+        prediction = self._predict([prompt], [valid_responses]).get(0)
+        if prediction is not None and prediction[0].max() >= self.threshold:
+            self._count([prompt], [""])
+            with np.errstate(divide="ignore"):
+                return {
+                    option: float(np.log(p))
+                    for option, p in zip(prediction[1], prediction[0], strict=True)
+                }
+        self._count([prompt], [None])
+        return self.backend.score_responses(prompt, valid_responses)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many decisions were answered locally.
+
+        Returns:
+            Total calls, local answers and local rate, and the same
+            counters per node question
+        """
+        with self._lock:
+            counts = {question: tuple(c) for question, c in self._counts.items()}
+        calls = sum(c[0] for c in counts.values())
+        local = sum(c[1] for c in counts.values())
+        return {
+            "calls": calls,
+            "local": local,
+            "local_rate": local / calls if calls else 0.0,
+            "questions": {
+                question: {
+                    "calls": c[0],
+                    "local": c[1],
+                    "local_rate": c[1] / c[0],
+                }
+                for question, c in counts.items()
+            },
+        }
+
+    def close(self) -> None:
+        """Close the wrapped backend."""
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            close()
+
+    def _predict(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> Dict[int, Tuple[np.ndarray, Tuple[str, ...]]]:
+        """Score the prompts of nodes that have a model.
+
+        Documents are hashed once per batch, and every node's prompts are
+        scored in a single matrix pass.
+
+        Returns:
+            Option probabilities and options per prompt index with a model
+        """
+        # Model -> prompt indices, and document -> feature row
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[int]] = {}
+        documents: Dict[str, int] = {}
+        rows: List[int] = []
+        for i, (prompt, valid_responses) in enumerate(
+            zip(prompts, valid_responses_list, strict=True)
+        ):
+            document, question = split_prompt(prompt)
+            if self.models.get(question, valid_responses) is None:
+                rows.append(-1)
+                continue
+            groups.setdefault((question, tuple(valid_responses)), []).append(i)
+            rows.append(documents.setdefault(document, len(documents)))
+        if not groups:
+            return {}
+
+        features = self.models.features(list(documents))
+        predictions: Dict[int, Tuple[np.ndarray, Tuple[str, ...]]] = {}
+        for key, indices in groups.items():
+            model = self.models.models[key]
+            probabilities = model.predict_proba(
+                features.take(np.asarray([rows[i] for i in indices]))
+            )
+            for i, row in zip(indices, probabilities, strict=True):
+                predictions[i] = (row, model.options)
+        return predictions
+
+    def _count(self, prompts: List[str], answers: List[Optional[str]]) -> None:
+        """Count calls and local answers per question."""
+        with self._lock:
+            for prompt, answer in zip(prompts, answers, strict=True):
+                counts = self._counts.setdefault(split_prompt(prompt)[1], [0, 0])
+                counts[0] += 1
+                counts[1] += answer is not None
@@ -0,0 +1,267 @@
+"""HTTP backend for OpenAI-compatible completion servers."""
+
+import json
+import logging
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from llm_tree_classifier import instrumentation
+from llm_tree_classifier.exceptions import LLMError
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.prompts import (
+    build_grammar,
+    match_response,
+    render_backend_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class _RetryableError(Exception):
+    """A request failure worth retrying."""
+
+
+class HttpLLMBackend(LLMBackend):
+    """Backend for OpenAI-compatible /v1/completions endpoints.
+
+    Works with llama.cpp's server as well as other OpenAI-compatible
+    servers. Prompts are rendered exactly as LlamaCppBackend renders them,
+    and with grammar constraints enabled the request carries the same GBNF
+    grammar (a llama.cpp server extension). Keep-alive connections are
+    pooled, batches are sent concurrently over the pool, and failed requests
+    are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: Optional[str] = None,
+        api_key: Optional[str] = None,
+        grammar: bool = True,
+        max_connections: int = 8,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_tokens: int = 10,
+    ) -> None:
+        """Initialize the HTTP backend.
+
+        Args:
+            base_url: Server URL, e.g. http://localhost:8080
+            model: Model name sent with each request
+            api_key: Optional bearer token
+            grammar: Whether to constrain answers with a GBNF grammar
+            max_connections: Size of the connection pool, which is also the
+                number of requests of a batch sent concurrently
+            timeout: Socket timeout per request in seconds
+            max_retries: Number of retries after a failed request
+            backoff: Initial retry delay in seconds, doubled per retry
+            max_tokens: Maximum number of tokens generated per answer
+
+        Raises:
+            LLMError: If the URL is not http or https
+        """
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise LLMError(f"Invalid server URL: {base_url}")
+
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.grammar = grammar
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_tokens = max_tokens
+
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path.rstrip("/") + "/v1/completions"
+        self._headers = {"Content-Type": "application/json"}
+        if api_key:
+            self._headers["Authorization"] = f"Bearer {api_key}"
+
+        self._pool: queue.LifoQueue[HTTPConnection] = queue.LifoQueue()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def model_id(self) -> str:
+        """Identity of the server and model."""
+        return f"http:{self.base_url}:{self.model or ''}:{self.grammar}"
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        """Get a response from the server.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            The selected response from valid_responses
+
+        Raises:
+            LLMError: If the server cannot be reached or keeps failing
+        """
+        prefix, suffix = render_backend_prompt(prompt, valid_responses)
+        body: Dict[str, Any] = {
+            "prompt": prefix + suffix,
+            "max_tokens": self.max_tokens,
+            "temperature": 0.0,
+            "stop": ["\n"],
+        }
+        if self.model is not None:
+            body["model"] = self.model
+        if self.grammar:
+            body["grammar"] = build_grammar(valid_responses)
+
+        result = self._post(body)
+        try:
+            answer = result["choices"][0]["text"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"Unexpected completion response: {result}") from e
+
+        hooks = instrumentation.hooks
+        usage = result.get("usage")
+        if hooks is not None and isinstance(usage, dict):
+            hooks.tokens(
+                usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+            )
+
+        valid = match_response(answer, valid_responses)
+        if valid is None:
+            if hooks is not None:
+                hooks.backend_fallback()
+            logger.warning(
+                "No match found for response: %s. Using fallback: %s",
+                answer,
+                valid_responses[0],
+            )
+            return valid_responses[0]
+        return valid
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Get responses for several prompts with concurrent requests.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+        """
+        if len(prompts) <= 1:
+            return super().get_responses_batch(prompts, valid_responses_list)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_connections, thread_name_prefix="llm-http"
+            )
+        return list(
+            self._executor.map(self.get_response, prompts, valid_responses_list)
+        )
+
+    def close(self) -> None:
+        """Close pooled connections and the request executor."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _post(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """POST a completion request, retrying transient failures.
+
+        Args:
+            body: Request body
+
+        Returns:
+            Decoded response body
+
+        Raises:
+            LLMError: If the request fails permanently
+        """
+        data = json.dumps(body).encode("utf-8")
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._request(data)
+            except _RetryableError as e:
+                if attempt == self.max_retries:
+                    raise LLMError(
+                        f"Completion request failed after {attempt + 1} attempts: {e}"
+                    ) from e
+                logger.warning("Completion request failed (%s), retrying", e)
+                # Jitter spreads out retries of concurrent requests
+                time.sleep(delay * (0.5 + random.random()))
+                delay *= 2
+        raise AssertionError("unreachable")
+
+    def _request(self, data: bytes) -> Dict[str, Any]:
+        """Send one request over a pooled connection.
+
+        Args:
+            data: Encoded request body
+
+        Returns:
+            Decoded response body
+
+        Raises:
+            _RetryableError: On connection errors and retryable statuses
+            LLMError: On other error statuses or invalid JSON
+        """
+        conn = self._acquire()
+        try:
+            conn.request("POST", self._path, body=data, headers=self._headers)
+            response = conn.getresponse()
+            payload = response.read()
+        except (HTTPException, OSError) as e:
+            conn.close()
+            raise _RetryableError(str(e)) from e
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+        if response.status in RETRY_STATUSES:
+            raise _RetryableError(f"HTTP {response.status}")
+        if response.status != HTTPStatus.OK:
+            raise LLMError(
+                f"Completion request failed with HTTP {response.status}: "
+                f"{payload[:200]!r}"
+            )
+        try:
+            body: Dict[str, Any] = json.loads(payload)
+        except json.JSONDecodeError as e:
+            raise LLMError(f"Invalid JSON from completion server: {e}") from e
+        return body
+
+    def _acquire(self) -> HTTPConnection:
+        """Take a keep-alive connection from the pool or open a new one."""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            connection_class = (
+                HTTPSConnection if self._scheme == "https" else HTTPConnection
+            )
+            return connection_class(self._host, self._port, timeout=self.timeout)
+
+    def _release(self, conn: HTTPConnection) -> None:
+        """Return a connection to the pool, closing it if the pool is full."""
+        if self._pool.qsize() < self.max_connections:
+            self._pool.put(conn)
+        else:
+            conn.close()
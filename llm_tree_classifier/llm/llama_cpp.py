@@ -1,15 +1,75 @@
 """LLaMA.cpp implementation for the LLM Tree Classifier."""
 
 import logging
-from typing import List, Optional
+import os
+import threading
+import weakref
+from collections import Counter, OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Set, Tuple
 
-from llama_cpp import Llama
+import llama_cpp
+import numpy as np
+from llama_cpp import Llama, LlamaGrammar, LlamaState
+from llama_cpp._internals import LlamaBatch, LlamaContext
 
+from llm_tree_classifier import instrumentation
+from llm_tree_classifier.documents import Tokenizer
 from llm_tree_classifier.exceptions import LLMError
 from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.prompts import (
+    SYSTEM_PROMPT,
+    build_grammar,
+    match_response,
+    render_backend_prompt,
+    render_node_suffix,
+)
+
+if TYPE_CHECKING:
+    from llm_tree_classifier.llm.registry import ModelHandle, ModelRegistry
 
 logger = logging.getLogger(__name__)
 
+SCORING_MODES = ("grammar", "logprob")
+
+# Tokens reserved for the answer when sampling with a grammar
+MAX_ANSWER_TOKENS = 10
+
+# Number of recent prompt prefixes remembered to detect interleaving
+PREFIX_HISTORY = 64
+
+
+def _common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    """Return the number of leading tokens two sequences have in common."""
+    n = 0
+    for x, y in zip(a, b, strict=False):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def _log_softmax(logits: np.ndarray) -> np.ndarray:
+    """Convert logits to log-probabilities."""
+    shifted = logits - np.max(logits)
+    logprobs: np.ndarray = shifted - np.log(np.sum(np.exp(shifted)))
+    return logprobs
+
+
+class _LlamaTokenizer(Tokenizer):
+    """Tokenizer of a loaded model, used to budget documents."""
+
+    def __init__(self, model: Llama, cache_size: int = 1024) -> None:
+        super().__init__(cache_size)
+        self.model = model
+
+    def encode(self, text: str) -> List[int]:
+        """Tokenize text without a BOS token."""
+        return self.model.tokenize(text.encode("utf-8"), add_bos=False)
+
+    def decode(self, tokens: List[int]) -> str:  # type: ignore[override]
+        """Detokenize a run of tokens, dropping split multi-byte characters."""
+        return self.model.detokenize(tokens).decode("utf-8", errors="ignore")
+
 
 class LlamaCppBackend(LLMBackend):
     """LLaMA.cpp implementation of the LLM backend."""
@@ -21,6 +81,14 @@ class LlamaCppBackend(LLMBackend):
         n_batch: int = 512,
         n_threads: Optional[int] = None,
         n_gpu_layers: int = 0,
+        prefix_cache_size: int = 8,
+        scoring: str = "grammar",
+        batch_size: int = 16,
+        batch_n_ctx: Optional[int] = None,
+        token_cache_size: int = 256,
+        use_mmap: bool = True,
+        use_mlock: bool = False,
+        registry: Optional["ModelRegistry"] = None,
     ) -> None:
         """Initialize the LLaMA.cpp backend.
 
@@ -30,23 +98,127 @@ class LlamaCppBackend(LLMBackend):
             n_batch: Batch size for prompt processing
             n_threads: Number of threads to use (None for auto)
             n_gpu_layers: Number of layers to offload to GPU
+            prefix_cache_size: Number of evaluated prompt prefixes (system
+                prompt plus document) whose KV state is kept, for documents
+                whose prompts are interleaved with other documents' (several
+                trees, concurrent requests). A state is only saved when a
+                prefix comes back after another one. Each saved state is a
+                full copy of the context's KV cache and logits, so memory
+                grows by up to this many contexts. 0 disables the cache.
+            scoring: How a response is chosen. "grammar" samples a
+                grammar-constrained answer, "logprob" evaluates the prompt
+                once and picks the option with the highest log-probability.
+            batch_size: Maximum number of prompts decoded together by
+                get_responses_batch
+            batch_n_ctx: KV cache size shared by all sequences of one batch
+                (defaults to n_ctx * batch_size / 4)
+            token_cache_size: Number of tokenized prompt parts (documents,
+                questions, options) kept, so a rendered document is
+                tokenized once for all nodes and trees
+            use_mmap: Memory-map the model file instead of reading it, so
+                processes loading the same file share its pages
+            use_mlock: Lock the model weights in RAM so they are never
+                paged out
+            registry: ModelRegistry to load the model through. Backends
+                using the same registry, model path and load parameters
+                share one loaded model. None loads a model for this backend
+                only.
 
         Raises:
             LLMError: If there is an error initializing the model
         """
-        try:
-            logger.info(f"Initializing LLaMA.cpp backend with model: {model_path}")
-            self.model = Llama(
-                model_path=model_path,
-                n_ctx=n_ctx,
-                n_batch=n_batch,
-                n_threads=n_threads,
-                n_gpu_layers=n_gpu_layers,
+        if scoring not in SCORING_MODES:
+            raise LLMError(
+                f"Unknown scoring mode '{scoring}'. Expected one of {SCORING_MODES}"
             )
+        self.scoring = scoring
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        # llama.cpp caps the batch at the context size; decode chunks must too
+        self.n_batch = min(n_batch, n_ctx)
+        self.batch_size = max(1, batch_size)
+        self.batch_n_ctx = batch_n_ctx or max(n_ctx, n_ctx * self.batch_size // 4)
+        self._batch_context: Optional[LlamaContext] = None
+        self._batch: Optional[LlamaBatch] = None
+        self.token_cache_size = token_cache_size
+        self._token_cache: OrderedDict[Tuple[str, bool], List[int]] = OrderedDict()
+        self._tokenizer: Optional[_LlamaTokenizer] = None
+        # Compiled grammars, one per option set
+        self._grammars: Dict[Tuple[str, ...], LlamaGrammar] = {}
+
+        load_params: Dict[str, Any] = {
+            "n_ctx": n_ctx,
+            "n_batch": n_batch,
+            "n_threads": n_threads,
+            "n_gpu_layers": n_gpu_layers,
+            "use_mmap": use_mmap,
+            "use_mlock": use_mlock,
+        }
+        self._handle: Optional[ModelHandle] = None
+        self._release: Optional[weakref.finalize] = None
+        try:
+            logger.info("Initializing LLaMA.cpp backend with model: %s", model_path)
+            if registry is not None:
+                handle = registry.acquire(model_path, **load_params)
+                self._handle = handle
+                self.model = handle.model
+                # Guards the contexts shared with other backends
+                self._model_lock = handle.lock
+                # Release the handle when the backend is closed or collected
+                self._release = weakref.finalize(self, handle.release)
+            else:
+                self.model = Llama(model_path=model_path, **load_params)
+                self._model_lock = threading.RLock()
+            self.prefix_cache_size = prefix_cache_size
+            self._prefix_cache: OrderedDict[Tuple[int, ...], LlamaState] = OrderedDict()
+            # Hashes of recently evaluated prefixes, oldest first
+            self._seen_prefixes: OrderedDict[int, None] = OrderedDict()
             logger.info("LLaMA.cpp backend initialized successfully")
         except Exception as e:
-            logger.error(f"Error initializing LLaMA.cpp backend: {e}")
-            raise LLMError(f"Failed to initialize LLaMA.cpp backend: {e}")
+            logger.error("Error initializing LLaMA.cpp backend: %s", e)
+            raise LLMError(f"Failed to initialize LLaMA.cpp backend: {e}") from e
+
+    @property
+    def model_id(self) -> str:
+        """Identity of the model file and scoring mode.
+
+        Returns:
+            File name, size and modification time of the model plus the
+            scoring mode
+        """
+        try:
+            stat = os.stat(self.model_path)
+            file_id = (
+                f"{os.path.basename(self.model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+            )
+        except OSError:
+            file_id = os.path.basename(self.model_path)
+        return f"llama_cpp:{file_id}:{self.scoring}"
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        """Tokenizer of the model, used to budget documents."""
+        if self._tokenizer is None:
+            self._tokenizer = _LlamaTokenizer(self.model)
+        return self._tokenizer
+
+    def close(self) -> None:
+        """Free the batch context and release the model.
+
+        A model loaded through a registry is handed back to it, which
+        unloads it (and its batch context) once no backend uses it and its
+        TTL has passed. A model owned by this backend is freed at once.
+        """
+        self._prefix_cache.clear()
+        if self._batch_context is not None:
+            self._batch_context.close()
+            self._batch_context = None
+        if self._release is not None:
+            self._release()
+        else:
+            close = getattr(self.model, "close", None)
+            if close is not None:
+                close()
 
     def get_response(self, prompt: str, valid_responses: List[str]) -> str:
         """Get a response from the LLM.
@@ -61,65 +233,603 @@ class LlamaCppBackend(LLMBackend):
         Raises:
             LLMError: If there is an error getting a response from the LLM
         """
+        if self.scoring == "logprob":
+            scores = self.score_responses(prompt, valid_responses)
+            answer = max(valid_responses, key=scores.__getitem__)
+            logger.info("Selected response: %s", answer)
+            return answer
+
         try:
-            # Create grammar for valid responses
-            grammar = self._create_grammar(valid_responses)
-
-            # Add system prompt
-            full_prompt = (
-                "You are a decision maker. Choose one of the following options:\n"
-                f"{', '.join(valid_responses)}\n\n"
-                f"Question: {prompt}\nAnswer:"
-            )
+            grammar = self._grammar(valid_responses)
 
-            logger.debug(f"Sending prompt to LLM: {full_prompt}")
-            logger.debug(f"Valid responses: {valid_responses}")
+            logger.debug("Sending prompt to LLM: %s", prompt)
+            logger.debug("Valid responses: %s", valid_responses)
 
-            # Get response with grammar constraint
-            response = self.model(
-                full_prompt,
-                max_tokens=10,
-                stop=["\n"],
-                temperature=0.0,
-                grammar=grammar,
-            )
+            with self._model_lock:
+                tokens = self._prompt_tokens(prompt, valid_responses, MAX_ANSWER_TOKENS)
+
+                # Get response with grammar constraint
+                response = self.model.create_completion(
+                    tokens,
+                    max_tokens=MAX_ANSWER_TOKENS,
+                    stop=["\n"],
+                    temperature=0.0,
+                    grammar=grammar,
+                )
 
             # Extract and normalize response
             answer = response["choices"][0]["text"].strip().lower()
-            logger.debug(f"Raw LLM response: {answer}")
+            logger.debug("Raw LLM response: %s", answer)
+
+            hooks = instrumentation.hooks
+            if hooks is not None:
+                hooks.tokens(
+                    len(tokens), response.get("usage", {}).get("completion_tokens", 0)
+                )
 
             # Find the closest matching valid response
-            for valid in valid_responses:
-                if valid.lower() in answer or answer in valid.lower():
-                    logger.info(f"Selected response: {valid}")
-                    return valid
+            valid = match_response(answer, valid_responses)
+            if valid is not None:
+                logger.info("Selected response: %s", valid)
+                return valid
 
             # If no match found, return the first valid response as fallback
+            if hooks is not None:
+                hooks.backend_fallback()
             logger.warning(
-                f"No exact match found for response: {answer}. Using fallback: {valid_responses[0]}"
+                "No exact match found for response: %s. Using fallback: %s",
+                answer,
+                valid_responses[0],
             )
             return valid_responses[0]
 
         except Exception as e:
-            logger.error(f"Error getting response from LLM: {e}")
-            raise LLMError(f"Failed to get response from LLM: {e}")
+            logger.error("Error getting response from LLM: %s", e)
+            raise LLMError(f"Failed to get response from LLM: {e}") from e
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Get responses for several prompts.
+
+        In logprob scoring mode, prompts are packed as separate sequences
+        into multi-sequence batches and every option is scored as by
+        score_responses. In grammar mode each prompt is answered by
+        get_response in turn, so a text gets the same answer whether or not
+        it was batched.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+
+        Raises:
+            LLMError: If there is an error getting responses from the LLM
+        """
+        if self.scoring == "grammar" or len(prompts) <= 1:
+            return super().get_responses_batch(prompts, valid_responses_list)
+
+        answers = []
+        for valid_responses, scores in zip(
+            valid_responses_list,
+            self.score_responses_batch(prompts, valid_responses_list),
+            strict=True,
+        ):
+            answers.append(max(valid_responses, key=scores.__getitem__))
+        logger.info("Selected %d responses in batch", len(answers))
+        return answers
+
+    def score_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[Dict[str, float]]:
+        """Score the valid responses of several prompts in shared batches.
+
+        The system prompt is evaluated once per batch and copied into every
+        sequence. A document prefix shared by several prompts of a batch (for
+        example the nodes of several trees for one text) is evaluated once
+        and branched into each of those prompts. Options longer than one
+        token are scored on forks of their prompt sequence, which share the
+        prompt's KV cells.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            Mapping of each valid response to its log-probability, per prompt
+
+        Raises:
+            LLMError: If there is an error evaluating the prompts
+        """
+        if len(prompts) != len(valid_responses_list):
+            raise LLMError("Number of prompts and response option lists differ")
+
+        try:
+            system = self._tokenize(SYSTEM_PROMPT, add_bos=True)
+            sequences = []
+            for prompt, valid_responses in zip(
+                prompts, valid_responses_list, strict=True
+            ):
+                prefix, suffix = render_backend_prompt(prompt, valid_responses)
+                tokens = list(self._tokenize(prefix, add_bos=True))
+                n_prefix = len(tokens)
+                tokens += self._tokenize(suffix)
+                options = self._option_tokens(valid_responses)
+                self._check_length(len(tokens), max(map(len, options), default=0))
+                sequences.append((tokens, n_prefix, options))
+
+            totals: List[List[float]] = []
+            with self._model_lock:
+                for start, end in self._pack_sequences(sequences, len(system)):
+                    totals.extend(self._score_group(system, sequences[start:end]))
+
+            hooks = instrumentation.hooks
+            if hooks is not None:
+                hooks.tokens(
+                    sum(len(tokens) for tokens, _, _ in sequences),
+                    sum(len(o) for _, _, options in sequences for o in options),
+                )
+
+            return [
+                dict(zip(valid_responses, scores, strict=True))
+                for valid_responses, scores in zip(
+                    valid_responses_list, totals, strict=True
+                )
+            ]
+
+        except Exception as e:
+            logger.error("Error scoring batch: %s", e)
+            raise LLMError(f"Failed to score batch: {e}") from e
 
-    def _create_grammar(self, valid_responses: List[str]) -> str:
-        """Create a grammar string for valid responses.
+    def _pack_sequences(
+        self, sequences: List[Tuple[List[int], int, List[List[int]]]], n_system: int
+    ) -> List[Tuple[int, int]]:
+        """Split sequences into groups that fit one batch context.
 
         Args:
+            sequences: Prompt tokens, prefix length and tokenized options per
+                prompt
+            n_system: Number of system prompt tokens shared by all sequences
+
+        Returns:
+            List of (start, end) index ranges into sequences
+        """
+        max_seq_ids = min(llama_cpp.llama_max_parallel_sequences(), self.batch_size * 8)
+        groups = []
+        start = 0
+        cells = n_system
+        seq_ids = 1
+        prefixes: Set[Tuple[int, ...]] = set()
+        for i, (tokens, n_prefix, options) in enumerate(sequences):
+            forks = [option for option in options if len(option) > 1]
+            prefix = tuple(tokens[:n_prefix])
+            need_cells = len(tokens) + sum(len(option) - 1 for option in forks)
+            # One extra sequence per distinct prefix, in case it is shared
+            need_ids = 1 + len(forks) + (prefix not in prefixes)
+            if i > start and (
+                i - start >= self.batch_size
+                or cells + need_cells > self.batch_n_ctx
+                or seq_ids + need_ids > max_seq_ids
+            ):
+                groups.append((start, i))
+                start, cells, seq_ids = i, n_system, 1
+                prefixes = set()
+                need_ids = 2 + len(forks)
+            if prefix in prefixes:
+                need_cells -= n_prefix
+            prefixes.add(prefix)
+            cells += need_cells
+            seq_ids += need_ids
+        groups.append((start, len(sequences)))
+        return groups
+
+    def _score_group(
+        self,
+        system: List[int],
+        group: List[Tuple[List[int], int, List[List[int]]]],
+    ) -> List[List[float]]:
+        """Score the options of a group of prompts with multi-sequence decoding.
+
+        Sequence 0 holds the system prompt. Prefixes shared by several
+        prompts get their own sequence next, branched off sequence 0. Then
+        come the prompts, each branched off its prefix sequence (or sequence
+        0), and finally forks for multi-token options.
+
+        Args:
+            system: System prompt tokens
+            group: Prompt tokens, prefix length and tokenized options per prompt
+
+        Returns:
+            Summed option log-probabilities per prompt
+        """
+        ctx = self._get_batch_context()
+        ctx.kv_cache_clear()
+        self._decode(ctx, [(0, pos, token, False) for pos, token in enumerate(system)])
+
+        # Shared prefixes: copy the system prompt cells, decode the rest
+        counts = Counter(tuple(tokens[:n_prefix]) for tokens, n_prefix, _ in group)
+        sources: Dict[Tuple[int, ...], int] = {}
+        entries = []
+        for prefix, count in counts.items():
+            if count == 1:
+                continue
+            seq_id = len(sources) + 1
+            sources[prefix] = seq_id
+            n_shared = _common_prefix_length(system, prefix)
+            ctx.kv_cache_seq_cp(0, seq_id, 0, n_shared)
+            for pos in range(n_shared, len(prefix)):
+                entries.append((seq_id, pos, prefix[pos], False))
+        if entries:
+            self._decode(ctx, entries)
+
+        # Prompts: copy the shared prefix cells, decode the rest
+        first_prompt = len(sources) + 1
+        entries = []
+        for k, (tokens, n_prefix, _options) in enumerate(group):
+            seq_id = first_prompt + k
+            source = sources.get(tuple(tokens[:n_prefix]), 0)
+            # Keep at least the last token, whose logits are needed
+            n_shared = min(
+                n_prefix if source else _common_prefix_length(system, tokens),
+                len(tokens) - 1,
+            )
+            ctx.kv_cache_seq_cp(source, seq_id, 0, n_shared)
+            last = len(tokens) - 1
+            for pos in range(n_shared, len(tokens)):
+                entries.append((seq_id, pos, tokens[pos], pos == last))
+        prompt_logprobs = self._decode(ctx, entries)
+
+        # Multi-token options: fork the prompt sequence and decode all but
+        # the last option token, keeping logits for each
+        totals = []
+        forks = []
+        entries = []
+        next_seq_id = first_prompt + len(group)
+        for k, (tokens, _n_prefix, options) in enumerate(group):
+            totals.append([float(prompt_logprobs[k][option[0]]) for option in options])
+            for j, option in enumerate(options):
+                if len(option) <= 1:
+                    continue
+                ctx.kv_cache_seq_cp(first_prompt + k, next_seq_id, -1, -1)
+                for m, token in enumerate(option[:-1]):
+                    entries.append((next_seq_id, len(tokens) + m, token, True))
+                forks.append((k, j))
+                next_seq_id += 1
+
+        option_logprobs = iter(self._decode(ctx, entries))
+        for k, j in forks:
+            option = group[k][2][j]
+            for token in option[1:]:
+                totals[k][j] += float(next(option_logprobs)[token])
+
+        return totals
+
+    def _decode(
+        self, ctx: LlamaContext, entries: List[Tuple[int, int, int, bool]]
+    ) -> List[np.ndarray]:
+        """Decode (seq_id, pos, token, want_logits) entries in n_batch chunks.
+
+        Args:
+            ctx: Batch context to decode in
+            entries: Tokens to decode with their sequence and position
+
+        Returns:
+            Next-token log-probabilities for every entry that wanted logits,
+            in entry order
+        """
+        if self._batch is None:
+            self._batch = LlamaBatch(n_tokens=self.n_batch, embd=0, n_seq_max=1)
+        batch = self._batch.batch
+        n_vocab = self.model.n_vocab()
+
+        logprobs = []
+        for start in range(0, len(entries), self.n_batch):
+            chunk = entries[start : start + self.n_batch]
+            batch.n_tokens = len(chunk)
+            for i, (seq_id, pos, token, want_logits) in enumerate(chunk):
+                batch.token[i] = token
+                batch.pos[i] = pos
+                batch.n_seq_id[i] = 1
+                batch.seq_id[i][0] = seq_id
+                batch.logits[i] = want_logits
+            ctx.decode(self._batch)
+            for i, entry in enumerate(chunk):
+                if entry[3]:
+                    logits = np.ctypeslib.as_array(
+                        ctx.get_logits_ith(i), shape=(n_vocab,)
+                    )
+                    logprobs.append(_log_softmax(logits))
+        return logprobs
+
+    def _get_batch_context(self) -> LlamaContext:
+        """Return the multi-sequence context, creating it on first use.
+
+        The batch context shares the model weights with the main context but
+        has its own unified KV cache sized for batch_n_ctx tokens. For a
+        model from a registry it belongs to the model handle, so backends
+        sharing the model share it too. Call with the model lock held.
+
+        Returns:
+            The batch context
+        """
+        if self._handle is not None:
+            context: LlamaContext = self._handle.context(
+                ("batch", self.batch_n_ctx), self._create_batch_context
+            )
+            return context
+        if self._batch_context is None:
+            self._batch_context = self._create_batch_context()
+        return self._batch_context
+
+    def _create_batch_context(self) -> LlamaContext:
+        """Create a multi-sequence context with a unified KV cache.
+
+        Returns:
+            The new context
+        """
+        params = llama_cpp.llama_context_params.from_buffer_copy(
+            self.model.context_params
+        )
+        params.n_ctx = self.batch_n_ctx
+        params.n_seq_max = llama_cpp.llama_max_parallel_sequences()
+        params.kv_unified = True
+        return LlamaContext(model=self.model._model, params=params, verbose=False)
+
+    def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Score every valid response by its log-probability.
+
+        The prompt is evaluated once. Options are then scored token by token
+        along a trie of their tokenizations, so tokens shared by several
+        options are evaluated only once and single-token options need no
+        evaluation beyond the prompt.
+
+        Args:
+            prompt: The prompt to send to the LLM
             valid_responses: List of valid response options
 
         Returns:
-            Grammar string in GBNF format
+            Mapping of each valid response to the summed log-probability of
+            its tokens
+
+        Raises:
+            LLMError: If there is an error evaluating the prompt
         """
-        # Create root rule
-        grammar = "root ::= response\n"
+        try:
+            options = self._option_tokens(valid_responses)
+            with self._model_lock:
+                tokens = self._prompt_tokens(
+                    prompt, valid_responses, max(map(len, options), default=0)
+                )
+
+                # Always evaluate at least the last prompt token so its logits
+                # are fresh, even if the whole prompt is already in the context
+                n_common = _common_prefix_length(
+                    self.model.input_ids[: self.model.n_tokens].tolist(), tokens
+                )
+                self.model.n_tokens = min(n_common, len(tokens) - 1)
+                self.model.eval(tokens[self.model.n_tokens :])
+
+                totals = [0.0] * len(options)
+                self._score_branch(
+                    options,
+                    list(range(len(options))),
+                    0,
+                    self._last_logprobs(),
+                    totals,
+                )
 
-        # Create response rule with all valid options
-        response_rule = "response ::= "
-        response_rule += " | ".join(f'"{resp}"' for resp in valid_responses)
-        grammar += response_rule + "\n"
+            hooks = instrumentation.hooks
+            if hooks is not None:
+                hooks.tokens(len(tokens), sum(len(option) for option in options))
 
-        logger.debug(f"Created grammar: {grammar}")
-        return grammar 
\ No newline at end of file
+            scores = dict(zip(valid_responses, totals, strict=True))
+            logger.debug("Option scores: %s", scores)
+            return scores
+
+        except Exception as e:
+            logger.error("Error scoring responses: %s", e)
+            raise LLMError(f"Failed to score responses: {e}") from e
+
+    def _score_branch(
+        self,
+        options: List[List[int]],
+        members: List[int],
+        depth: int,
+        logprobs: np.ndarray,
+        totals: List[float],
+    ) -> None:
+        """Accumulate log-probabilities for options sharing a token prefix.
+
+        Args:
+            options: Tokenized options
+            members: Indices of the options that share the evaluated prefix
+            depth: Number of option tokens already in the context
+            logprobs: Log-probabilities of the next token
+            totals: Running score per option, updated in place
+        """
+        groups: Dict[int, List[int]] = {}
+        for i in members:
+            if depth < len(options[i]):
+                groups.setdefault(options[i][depth], []).append(i)
+
+        n_past = self.model.n_tokens
+        for token, group in groups.items():
+            for i in group:
+                totals[i] += float(logprobs[token])
+            if any(depth + 1 < len(options[i]) for i in group):
+                self.model.n_tokens = n_past
+                self.model.eval([token])
+                self._score_branch(
+                    options, group, depth + 1, self._last_logprobs(), totals
+                )
+
+    def _last_logprobs(self) -> np.ndarray:
+        """Return next-token log-probabilities after the last evaluated token."""
+        logits = np.ctypeslib.as_array(
+            self.model._ctx.get_logits_ith(-1), shape=(self.model.n_vocab(),)
+        )
+        return _log_softmax(logits)
+
+    def _tokenize(self, text: str, add_bos: bool = False) -> List[int]:
+        """Tokenize a prompt part, from the token cache when possible.
+
+        Args:
+            text: Text to tokenize
+            add_bos: Whether to start with a BOS token
+
+        Returns:
+            Tokens (shared with the cache; do not modify)
+        """
+        key = (text, add_bos)
+        tokens = self._token_cache.get(key)
+        if tokens is not None:
+            self._token_cache.move_to_end(key)
+            return tokens
+        tokens = list(self.model.tokenize(text.encode("utf-8"), add_bos=add_bos))
+        if self.token_cache_size > 0:
+            self._token_cache[key] = tokens
+            while len(self._token_cache) > self.token_cache_size:
+                self._token_cache.popitem(last=False)
+        return tokens
+
+    def _option_tokens(self, valid_responses: List[str]) -> List[List[int]]:
+        """Tokenize the options as they follow "Answer:"."""
+        return [self._tokenize(f" {response}") for response in valid_responses]
+
+    def _check_length(self, n_prompt: int, n_answer: int) -> None:
+        """Fail early when a prompt and its answer cannot fit the context.
+
+        Args:
+            n_prompt: Prompt tokens
+            n_answer: Tokens needed for the answer
+
+        Raises:
+            LLMError: If the context window is too small
+        """
+        if n_prompt + n_answer > self.n_ctx:
+            raise LLMError(
+                f"Prompt of {n_prompt} tokens plus {n_answer} answer tokens "
+                f"exceeds the context window of {self.n_ctx}; set a "
+                "'documents' token_budget on the tree or raise n_ctx"
+            )
+
+    def _prompt_tokens(
+        self, prompt: str, valid_responses: List[str], n_answer: int
+    ) -> List[int]:
+        """Tokenize the full prompt, restoring the cached prefix state.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+            n_answer: Tokens needed for the answer
+
+        Returns:
+            Tokens of the system prompt, document, question and options
+
+        Raises:
+            LLMError: If the prompt does not fit the context window
+        """
+        prefix, suffix = render_backend_prompt(prompt, valid_responses)
+        prefix_tokens = self._tokenize(prefix, add_bos=True)
+        suffix_tokens = self._tokenize(suffix)
+        self._check_length(len(prefix_tokens) + len(suffix_tokens), n_answer)
+        self._prepare_prefix(prefix_tokens)
+        return prefix_tokens + suffix_tokens
+
+    def _prepare_prefix(self, tokens: List[int]) -> None:
+        """Make the KV state for a prompt prefix current in the model.
+
+        The model already reuses the longest common prefix with the prompt it
+        evaluated last, which covers the nodes of one document evaluated in
+        a row. A prefix that comes back after another one was evaluated in
+        between (e.g. by another tree or request) is evaluated and its state
+        saved in the prefix cache, so later returns restore it instead of
+        evaluating it again. Prefixes seen only once are never saved.
+
+        Args:
+            tokens: Tokens of the system prompt and document part of the prompt
+        """
+        if self.prefix_cache_size <= 0:
+            return
+
+        key = tuple(tokens)
+        n_common = _common_prefix_length(
+            self.model.input_ids[: self.model.n_tokens].tolist(), tokens
+        )
+        if n_common == len(tokens):
+            return
+
+        state = self._prefix_cache.get(key)
+        if state is not None:
+            self._prefix_cache.move_to_end(key)
+            self.model.load_state(state)
+            logger.debug("Prefix cache hit (%d tokens)", len(tokens))
+            return
+
+        digest = hash(key)
+        if digest not in self._seen_prefixes:
+            self._seen_prefixes[digest] = None
+            while len(self._seen_prefixes) > PREFIX_HISTORY:
+                self._seen_prefixes.popitem(last=False)
+            return
+        self._seen_prefixes.move_to_end(digest)
+
+        # Only evaluate what the live context does not already hold
+        self.model.n_tokens = n_common
+        self.model.eval(tokens[n_common:])
+        self._prefix_cache[key] = self.model.save_state()
+        while len(self._prefix_cache) > self.prefix_cache_size:
+            self._prefix_cache.popitem(last=False)
+        logger.debug("Prefix cache miss (%d tokens)", len(tokens))
+
+    def warm_up(self, nodes: Sequence[Tuple[str, List[str]]]) -> None:
+        """Compile grammars and tokenize node prompts ahead of the first text.
+
+        In grammar mode every distinct option set gets its grammar; in
+        logprob mode the options are tokenized. The question and options
+        part of every node prompt is tokenized in both modes.
+
+        Args:
+            nodes: Question and valid responses of every decision node
+        """
+        for question, valid_responses in nodes:
+            if self.scoring == "grammar":
+                self._grammar(valid_responses)
+            else:
+                self._option_tokens(valid_responses)
+            self._tokenize(render_node_suffix(question, tuple(valid_responses)))
+        logger.debug(
+            "Warmed up %d nodes (%d grammars)", len(nodes), len(self._grammars)
+        )
+
+    def _grammar(self, valid_responses: List[str]) -> LlamaGrammar:
+        """Return the grammar for an option set, compiling it once.
+
+        Args:
+            valid_responses: List of valid response options
+
+        Returns:
+            Grammar accepting exactly the valid responses
+        """
+        key = tuple(valid_responses)
+        grammar = self._grammars.get(key)
+        if grammar is None:
+            grammar = self._grammars[key] = self._create_grammar(valid_responses)
+        return grammar
+
+    def _create_grammar(self, valid_responses: List[str]) -> LlamaGrammar:
+        """Create a grammar for valid responses.
+
+        Args:
+            valid_responses: List of valid response options
+
+        Returns:
+            Grammar accepting exactly the valid responses
+        """
+        grammar = build_grammar(valid_responses)
+        logger.debug("Created grammar: %s", grammar)
+        return LlamaGrammar.from_string(grammar, verbose=False)
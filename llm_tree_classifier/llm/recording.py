@@ -0,0 +1,482 @@
+"""Record-and-replay backends for offline reprocessing."""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import (
+    IO,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from llm_tree_classifier import instrumentation
+from llm_tree_classifier.documents import Tokenizer
+from llm_tree_classifier.exceptions import LLMError
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.prompts import split_prompt
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# (document hash, question, options)
+DecisionId = Tuple[str, str, Tuple[str, ...]]
+# (prompt, options, answer, scores) of a decision to record
+Decision = Tuple[str, List[str], str, Optional[Dict[str, float]]]
+
+
+def _document_hash(document: str) -> str:
+    """Return a short hash identifying a document prompt part."""
+    if not document:
+        return ""
+    return hashlib.blake2b(document.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _decision_id(
+    prompt: str, valid_responses: List[str]
+) -> Tuple[str, str, DecisionId]:
+    """Split a prompt into its document and the id of the decision.
+
+    Args:
+        prompt: The prompt sent to the backend
+        valid_responses: List of valid response options
+
+    Returns:
+        Tuple of (document part, document hash, decision id)
+    """
+    document, question = split_prompt(prompt)
+    digest = _document_hash(document)
+    return document, digest, (digest, question, tuple(valid_responses))
+
+
+def _ends_without_newline(path: Path) -> bool:
+    """Return whether a file is non-empty and lacks a final newline."""
+    try:
+        with open(path, "rb") as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+    except OSError:
+        return False
+
+
+def read_recording(
+    path: Union[str, Path],
+) -> Iterator[Tuple[str, str, List[str], str]]:
+    """Read the decisions of a recording together with their documents.
+
+    Args:
+        path: Recording file written by RecordingBackend
+
+    Yields:
+        Tuples of (document part of the prompt, question, options, answer)
+
+    Raises:
+        LLMError: If the file cannot be read
+    """
+    documents: Dict[str, str] = {"": ""}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "text" in record:
+                    documents[record["d"]] = record["text"]
+                elif "a" in record and record["d"] in documents:
+                    yield documents[record["d"]], record["q"], record["o"], record["a"]
+    except OSError as e:
+        raise LLMError(f"Failed to read recording {path}: {e}") from e
+
+
+class RecordingBackend(LLMBackend):
+    """LLM backend wrapper that appends every decision to a file.
+
+    The file holds one compact JSON object per line. Each document is
+    written once, and decisions refer to it by hash, so a traversal of many
+    nodes over one text stores the text only once:
+
+        {"v": 1, "model": "<model_id>"}
+        {"d": "<hash>", "text": "<document part of the prompt>"}
+        {"d": "<hash>", "q": "<question>", "o": ["yes", "no"], "a": "yes",
+         "s": {"yes": -0.1, "no": -2.4}}
+
+    "s" is only present when scores were recorded. Records are flushed
+    after every call, so an interrupted run loses at most a partial line.
+    Runs append to an existing file, and ReplayBackend answers from it
+    later.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        path: Union[str, Path],
+        record_scores: bool = False,
+    ) -> None:
+        """Open the recording file for appending.
+
+        Args:
+            backend: The backend answering the prompts
+            path: Recording file
+            record_scores: Also record option scores for get_response and
+                get_responses_batch, at the cost of one score_responses call
+                per prompt
+
+        Raises:
+            LLMError: If the file cannot be opened
+        """
+        self.backend = backend
+        self.path = Path(path)
+        self.record_scores = record_scores
+        self.records = 0
+
+        self._lock = threading.Lock()
+        self._documents: Set[str] = set()
+        # Do not glue the header to a line cut short by an interrupted run
+        truncated = _ends_without_newline(self.path)
+        try:
+            self._file: IO[str] = open(self.path, "a", encoding="utf-8")
+        except OSError as e:
+            raise LLMError(f"Failed to open recording {self.path}: {e}") from e
+        if truncated:
+            self._file.write("\n")
+        self._write({"v": FORMAT_VERSION, "model": backend.model_id})
+        self._file.flush()
+
+    @property
+    def model_id(self) -> str:
+        """Identity of the wrapped backend's model."""
+        return self.backend.model_id
+
+    @property
+    def tokenizer(self) -> Optional[Tokenizer]:
+        """Tokenizer of the wrapped backend's model."""
+        return self.backend.tokenizer
+
+    def warm_up(self, nodes: Sequence[Tuple[str, List[str]]]) -> None:
+        """Prepare the wrapped backend for the given nodes."""
+        self.backend.warm_up(nodes)
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        """Get a response from the wrapped backend and record it.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            The selected response from valid_responses
+        """
+        answer = self.backend.get_response(prompt, valid_responses)
+        scores = (
+            self.backend.score_responses(prompt, valid_responses)
+            if self.record_scores
+            else None
+        )
+        self._record([(prompt, valid_responses, answer, scores)])
+        return answer
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Get responses from the wrapped backend and record them.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+        """
+        answers = self.backend.get_responses_batch(prompts, valid_responses_list)
+        self._record(
+            [
+                (
+                    prompt,
+                    valid_responses,
+                    answer,
+                    self.backend.score_responses(prompt, valid_responses)
+                    if self.record_scores
+                    else None,
+                )
+                for prompt, valid_responses, answer in zip(
+                    prompts, valid_responses_list, answers, strict=True
+                )
+            ]
+        )
+        return answers
+
+    def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Score responses with the wrapped backend and record the best one.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            Mapping of each valid response to its score
+        """
+        scores = self.backend.score_responses(prompt, valid_responses)
+        answer = max(valid_responses, key=scores.__getitem__)
+        self._record([(prompt, valid_responses, answer, scores)])
+        return scores
+
+    def flush(self) -> None:
+        """Flush buffered records to the file."""
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Flush and close the recording file."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self) -> "RecordingBackend":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _record(self, decisions: List[Decision]) -> None:
+        """Append decisions, each preceded by its document if it is new.
+
+        The file is flushed once all decisions are written.
+        """
+        with self._lock:
+            for prompt, valid_responses, answer, scores in decisions:
+                document, digest, (_, question, options) = _decision_id(
+                    prompt, valid_responses
+                )
+                record: Dict[str, object] = {
+                    "d": digest,
+                    "q": question,
+                    "o": list(options),
+                    "a": answer,
+                }
+                if scores is not None:
+                    record["s"] = scores
+                if digest and digest not in self._documents:
+                    self._documents.add(digest)
+                    self._write({"d": digest, "text": document})
+                self._write(record)
+                self.records += 1
+            self._file.flush()
+
+    def _write(self, record: Dict[str, object]) -> None:
+        """Write one line; the caller holds the lock (or is __init__)."""
+        self._file.write(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        )
+
+
+class ReplayBackend(LLMBackend):
+    """Backend answering from a recording, with an optional live fallback.
+
+    The recording is indexed in memory by document hash, question and
+    options; document texts are not kept. Prompts that were not recorded
+    are sent to the fallback backend. Wrap the fallback in a
+    RecordingBackend on the same file to extend the recording as you go.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        backend: Optional[LLMBackend] = None,
+    ) -> None:
+        """Load a recording.
+
+        Args:
+            path: Recording file written by RecordingBackend
+            backend: Backend answering prompts missing from the recording
+                (None to raise LLMError on misses). A warning is logged when
+                its model_id differs from the recorded model.
+
+        Raises:
+            LLMError: If the file cannot be read
+        """
+        self.path = Path(path)
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.recorded_model_id: Optional[str] = None
+        self._lock = threading.Lock()
+        self._index: Dict[DecisionId, Tuple[str, Optional[Dict[str, float]]]] = {}
+        self._load()
+        if (
+            backend is not None
+            and self.recorded_model_id is not None
+            and backend.model_id != self.recorded_model_id
+        ):
+            logger.warning(
+                "Recording %s was made with model %s, but the fallback backend "
+                "is %s; replayed and live answers will come from different models",
+                self.path,
+                self.recorded_model_id,
+                backend.model_id,
+            )
+
+    @property
+    def model_id(self) -> str:
+        """Identity of the recorded model (or of the fallback backend)."""
+        if self.recorded_model_id is not None:
+            return self.recorded_model_id
+        if self.backend is not None:
+            return self.backend.model_id
+        return f"replay:{self.path.name}"
+
+    @property
+    def tokenizer(self) -> Optional[Tokenizer]:
+        """Tokenizer of the fallback backend, if any.
+
+        Without a fallback, documents are budgeted by whitespace-separated
+        words, so trees with a token budget only replay recordings made the
+        same way.
+        """
+        return self.backend.tokenizer if self.backend is not None else None
+
+    def warm_up(self, nodes: Sequence[Tuple[str, List[str]]]) -> None:
+        """Prepare the fallback backend, if any, for the given nodes."""
+        if self.backend is not None:
+            self.backend.warm_up(nodes)
+
+    def __len__(self) -> int:
+        """Return the number of recorded decisions."""
+        return len(self._index)
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        """Answer from the recording, falling back to the live backend.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            The selected response from valid_responses
+
+        Raises:
+            LLMError: On a miss without a fallback backend
+        """
+        entry = self._lookup(prompt, valid_responses)
+        if entry is not None:
+            return entry[0]
+        return self._fallback().get_response(prompt, valid_responses)
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Answer from the recording, sending only misses to the live backend.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+
+        Raises:
+            LLMError: On a miss without a fallback backend
+        """
+        entries = [
+            self._lookup(prompt, valid_responses)
+            for prompt, valid_responses in zip(
+                prompts, valid_responses_list, strict=True
+            )
+        ]
+        answers = [entry[0] if entry is not None else None for entry in entries]
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if missing:
+            live = self._fallback().get_responses_batch(
+                [prompts[i] for i in missing],
+                [valid_responses_list[i] for i in missing],
+            )
+            for i, answer in zip(missing, live, strict=True):
+                answers[i] = answer
+        return answers  # type: ignore[return-value]
+
+    def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Return recorded scores, falling back to the live backend.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            Mapping of each valid response to its score
+
+        Raises:
+            LLMError: If no scores were recorded and there is no fallback
+        """
+        entry = self._lookup(prompt, valid_responses)
+        if entry is not None and entry[1] is not None:
+            return dict(entry[1])
+        return self._fallback().score_responses(prompt, valid_responses)
+
+    def _lookup(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Optional[Tuple[str, Optional[Dict[str, float]]]]:
+        """Find a recorded decision and count the hit or miss."""
+        _, _, decision = _decision_id(prompt, valid_responses)
+        entry = self._index.get(decision)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        hooks = instrumentation.hooks
+        if hooks is not None:
+            hooks.cache(entry is not None)
+        return entry
+
+    def _fallback(self) -> LLMBackend:
+        """Return the live backend for a miss.
+
+        Raises:
+            LLMError: If there is none
+        """
+        if self.backend is None:
+            raise LLMError(
+                f"Prompt not found in recording {self.path} and no live backend"
+            )
+        return self.backend
+
+    def _load(self) -> None:
+        """Build the in-memory index from the recording file.
+
+        Raises:
+            LLMError: If the file cannot be read
+        """
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line_number, line in enumerate(f, start=1):
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Typically a line cut short by an interrupted run
+                        logger.warning(
+                            "Skipping invalid line %d of %s", line_number, self.path
+                        )
+                        continue
+                    if "a" in record:
+                        decision = (record["d"], record["q"], tuple(record["o"]))
+                        self._index[decision] = (record["a"], record.get("s"))
+                    elif "model" in record:
+                        self.recorded_model_id = record["model"]
+        except OSError as e:
+            raise LLMError(f"Failed to read recording {self.path}: {e}") from e
+        logger.info("Loaded %d recorded decisions from %s", len(self._index), self.path)
@@ -0,0 +1,280 @@
+"""Process-wide registry of loaded models.
+
+Every LlamaCppBackend normally loads its own Llama. A service that hosts
+many tree configurations, or runs the same model with different trees,
+would load the weights once per backend. Backends created with a registry
+share one loaded model per model path and load parameters instead:
+
+    registry = get_registry()
+    sentiment = LlamaCppBackend("model.gguf", registry=registry)
+    topic = LlamaCppBackend("model.gguf", registry=registry)  # same Llama
+
+The registry hands out reference-counted handles. Once the last handle of a
+model is released, the model stays loaded for ttl seconds, so a backend
+that is closed and recreated (for example when a tree configuration is
+reloaded) does not load it again, and is then unloaded.
+
+A loaded model has one llama.cpp context, plus any extra contexts created
+through its handles (such as the batch context of LlamaCppBackend), which
+are freed with the model. Backends sharing a model serialize their use of
+its contexts through the handle's lock.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds an unused model stays loaded by default
+DEFAULT_TTL = 300.0
+
+ModelKey = Tuple[str, Tuple[Tuple[str, Any], ...]]
+
+
+def model_key(model_path: str, params: Dict[str, Any]) -> ModelKey:
+    """Return the registry key of a model.
+
+    Args:
+        model_path: Path to the model file
+        params: Load parameters
+
+    Returns:
+        Resolved path and sorted load parameters
+    """
+    return os.path.realpath(model_path), tuple(sorted(params.items()))
+
+
+def _load_llama(model_path: str, **params: Any) -> Any:
+    """Load a model with llama_cpp.Llama."""
+    from llama_cpp import Llama
+
+    return Llama(model_path=model_path, **params)
+
+
+class _Entry:
+    """A loaded model and its reference count."""
+
+    __slots__ = ("contexts", "idle_since", "lock", "model", "refs", "timer")
+
+    def __init__(self, model: Any) -> None:
+        self.model = model
+        self.lock = threading.RLock()
+        self.contexts: Dict[Any, Any] = {}
+        self.refs = 0
+        self.idle_since: Optional[float] = None
+        self.timer: Optional[threading.Timer] = None
+
+
+class ModelHandle:
+    """Reference to a model loaded by a ModelRegistry.
+
+    Release the handle when done with the model; it is released at most
+    once, so release() may be called again safely.
+    """
+
+    __slots__ = ("_entry", "_registry", "_released", "key", "lock", "model")
+
+    def __init__(self, registry: "ModelRegistry", key: ModelKey, entry: _Entry):
+        self.key = key
+        self.model = entry.model
+        # Serializes use of the model's context by backends sharing it
+        self.lock = entry.lock
+        self._entry = entry
+        self._registry = registry
+        self._released = False
+
+    def context(self, key: Any, create: Callable[[], Any]) -> Any:
+        """Return an extra context of the model, creating it on first use.
+
+        Extra contexts belong to the loaded model, so every handle to it gets
+        the same context for a key. Call with the handle's lock held.
+
+        Args:
+            key: Identifies the kind and size of context
+            create: Called without arguments to create the context
+
+        Returns:
+            The context
+        """
+        contexts = self._entry.contexts
+        if key not in contexts:
+            contexts[key] = create()
+        return contexts[key]
+
+    def release(self) -> None:
+        """Give up this reference to the model."""
+        if not self._released:
+            self._released = True
+            self._registry._release(self.key)
+
+    def __enter__(self) -> "ModelHandle":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.release()
+
+
+class ModelRegistry:
+    """Loads each model once and shares it between backends."""
+
+    def __init__(
+        self,
+        ttl: Optional[float] = DEFAULT_TTL,
+        loader: Optional[Callable[..., Any]] = None,
+    ) -> None:
+        """Initialize the registry.
+
+        Args:
+            ttl: Seconds a model stays loaded after its last handle is
+                released (0 to unload at once, None to keep models until
+                unload_idle is called)
+            loader: Called as loader(model_path=..., **params) to load a
+                model (default: llama_cpp.Llama)
+
+        Raises:
+            ValueError: If ttl is negative
+        """
+        if ttl is not None and ttl < 0:
+            raise ValueError("ttl must not be negative")
+        self.ttl = ttl
+        self.loader = loader or _load_llama
+        self.loads = 0
+        self._entries: Dict[ModelKey, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, model_path: str, **params: Any) -> ModelHandle:
+        """Return a handle to a model, loading it if needed.
+
+        Models are loaded while the registry is locked, so concurrent
+        requests for the same model load it only once.
+
+        Args:
+            model_path: Path to the model file
+            **params: Load parameters passed to the loader (n_ctx, n_batch,
+                use_mmap, use_mlock, ...). Models are shared only between
+                requests with equal parameters.
+
+        Returns:
+            Handle to the loaded model
+        """
+        key = model_key(model_path, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                logger.info("Loading shared model %s", model_path)
+                entry = _Entry(self.loader(model_path=model_path, **params))
+                self._entries[key] = entry
+                self.loads += 1
+            else:
+                logger.debug("Reusing shared model %s", model_path)
+            entry.refs += 1
+            entry.idle_since = None
+            if entry.timer is not None:
+                entry.timer.cancel()
+                entry.timer = None
+            return ModelHandle(self, key, entry)
+
+    def unload_idle(self, min_idle: float = 0.0) -> int:
+        """Unload models without handles.
+
+        Args:
+            min_idle: Only unload models unused for at least this many seconds
+
+        Returns:
+            Number of models unloaded
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                key
+                for key, entry in self._entries.items()
+                if entry.idle_since is not None and now - entry.idle_since >= min_idle
+            ]
+            for key in idle:
+                self._unload(key)
+        return len(idle)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Return the loaded models.
+
+        Returns:
+            Path, load parameters, number of handles and idle seconds (None
+            while in use) of each loaded model
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "model_path": path,
+                    "params": dict(params),
+                    "refs": entry.refs,
+                    "idle": None
+                    if entry.idle_since is None
+                    else now - entry.idle_since,
+                }
+                for (path, params), entry in self._entries.items()
+            ]
+
+    def __len__(self) -> int:
+        """Return the number of loaded models."""
+        with self._lock:
+            return len(self._entries)
+
+    def _release(self, key: ModelKey) -> None:
+        """Drop one reference, scheduling the unload of an unused model."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            entry.idle_since = time.monotonic()
+            if self.ttl == 0:
+                self._unload(key)
+            elif self.ttl is not None:
+                entry.timer = threading.Timer(self.ttl, self._expire, (key, entry))
+                entry.timer.daemon = True
+                entry.timer.start()
+
+    def _expire(self, key: ModelKey, entry: _Entry) -> None:
+        """Unload a model whose TTL ran out, unless it was acquired again."""
+        with self._lock:
+            if self._entries.get(key) is entry and entry.refs == 0:
+                self._unload(key)
+
+    def _unload(self, key: ModelKey) -> None:
+        """Remove a model and free it. Called with the registry locked."""
+        entry = self._entries.pop(key)
+        if entry.timer is not None:
+            entry.timer.cancel()
+        logger.info("Unloading idle model %s", key[0])
+        # Contexts use the model, so they are freed first
+        for obj in [*entry.contexts.values(), entry.model]:
+            close = getattr(obj, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning("Error closing model %s: %s", key[0], e)
+        entry.contexts.clear()
+
+
+_default_registry: Optional[ModelRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """Return the process-wide model registry.
+
+    Returns:
+        Registry created on first use, with the default TTL
+    """
+    global _default_registry  # noqa: PLW0603
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = ModelRegistry()
+        return _default_registry
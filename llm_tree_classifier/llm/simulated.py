@@ -0,0 +1,159 @@
+"""Deterministic simulated backend for tests and benchmarks."""
+
+import hashlib
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from llm_tree_classifier import instrumentation
+from llm_tree_classifier.llm.base import LLMBackend
+
+
+class SimulatedLLMBackend(LLMBackend):
+    """Backend that answers from a seeded hash instead of a model.
+
+    The answer to a prompt depends only on the seed, the prompt and the
+    options, so it is the same across runs, threads, processes and call
+    paths (single, batch, async, parallel). Latency is simulated with sleeps:
+    a fixed cost per backend call plus a cost per prompt token, where a
+    token is approximated by a whitespace-separated word. A batch pays the
+    per-call latency once, like a real batched forward pass. Pass
+    functools.partial(SimulatedLLMBackend, ...) as ParallelTreeClassifier's
+    backend_factory to use it in worker processes.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        token_latency: float = 0.0,
+        answer_weights: Optional[Sequence[float]] = None,
+        seed: int = 0,
+    ) -> None:
+        """Initialize the simulated backend.
+
+        Args:
+            latency: Seconds slept per get_response or get_responses_batch call
+            token_latency: Seconds slept per prompt token
+            answer_weights: Relative probability of each option by position.
+                Nodes with more options than weights reuse the last weight.
+                Defaults to uniform.
+            seed: Seed for the answer hash
+        """
+        if answer_weights is not None and (
+            not answer_weights
+            or any(w < 0 for w in answer_weights)
+            or not any(answer_weights)
+        ):
+            raise ValueError("answer_weights must be non-negative and not all zero")
+
+        self.latency = latency
+        self.token_latency = token_latency
+        self.answer_weights = list(answer_weights) if answer_weights else None
+        self.seed = seed
+        self.calls = 0
+        self.prompts = 0
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        """Identity of the simulated model."""
+        return f"simulated:{self.seed}:{self.answer_weights}"
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        """Pick a response deterministically.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            The selected response from valid_responses
+        """
+        return self.get_responses_batch([prompt], [valid_responses])[0]
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        """Pick responses for several prompts in one simulated call.
+
+        Args:
+            prompts: The prompts to send to the LLM
+            valid_responses_list: Valid response options for each prompt
+
+        Returns:
+            The selected response for each prompt
+        """
+        tokens = sum(len(prompt.split()) for prompt in prompts)
+        with self._lock:
+            self.calls += 1
+            self.prompts += len(prompts)
+            self.tokens += tokens
+        hooks = instrumentation.hooks
+        if hooks is not None:
+            hooks.tokens(tokens, 0)
+        delay = self.latency + self.token_latency * tokens
+        if delay > 0:
+            time.sleep(delay)
+        return [
+            self._choose(prompt, valid_responses)
+            for prompt, valid_responses in zip(
+                prompts, valid_responses_list, strict=True
+            )
+        ]
+
+    def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        """Score responses consistently with get_response.
+
+        Half of the probability mass goes to the response get_response
+        picks, the other half is spread over all options by answer_weights.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            valid_responses: List of valid response options
+
+        Returns:
+            Mapping of each valid response to its log-probability
+        """
+        weights = self._weights(len(valid_responses))
+        total = sum(weights)
+        chosen = self._choose(prompt, valid_responses)
+        scores = {}
+        for response, weight in zip(valid_responses, weights, strict=True):
+            probability = 0.5 * weight / total + (0.5 if response == chosen else 0.0)
+            scores[response] = math.log(probability) if probability else float("-inf")
+        return scores
+
+    def reset_stats(self) -> None:
+        """Reset the call, prompt and token counters."""
+        with self._lock:
+            self.calls = 0
+            self.prompts = 0
+            self.tokens = 0
+
+    def _weights(self, n: int) -> List[float]:
+        """Return option weights for a node with n options."""
+        if self.answer_weights is None:
+            return [1.0] * n
+        weights = self.answer_weights[:n]
+        return weights + [weights[-1]] * (n - len(weights))
+
+    def _choose(self, prompt: str, valid_responses: List[str]) -> str:
+        """Pick a response from the prompt hash and the option weights."""
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(str(self.seed).encode("utf-8"))
+        for part in (prompt, *valid_responses):
+            digest.update(b"\0")
+            digest.update(part.encode("utf-8"))
+        point = int.from_bytes(digest.digest(), "big") / 2**64
+
+        weights = self._weights(len(valid_responses))
+        threshold = point * sum(weights)
+        for response, weight in zip(valid_responses, weights, strict=True):
+            threshold -= weight
+            if threshold < 0:
+                return response
+        return valid_responses[-1]
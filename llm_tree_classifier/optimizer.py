@@ -0,0 +1,199 @@
+"""Static optimization of decision trees.
+
+The pass works on DecisionNode graphs before they are compiled:
+
+* Identical subtrees (same labels, or same question and rules with the same
+  options leading to identical subtrees) are merged, turning the tree into a DAG.
+* Decision nodes whose options all lead to the same subtree are folded into
+  that subtree. The answer to such a node cannot change the label, so asking
+  the LLM is wasted work. Responses that match no option fall back to the
+  first option, so folding preserves that behavior too.
+
+Folding runs bottom-up, so a chain of nodes that only becomes foldable after
+its children were merged is folded as well.
+"""
+
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Set, Tuple
+
+if TYPE_CHECKING:
+    from llm_tree_classifier.tree import DecisionNode
+
+
+class PathReport(NamedTuple):
+    """LLM calls along one root-to-leaf path of the original tree."""
+
+    answers: Tuple[str, ...]
+    label: str
+    calls_before: int
+    calls_after: int
+
+    @property
+    def calls_saved(self) -> int:
+        """Number of LLM calls the optimized tree skips on this path."""
+        return self.calls_before - self.calls_after
+
+
+class OptimizationReport:
+    """Summary of what the optimizer removed."""
+
+    def __init__(
+        self,
+        nodes_before: int,
+        nodes_after: int,
+        folded_nodes: int,
+        paths: List[PathReport],
+    ) -> None:
+        """Initialize the report.
+
+        Args:
+            nodes_before: Distinct nodes in the original tree
+            nodes_after: Distinct nodes in the optimized DAG
+            folded_nodes: Decision nodes removed because their answer could
+                not change the label
+            paths: Per-path call counts, in depth-first order
+        """
+        self.nodes_before = nodes_before
+        self.nodes_after = nodes_after
+        self.folded_nodes = folded_nodes
+        self.paths = paths
+
+    @property
+    def max_calls_saved(self) -> int:
+        """Largest number of calls saved on any path."""
+        return max((path.calls_saved for path in self.paths), default=0)
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the report as a JSON-serializable dictionary.
+
+        Returns:
+            Node counts and calls saved per path
+        """
+        return {
+            "nodes_before": self.nodes_before,
+            "nodes_after": self.nodes_after,
+            "folded_nodes": self.folded_nodes,
+            "max_calls_saved": self.max_calls_saved,
+            "paths": [
+                {
+                    "answers": list(path.answers),
+                    "label": path.label,
+                    "calls_before": path.calls_before,
+                    "calls_after": path.calls_after,
+                    "calls_saved": path.calls_saved,
+                }
+                for path in self.paths
+            ],
+        }
+
+
+def optimize_tree(
+    root: "DecisionNode",
+) -> Tuple["DecisionNode", OptimizationReport]:
+    """Fold undecidable nodes and merge identical subtrees.
+
+    The input nodes are not modified. Nodes of the result may be shared by
+    several parents.
+
+    Args:
+        root: Root of the tree to optimize
+
+    Returns:
+        Tuple of (root of the optimized DAG, report)
+    """
+    node_class = type(root)
+    # Structural key -> canonical node
+    canonical: Dict[Tuple[Any, ...], DecisionNode] = {}
+    # id(original node) -> canonical node
+    optimized: Dict[int, DecisionNode] = {}
+    folded: Set[int] = set()
+
+    def visit(node: "DecisionNode") -> "DecisionNode":
+        if id(node) in optimized:
+            return optimized[id(node)]
+
+        if node.is_leaf():
+            key: Tuple[Any, ...] = ("label", node.label)
+            result = canonical.setdefault(key, node)
+        else:
+            children = [visit(option["next"]) for option in node.options]
+            if all(child is children[0] for child in children):
+                folded.add(id(node))
+                result = children[0]
+            else:
+                # Children are canonical, so identity means structural equality
+                key = (
+                    "node",
+                    node.question,
+                    node.rule_set.key if node.rule_set is not None else (),
+                    tuple(
+                        (option["value"], id(child))
+                        for option, child in zip(node.options, children, strict=True)
+                    ),
+                )
+                if key in canonical:
+                    result = canonical[key]
+                else:
+                    unchanged = all(
+                        option["next"] is child
+                        for option, child in zip(node.options, children, strict=True)
+                    )
+                    result = (
+                        node
+                        if unchanged
+                        else node_class(
+                            question=node.question,
+                            options=[
+                                {**option, "next": child}
+                                for option, child in zip(
+                                    node.options, children, strict=True
+                                )
+                            ],
+                            rules=node.rules,
+                        )
+                    )
+                    canonical[key] = result
+
+        optimized[id(node)] = result
+        return result
+
+    new_root = visit(root)
+
+    paths: List[PathReport] = []
+
+    def walk(
+        node: "DecisionNode", answers: Tuple[str, ...], before: int, after: int
+    ) -> None:
+        if node.label is not None:
+            paths.append(PathReport(answers, node.label, before, after))
+            return
+        asked = 0 if id(node) in folded else 1
+        for option in node.options:
+            walk(
+                option["next"],
+                (*answers, option["value"]),
+                before + 1,
+                after + asked,
+            )
+
+    walk(root, (), 0, 0)
+
+    report = OptimizationReport(
+        nodes_before=_count_nodes(root),
+        nodes_after=_count_nodes(new_root),
+        folded_nodes=len(folded),
+        paths=paths,
+    )
+    return new_root, report
+
+
+def _count_nodes(root: "DecisionNode") -> int:
+    """Count distinct nodes reachable from root."""
+    seen: Set[int] = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        stack.extend(option["next"] for option in node.options)
+    return len(seen)
@@ -0,0 +1,234 @@
+"""Multi-process classification."""
+
+import itertools
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.exceptions import LLMError
+from llm_tree_classifier.llm.base import LLMBackend
+
+if TYPE_CHECKING:
+    from llm_tree_classifier.dedup import Deduplicator
+
+logger = logging.getLogger(__name__)
+
+# Classifier of the current worker process, set by _init_worker
+_worker_classifier: Optional[TreeClassifier] = None
+
+
+def _init_worker(
+    config: Union[str, Path, Dict],
+    tree_name: Optional[str],
+    backend_factory: Optional[Callable[[], LLMBackend]],
+    backend_kwargs: Dict[str, Any],
+) -> None:
+    """Load the model and tree once per worker process."""
+    global _worker_classifier  # noqa: PLW0603
+    if backend_factory is not None:
+        llm = backend_factory()
+    else:
+        from llm_tree_classifier.llm.llama_cpp import LlamaCppBackend
+
+        llm = LlamaCppBackend(**backend_kwargs)
+    _worker_classifier = TreeClassifier(config, llm, tree_name=tree_name)
+
+
+def _classify_chunk(texts: List[str]) -> List[List[str]]:
+    """Classify one chunk of texts in a worker process."""
+    assert _worker_classifier is not None
+    return _worker_classifier.classify_batch(texts)
+
+
+class ParallelTreeClassifier:
+    """Classifier that spreads texts over several worker processes.
+
+    Each worker owns its own model context. LlamaCppBackend memory-maps the
+    GGUF file, so the weights are shared between workers through the page
+    cache and only the per-context KV cache is allocated per worker. Texts
+    are sent to workers in chunks and results come back in input order. If
+    a worker process dies, the pool is restarted and the unfinished chunks
+    are resubmitted.
+    """
+
+    def __init__(
+        self,
+        config: Union[str, Path, Dict],
+        model_path: Optional[Union[str, Path]] = None,
+        tree_name: Optional[str] = None,
+        n_workers: Optional[int] = None,
+        n_threads: Optional[int] = None,
+        chunk_size: int = 32,
+        backend_factory: Optional[Callable[[], LLMBackend]] = None,
+        backend_kwargs: Optional[Dict[str, Any]] = None,
+        max_restarts: int = 3,
+        dedup: Optional["Deduplicator"] = None,
+    ) -> None:
+        """Initialize the classifier and start the workers.
+
+        Args:
+            config: Path to YAML file or dictionary containing tree configuration
+            model_path: Path to the LLaMA model file (unless backend_factory
+                is given)
+            tree_name: Name of the tree to use (required if config contains
+                multiple trees)
+            n_workers: Number of worker processes (default: one per 4 CPUs)
+            n_threads: Threads per worker (default: CPUs divided among workers)
+            chunk_size: Number of texts sent to a worker at once
+            backend_factory: Picklable callable creating each worker's backend,
+                used instead of LlamaCppBackend
+            backend_kwargs: Extra LlamaCppBackend arguments
+            max_restarts: How often a crashed pool is restarted before giving up
+            dedup: Deduplicator applied in this process, so that only one
+                text per group of duplicates is sent to the workers
+
+        Raises:
+            LLMError: If neither model_path nor backend_factory is given
+        """
+        if model_path is None and backend_factory is None:
+            raise LLMError("Either model_path or backend_factory is required")
+
+        cpus = os.cpu_count() or 1
+        self.n_workers = n_workers or max(1, cpus // 4)
+        self.chunk_size = chunk_size
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.dedup = dedup
+
+        kwargs = dict(backend_kwargs or {})
+        if backend_factory is None:
+            kwargs["model_path"] = str(model_path)
+            kwargs.setdefault("n_threads", n_threads or max(1, cpus // self.n_workers))
+        self._initargs = (config, tree_name, backend_factory, kwargs)
+        self._executor = self._start()
+
+    def classify_batch(self, texts: List[str]) -> List[List[str]]:
+        """Classify texts across the workers.
+
+        Args:
+            texts: Texts to classify
+
+        Returns:
+            List of classification results for each text
+        """
+        if self.dedup is None:
+            return list(self._classify_many(texts))
+        # Deduplicate the whole batch, whatever the number of workers
+        plan = self.dedup.plan(texts)
+        return plan.resolve(list(self._classify_many(plan.texts)))
+
+    def classify_many(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        """Classify a stream of texts across the workers.
+
+        At most two chunks per worker are in flight, so arbitrarily long
+        iterables are processed in constant memory. With a Deduplicator, the
+        texts are deduplicated in windows of that many chunks.
+
+        Args:
+            texts: Texts to classify
+
+        Yields:
+            Classification results, in input order
+        """
+        if self.dedup is None:
+            yield from self._classify_many(texts)
+            return
+        iterator = iter(texts)
+        window = 2 * self.n_workers * self.chunk_size
+        while True:
+            batch = list(itertools.islice(iterator, window))
+            if not batch:
+                return
+            plan = self.dedup.plan(batch)
+            yield from plan.resolve(list(self._classify_many(plan.texts)))
+
+    def _classify_many(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        """Classify texts across the workers, without deduplication."""
+        pending: Deque[Tuple[List[str], Future]] = deque()
+        iterator = iter(texts)
+        while True:
+            chunk = list(itertools.islice(iterator, self.chunk_size))
+            if chunk:
+                pending.append((chunk, self._executor.submit(_classify_chunk, chunk)))
+            if pending and (not chunk or len(pending) >= 2 * self.n_workers):
+                yield from self._collect(pending)
+            if not chunk and not pending:
+                return
+
+    def close(self) -> None:
+        """Shut the worker processes down."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "ParallelTreeClassifier":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _start(self) -> ProcessPoolExecutor:
+        """Start a pool of workers.
+
+        Workers are spawned rather than forked, so no threads or native
+        state of the parent are inherited.
+
+        Returns:
+            The executor
+        """
+        logger.info("Starting %d classification workers", self.n_workers)
+        return ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=self._initargs,
+        )
+
+    def _collect(self, pending: Deque[Tuple[List[str], Future]]) -> List[List[str]]:
+        """Wait for the oldest chunk, restarting the pool if a worker died.
+
+        Args:
+            pending: Chunks in flight, oldest first
+
+        Returns:
+            Results of the oldest chunk
+
+        Raises:
+            LLMError: If the pool keeps crashing
+        """
+        while True:
+            try:
+                results: List[List[str]] = pending[0][1].result()
+                pending.popleft()
+                return results
+            except BrokenProcessPool as e:
+                if self.restarts >= self.max_restarts:
+                    raise LLMError(
+                        f"Worker pool crashed {self.restarts + 1} times, giving up"
+                    ) from e
+                self.restarts += 1
+                logger.warning(
+                    "Worker process died, restarting pool (%d/%d)",
+                    self.restarts,
+                    self.max_restarts,
+                )
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._start()
+                for i, (chunk, _future) in enumerate(pending):
+                    pending[i] = (chunk, self._executor.submit(_classify_chunk, chunk))
@@ -0,0 +1,143 @@
+"""Prompt layout shared by decision trees and LLM backends.
+
+Prompts are laid out document first and question last, so every node of one
+traversal shares the same leading text. Backends that can reuse evaluated
+prefixes (such as the llama.cpp KV cache) rely on this ordering.
+"""
+
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+DOCUMENT_HEADER = "Text: "
+QUESTION_SEPARATOR = "\n\nQuestion: "
+
+SYSTEM_PROMPT = (
+    "You are a decision maker. Read the text and answer the question "
+    "with one of the given options.\n\n"
+)
+
+
+def build_prompt(text: str, question: str) -> str:
+    """Build the prompt for a decision node.
+
+    Args:
+        text: The text being classified
+        question: The node question
+
+    Returns:
+        Prompt containing the text followed by the question
+    """
+    return render_document(text) + render_question(question)
+
+
+def render_document(text: str) -> str:
+    """Render the document part of a prompt.
+
+    Args:
+        text: The text being classified
+
+    Returns:
+        Leading prompt part shared by all nodes for this text
+    """
+    return f"{DOCUMENT_HEADER}{text}"
+
+
+def render_question(question: str) -> str:
+    """Render the node-specific part of a prompt.
+
+    Args:
+        question: The node question
+
+    Returns:
+        Trailing prompt part that follows the document
+    """
+    return f"{QUESTION_SEPARATOR}{question}"
+
+
+def split_prompt(prompt: str) -> Tuple[str, str]:
+    """Split a prompt into its shared document part and node question.
+
+    The document part keeps the trailing blank line so that it can be
+    evaluated on its own and extended with the question later.
+
+    Args:
+        prompt: Prompt created by build_prompt (or any free-form prompt)
+
+    Returns:
+        Tuple of (document part, question). For prompts without a document
+        part the first element is empty.
+    """
+    head, sep, question = prompt.rpartition(QUESTION_SEPARATOR)
+    if not sep:
+        return "", prompt
+    return head + "\n\n", question
+
+
+def render_backend_prompt(prompt: str, valid_responses: List[str]) -> Tuple[str, str]:
+    """Render the full model prompt as a shared prefix and a node suffix.
+
+    Args:
+        prompt: The prompt sent to the backend
+        valid_responses: List of valid response options
+
+    Returns:
+        Tuple of (system prompt and document, question and options)
+    """
+    document, question = split_prompt(prompt)
+    return SYSTEM_PROMPT + document, render_node_suffix(
+        question, tuple(valid_responses)
+    )
+
+
+@lru_cache(maxsize=4096)
+def render_node_suffix(question: str, valid_responses: Tuple[str, ...]) -> str:
+    """Render the question and options of a node, memoized per node.
+
+    Args:
+        question: The node question
+        valid_responses: Valid response options
+
+    Returns:
+        Trailing model prompt part, ending where the answer starts
+    """
+    return f"Question: {question}\nOptions: {', '.join(valid_responses)}\nAnswer:"
+
+
+def build_grammar(valid_responses: List[str]) -> str:
+    """Create a GBNF grammar that only accepts the valid responses.
+
+    Args:
+        valid_responses: List of valid response options
+
+    Returns:
+        Grammar string in GBNF format
+    """
+    return _grammar_text(tuple(valid_responses))
+
+
+@lru_cache(maxsize=1024)
+def _grammar_text(valid_responses: Tuple[str, ...]) -> str:
+    """Build the GBNF grammar for an option set (memoized)."""
+    alternatives = " | ".join(
+        '"' + response.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        for response in valid_responses
+    )
+    return f"root ::= response\nresponse ::= {alternatives}\n"
+
+
+def match_response(answer: str, valid_responses: List[str]) -> Optional[str]:
+    """Map generated text back to one of the valid responses.
+
+    Args:
+        answer: Text generated by the model
+        valid_responses: List of valid response options
+
+    Returns:
+        The first valid response contained in (or containing) the answer,
+        or None if there is none
+    """
+    answer = answer.strip().lower()
+    for valid in valid_responses:
+        if valid.lower() in answer or answer in valid.lower():
+            return valid
+    return None
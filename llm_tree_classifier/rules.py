@@ -0,0 +1,179 @@
+"""Cheap pre-decision rules for decision nodes.
+
+A decision node may list rules that pick one of its options without asking
+the LLM. Rules are checked in order and the first one that fires wins:
+
+    rules:
+      - keywords: ["refund", "money back"]   # whole words, case-insensitive
+        option: "yes"
+      - regex: "order #\\d+"                  # case-sensitive by default
+        option: "yes"
+      - max_length: 20                         # len(text) <= 20
+        option: "no"
+
+A rule may also set "ignore_case", and a length rule may combine
+"min_length" and "max_length". The keyword and regex rules of a node are
+compiled into a single pattern of zero-width alternatives, so the text is
+scanned once however many rules there are. Regexes with capturing groups
+(whose backreferences would be renumbered) or inline global flags such as
+"(?x)" cannot be embedded in it and are searched on their own.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+# Prefix of the named groups that identify rules in the combined pattern
+_GROUP_PREFIX = "_rule"
+
+# Flags of a pattern without inline global flags
+_DEFAULT_FLAGS = re.compile("").flags
+
+
+def _rule_pattern(rule: Dict[str, Any]) -> Tuple[str, Optional[Pattern[str]]]:
+    """Return the regular expression of a keyword or regex rule.
+
+    Args:
+        rule: Rule configuration
+
+    Returns:
+        Tuple of (pattern text, compiled pattern if the rule cannot be
+        embedded in the combined pattern of its node, else None)
+
+    Raises:
+        ValueError: If the rule is malformed
+    """
+    if "keywords" in rule:
+        keywords = rule["keywords"]
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        if not keywords or not all(isinstance(k, str) and k for k in keywords):
+            raise ValueError("Rule 'keywords' must be a non-empty list of strings")
+        # Longest first, so a keyword is not cut short by one of its prefixes
+        alternatives = "|".join(
+            re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True)
+        )
+        body = rf"(?<!\w)(?:{alternatives})(?!\w)"
+        ignore_case = rule.get("ignore_case", True)
+        separate = False
+    else:
+        body = rule["regex"]
+        if not isinstance(body, str):
+            raise ValueError(f"Rule 'regex' must be a string, got {body!r}")
+        try:
+            compiled = re.compile(body)
+        except re.error as e:
+            raise ValueError(f"Invalid rule regex {body!r}: {e}") from e
+        ignore_case = rule.get("ignore_case", False)
+        separate = bool(compiled.groups) or compiled.flags != _DEFAULT_FLAGS
+    if separate:
+        return body, re.compile(body, re.IGNORECASE if ignore_case else 0)
+    return (f"(?i:{body})" if ignore_case else f"(?:{body})"), None
+
+
+class RuleSet:
+    """Compiled rules of one decision node."""
+
+    __slots__ = (
+        "_first_pattern",
+        "_groups",
+        "_lengths",
+        "_pattern",
+        "_separate",
+        "key",
+        "responses",
+    )
+
+    def __init__(self, rules: List[Dict[str, Any]], valid_responses: List[str]) -> None:
+        """Compile rules.
+
+        Args:
+            rules: Rule configurations, in priority order. Each has an
+                'option' and exactly one of 'keywords', 'regex' or
+                'min_length'/'max_length'.
+            valid_responses: Option values of the node
+
+        Raises:
+            ValueError: If a rule is malformed or names an unknown option
+        """
+        self.responses: Tuple[str, ...] = ()
+        # Hashable description of the rules, for merging identical nodes
+        self.key: Tuple[Tuple[Any, ...], ...] = ()
+        self._groups: Dict[str, int] = {}
+        self._lengths: List[Tuple[int, int, float]] = []
+        self._separate: List[Tuple[int, Pattern[str]]] = []
+        patterns: List[str] = []
+
+        for index, rule in enumerate(rules):
+            if not isinstance(rule, dict):
+                raise ValueError(f"Rule must be a mapping, got {rule!r}")
+            if rule.get("option") not in valid_responses:
+                raise ValueError(
+                    f"Rule option {rule.get('option')!r} is not one of "
+                    f"{valid_responses}"
+                )
+            kinds: List[str] = [k for k in ("keywords", "regex") if k in rule]
+            if "min_length" in rule or "max_length" in rule:
+                kinds.append("length")
+            if len(kinds) != 1:
+                raise ValueError(
+                    "Rule needs exactly one of 'keywords', 'regex' or "
+                    f"'min_length'/'max_length', got {rule!r}"
+                )
+
+            if kinds[0] == "length":
+                low = rule.get("min_length", 0)
+                high = rule.get("max_length", float("inf"))
+                self._lengths.append((index, low, high))
+                self.key += ((rule["option"], "length", low, high),)
+            else:
+                pattern, compiled = _rule_pattern(rule)
+                if compiled is not None:
+                    self._separate.append((index, compiled))
+                else:
+                    group = f"{_GROUP_PREFIX}{index}"
+                    self._groups[group] = index
+                    patterns.append(f"(?P<{group}>{pattern})")
+                flags = None if compiled is None else compiled.flags
+                self.key += ((rule["option"], "pattern", pattern, flags),)
+            self.responses += (rule["option"],)
+
+        # A lookahead matches at every position without consuming text, so
+        # at each position the first (highest priority) firing rule is seen
+        self._pattern: Optional[Pattern[str]] = (
+            re.compile("(?=" + "|".join(patterns) + ")") if patterns else None
+        )
+        self._first_pattern = min(self._groups.values(), default=len(rules))
+
+    def __len__(self) -> int:
+        """Return the number of rules."""
+        return len(self.responses)
+
+    def match(self, text: str) -> Optional[str]:
+        """Return the option picked by the first rule that fires.
+
+        Args:
+            text: The text being classified
+
+        Returns:
+            Option value, or None if no rule fires
+        """
+        best = len(self.responses)
+        length = len(text)
+        for index, low, high in self._lengths:
+            if low <= length <= high:
+                best = index
+                break
+        for index, pattern in self._separate:
+            if index >= best:
+                break
+            if pattern.search(text):
+                best = index
+                break
+        if self._pattern is not None and self._first_pattern < best:
+            for match in self._pattern.finditer(text):
+                index = self._groups[match.lastgroup]  # type: ignore[index]
+                if index < best:
+                    best = index
+                    if index == self._first_pattern:
+                        break
+        return self.responses[best] if best < len(self.responses) else None
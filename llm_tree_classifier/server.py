@@ -0,0 +1,317 @@
+"""HTTP classification server."""
+
+import argparse
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from llm_tree_classifier import instrumentation
+from llm_tree_classifier.classifier import TreeClassifier, load_trees
+from llm_tree_classifier.exceptions import (
+    LLMError,
+    LLMTreeClassifierError,
+    TreeNotFoundError,
+)
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.llm.batching import MicroBatchingBackend
+
+logger = logging.getLogger(__name__)
+
+
+class ClassificationServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding warm classifiers for every tree.
+
+    Endpoints:
+        GET /health: {"status": "ok", "trees": [...]}
+        GET /metrics, GET /metrics.json: Prometheus text or JSON export of
+            the installed MetricsRecorder (404 when metrics are disabled)
+        POST /classify: {"text": "...", "tree": "..."} or
+            {"texts": [...], "tree": "..."}; "tree" may be omitted when the
+            configuration holds a single tree.
+
+    Each request runs on its own thread. Wrap the backend in a
+    MicroBatchingBackend so prompts of concurrent requests are merged into
+    batches.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        classifiers: Dict[str, TreeClassifier],
+    ) -> None:
+        """Initialize the server.
+
+        Args:
+            address: (host, port) to listen on; port 0 picks a free port
+            classifiers: Classifier per tree name
+        """
+        super().__init__(address, _ClassifyHandler)
+        self.classifiers = classifiers
+
+    @classmethod
+    def from_config(
+        cls,
+        address: Tuple[str, int],
+        config: Any,
+        llm: LLMBackend,
+    ) -> "ClassificationServer":
+        """Create a server with a classifier for every tree in a configuration.
+
+        Args:
+            address: (host, port) to listen on
+            config: Path to YAML file or dictionary containing tree configuration
+            llm: Backend shared by all classifiers
+
+        Returns:
+            The server (not yet serving)
+        """
+        if isinstance(config, (str, Path)):
+            with open(config) as f:
+                config = yaml.safe_load(f)
+        classifiers = {
+            name: TreeClassifier(config, llm, tree_name=name)
+            for name in load_trees(config)
+        }
+        return cls(address, classifiers)
+
+    def classify(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one classify request.
+
+        Args:
+            request: Decoded request body
+
+        Returns:
+            Response body
+
+        Raises:
+            ValueError: If the request is malformed
+            TreeNotFoundError: If the requested tree does not exist
+        """
+        tree_name = request.get("tree")
+        if tree_name is None:
+            if len(self.classifiers) != 1:
+                raise ValueError(
+                    "Field 'tree' is required. "
+                    f"Available trees: {list(self.classifiers)}"
+                )
+            tree_name = next(iter(self.classifiers))
+        if tree_name not in self.classifiers:
+            raise TreeNotFoundError(
+                f"Tree {tree_name!r} not found. "
+                f"Available trees: {list(self.classifiers)}"
+            )
+        classifier = self.classifiers[tree_name]
+
+        if isinstance(request.get("text"), str):
+            return {
+                "tree": tree_name,
+                "classifications": classifier.classify(request["text"]),
+            }
+        texts = request.get("texts")
+        if isinstance(texts, list) and all(isinstance(t, str) for t in texts):
+            return {"tree": tree_name, "results": classifier.classify_batch(texts)}
+        raise ValueError("Request needs a string 'text' or a list of strings 'texts'")
+
+
+class _ClassifyHandler(BaseHTTPRequestHandler):
+    """Request handler for ClassificationServer."""
+
+    server: ClassificationServer
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        """Serve the health check and metrics."""
+        if self.path == "/health":
+            self._send(200, {"status": "ok", "trees": list(self.server.classifiers)})
+            return
+        if self.path in ("/metrics", "/metrics.json"):
+            recorder = instrumentation.hooks
+            if not isinstance(recorder, instrumentation.MetricsRecorder):
+                self._send(404, {"error": "Metrics are disabled"})
+            elif self.path == "/metrics.json":
+                self._send(200, recorder.snapshot())
+            else:
+                self._send_text(
+                    200, recorder.to_prometheus(), "text/plain; version=0.0.4"
+                )
+            return
+        self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self) -> None:
+        """Serve classify requests."""
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.path != "/classify":
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        try:
+            request = json.loads(body)
+            if not isinstance(request, dict):
+                raise ValueError("Request body must be a JSON object")
+            self._send(200, self.server.classify(request))
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send(400, {"error": str(e)})
+        except TreeNotFoundError as e:
+            self._send(404, {"error": str(e)})
+        except LLMTreeClassifierError as e:
+            logger.error("Error classifying request: %s", e)
+            self._send(500, {"error": str(e)})
+        except Exception:
+            logger.exception("Unexpected error classifying request")
+            self._send(500, {"error": "Internal server error"})
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Route access logs through the module logger."""
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        """Send a JSON response.
+
+        Args:
+            status: HTTP status code
+            body: Response body
+        """
+        self._send_text(status, json.dumps(body), "application/json")
+
+    def _send_text(self, status: int, text: str, content_type: str) -> None:
+        """Send a text response.
+
+        Args:
+            status: HTTP status code
+            text: Response body
+            content_type: Content-Type header value
+        """
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments of the serve command.
+
+    Args:
+        argv: Arguments after 'serve' (defaults to sys.argv)
+
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m llm_tree_classifier serve",
+        description="Serve LLM decision tree classification over HTTP.",
+    )
+    parser.add_argument(
+        "--config", type=Path, required=True, help="Path to YAML configuration file"
+    )
+    parser.add_argument(
+        "--model", type=Path, required=True, help="Path to LLaMA model file"
+    )
+    parser.add_argument(
+        "--n-ctx",
+        type=int,
+        default=2048,
+        help="Context window of the model in tokens (default: 2048)",
+    )
+    parser.add_argument(
+        "--no-mmap",
+        action="store_true",
+        help="Read the model into memory instead of memory-mapping it",
+    )
+    parser.add_argument(
+        "--mlock",
+        action="store_true",
+        help="Lock the model weights in RAM so they are never paged out",
+    )
+    parser.add_argument(
+        "--scoring",
+        choices=["grammar", "logprob"],
+        default="logprob",
+        help=(
+            "How answers are chosen: 'logprob' decodes each micro-batch as "
+            "one multi-sequence batch, 'grammar' samples every prompt on its "
+            "own (default: logprob)"
+        ),
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=32,
+        help="Maximum number of prompts merged into one batch (default: 32)",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=5.0,
+        help="Maximum time a prompt waits for a batch to fill (default: 5)",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Record per-node metrics and serve them on /metrics",
+    )
+    parser.add_argument(
+        "--verbose", "-v", action="store_true", help="Enable verbose logging"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the classification server until interrupted.
+
+    Args:
+        argv: Arguments after 'serve'
+
+    Returns:
+        Exit code (0 for success, non-zero for error)
+    """
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    if args.metrics:
+        instrumentation.enable()
+
+    try:
+        from llm_tree_classifier.llm.llama_cpp import LlamaCppBackend
+
+        llm = MicroBatchingBackend(
+            LlamaCppBackend(
+                model_path=str(args.model),
+                n_ctx=args.n_ctx,
+                use_mmap=not args.no_mmap,
+                use_mlock=args.mlock,
+                scoring=args.scoring,
+            ),
+            max_batch_size=args.max_batch_size,
+            max_wait=args.max_wait_ms / 1000,
+        )
+        server = ClassificationServer.from_config(
+            (args.host, args.port), args.config, llm
+        )
+    except (LLMError, LLMTreeClassifierError) as e:
+        logger.error("Failed to start server: %s", e)
+        return 1
+
+    host, port = server.server_address[:2]
+    logger.info("Serving trees %s on %s:%d", list(server.classifiers), host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        llm.close()
+    return 0
@@ -0,0 +1,139 @@
+"""Streaming JSONL classification."""
+
+import itertools
+import json
+import logging
+from typing import IO, Any, Dict, Iterator, List
+
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.exceptions import LLMError
+
+logger = logging.getLogger(__name__)
+
+
+def iter_jsonl(stream: IO[str]) -> Iterator[Dict[str, Any]]:
+    """Lazily read JSON records from a stream, one per line.
+
+    Blank lines are skipped. Lines that are not JSON objects are yielded as
+    records with an "error" key so their position in the output is kept.
+
+    Args:
+        stream: Text stream with one JSON object per line
+
+    Yields:
+        Parsed records
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"error": f"Invalid JSON on line {line_number}: {e}"}
+            continue
+        if not isinstance(record, dict):
+            yield {"error": f"Line {line_number} is not a JSON object"}
+            continue
+        yield record
+
+
+def classify_records(
+    classifier: TreeClassifier,
+    records: Iterator[Dict[str, Any]],
+    text_field: str = "text",
+    batch_size: int = 32,
+) -> Iterator[Dict[str, Any]]:
+    """Classify a stream of records in batches.
+
+    Only one batch of records is held in memory at a time. Each record is
+    yielded with a "classifications" key added, or an "error" key if it has
+    no text or the backend fails on it (for example a text too long for the
+    context window). A batch the backend fails on is classified again one
+    record at a time, so one bad record does not fail its neighbors.
+
+    Args:
+        classifier: Classifier to use
+        records: Records to classify
+        text_field: Name of the field holding the text
+        batch_size: Number of records classified together
+
+    Yields:
+        Classified records, in input order
+    """
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+
+        valid: List[int] = []
+        for i, record in enumerate(batch):
+            if "error" in record:
+                continue
+            if not isinstance(record.get(text_field), str):
+                record["error"] = f"Missing text field '{text_field}'"
+                continue
+            valid.append(i)
+
+        if valid:
+            try:
+                results = classifier.classify_batch(
+                    [batch[i][text_field] for i in valid]
+                )
+            except LLMError as e:
+                if len(valid) == 1:
+                    batch[valid[0]]["error"] = str(e)
+                else:
+                    logger.warning(
+                        "Batch failed, classifying records one by one: %s", e
+                    )
+                    for i in valid:
+                        _classify_one(classifier, batch[i], text_field)
+            else:
+                for i, classifications in zip(valid, results, strict=True):
+                    batch[i]["classifications"] = classifications
+
+        yield from batch
+
+
+def _classify_one(
+    classifier: TreeClassifier, record: Dict[str, Any], text_field: str
+) -> None:
+    """Classify one record, storing the backend's error in it on failure."""
+    try:
+        record["classifications"] = classifier.classify_batch([record[text_field]])[0]
+    except LLMError as e:
+        record["error"] = str(e)
+
+
+def classify_jsonl(
+    classifier: TreeClassifier,
+    input_stream: IO[str],
+    output_stream: IO[str],
+    text_field: str = "text",
+    batch_size: int = 32,
+    flush_every: int = 1000,
+) -> int:
+    """Classify JSONL records from one stream and write them to another.
+
+    Args:
+        classifier: Classifier to use
+        input_stream: Stream with one JSON object per line
+        output_stream: Stream the classified records are written to
+        text_field: Name of the field holding the text
+        batch_size: Number of records classified together
+        flush_every: Flush the output after this many records
+
+    Returns:
+        Number of records written
+    """
+    count = 0
+    for record in classify_records(
+        classifier, iter_jsonl(input_stream), text_field, batch_size
+    ):
+        output_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+        if count % flush_every == 0:
+            output_stream.flush()
+            logger.info("Classified %d records", count)
+    output_stream.flush()
+    return count
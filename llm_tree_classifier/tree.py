@@ -1,8 +1,17 @@
 """Decision tree implementation."""
 
-from typing import Any, Dict, List, Optional
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from llm_tree_classifier.llm import LLMBackend
+from llm_tree_classifier import instrumentation
+from llm_tree_classifier.documents import DocumentPolicy, tokenizer_for
+from llm_tree_classifier.llm.base import AsyncLLMBackend, LLMBackend
+from llm_tree_classifier.optimizer import OptimizationReport, optimize_tree
+from llm_tree_classifier.prompts import render_document, render_question
+from llm_tree_classifier.rules import RuleSet
+
+logger = logging.getLogger(__name__)
 
 
 class DecisionNode:
@@ -13,6 +22,7 @@ class DecisionNode:
         question: Optional[str] = None,
         label: Optional[str] = None,
         options: Optional[List[Dict[str, Any]]] = None,
+        rules: Optional[List[Dict[str, Any]]] = None,
     ) -> None:
         """Initialize a decision node.
 
@@ -20,6 +30,8 @@ class DecisionNode:
             question: The question to ask (None for leaf nodes)
             label: The classification label (None for decision nodes)
             options: List of option dictionaries with 'value' and 'next' keys
+            rules: Rules that pick an option without asking the LLM (see
+                llm_tree_classifier.rules)
         """
         if question is None and label is None:
             raise ValueError("Node must have either a question or a label")
@@ -27,10 +39,18 @@ class DecisionNode:
             raise ValueError("Node cannot have both a question and a label")
         if question is not None and not options:
             raise ValueError("Decision nodes must have options")
+        if rules and question is None:
+            raise ValueError("Leaf nodes cannot have rules")
 
         self.question = question
         self.label = label
         self.options = options or []
+        self.rules = rules or []
+        self.rule_set: Optional[RuleSet] = (
+            RuleSet(self.rules, [option["value"] for option in self.options])
+            if self.rules
+            else None
+        )
 
     def is_leaf(self) -> bool:
         """Check if this is a leaf node.
@@ -57,29 +77,492 @@ class DecisionNode:
         options = []
         for option in config["options"]:
             next_node = cls.from_dict(option["next"])
-            options.append({
-                "value": option["value"],
-                "next": next_node
-            })
+            options.append({"value": option["value"], "next": next_node})
 
         return cls(
             question=config["question"],
             options=options,
+            rules=config.get("rules"),
+        )
+
+
+class CompiledTree:
+    """Flat, array-backed execution plan for a decision tree.
+
+    Nodes get integer ids in depth-first order, with the root at 0. Per-node
+    data lives in parallel tuples indexed by node id: the pre-rendered
+    question part of the prompt, the list of valid responses handed to the
+    backend, a value -> child id dict, the fallback child and the node's
+    compiled rules (or None). Leaves only carry a label. A DecisionNode
+    reachable along several paths is compiled once and shares its id.
+
+    With a document policy, each text is fitted into the tree's token budget
+    before traversal. When that yields several chunks, every node asks one
+    prompt per chunk in a single batch and combines the answers.
+    """
+
+    __slots__ = (
+        "documents",
+        "fallback",
+        "labels",
+        "name",
+        "next_node",
+        "prompt_suffixes",
+        "questions",
+        "rules",
+        "valid_responses",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        root: DecisionNode,
+        documents: Optional[DocumentPolicy] = None,
+    ) -> None:
+        """Compile a decision tree.
+
+        Args:
+            name: The name of the tree
+            root: The root node of the tree
+            documents: How texts are fitted into a token budget (None to
+                send them unchanged)
+        """
+        nodes: List[DecisionNode] = []
+        ids: Dict[int, int] = {}
+
+        def assign(node: DecisionNode) -> int:
+            if id(node) in ids:
+                return ids[id(node)]
+            ids[id(node)] = len(nodes)
+            nodes.append(node)
+            for option in node.options:
+                assign(option["next"])
+            return ids[id(node)]
+
+        assign(root)
+
+        self.name = name
+        # Leaves have an empty question; decision nodes have no label
+        self.questions: Tuple[str, ...] = tuple(
+            "" if node.question is None else node.question for node in nodes
+        )
+        self.labels: Tuple[Optional[str], ...] = tuple(node.label for node in nodes)
+        self.prompt_suffixes: Tuple[str, ...] = tuple(
+            "" if node.question is None else render_question(node.question)
+            for node in nodes
+        )
+        self.valid_responses: Tuple[List[str], ...] = tuple(
+            [option["value"] for option in node.options] for node in nodes
+        )
+        # First option wins if several options share a value
+        self.next_node: Tuple[Dict[str, int], ...] = tuple(
+            {
+                option["value"]: ids[id(option["next"])]
+                for option in reversed(node.options)
+            }
+            for node in nodes
+        )
+        self.fallback: Tuple[int, ...] = tuple(
+            ids[id(node.options[0]["next"])] if node.options else -1 for node in nodes
+        )
+        self.rules: Tuple[Optional[RuleSet], ...] = tuple(
+            node.rule_set for node in nodes
+        )
+        self.documents = documents
+
+    def __len__(self) -> int:
+        """Return the number of compiled nodes."""
+        return len(self.labels)
+
+    def step(self, node: int, response: str) -> int:
+        """Return the child reached from a node for an LLM response.
+
+        Args:
+            node: Id of a decision node
+            response: Response returned by the backend
+
+        Returns:
+            Id of the child node (the first option's child if the response
+            matches no option)
+        """
+        return self.next_node[node].get(response, self.fallback[node])
+
+    def follow_rules(
+        self, text: str, node: int, hooks: Optional[instrumentation.Hooks] = None
+    ) -> int:
+        """Follow rule decisions from a node.
+
+        Args:
+            text: The text being classified
+            node: Id of the node to start at
+            hooks: Installed hooks, told about every rule decision
+
+        Returns:
+            Id of the first node reached whose rules do not fire: a leaf or
+            a decision node that needs the LLM
+        """
+        rules = self.rules
+        while rules[node] is not None:
+            response = rules[node].match(text)  # type: ignore[union-attr]
+            if response is None:
+                break
+            if hooks is not None:
+                hooks.rule_hit(self.name, node, self.questions[node], response)
+            node = self.next_node[node][response]
+        return node
+
+    def decisions(self) -> List[Tuple[str, List[str]]]:
+        """Return the question and options of every decision node.
+
+        Returns:
+            (question, valid responses) per decision node, in node id order
+        """
+        return [
+            (question, self.valid_responses[node])
+            for node, question in enumerate(self.questions)
+            if self.labels[node] is None
+        ]
+
+    def prepare(self, text: str, llm: Any) -> List[str]:
+        """Render the document part of the prompts for a text.
+
+        Args:
+            text: The text to classify
+            llm: The backend, whose tokenizer measures the token budget
+
+        Returns:
+            One rendered document, or one per chunk
+        """
+        if self.documents is None:
+            return [render_document(text)]
+        return [
+            render_document(part)
+            for part in self.documents.prepare(text, tokenizer_for(llm))
+        ]
+
+    def classify(self, text: str, llm: LLMBackend) -> str:
+        """Walk the tree for one text.
+
+        Args:
+            text: The text to classify
+            llm: The LLM backend to use for decisions
+
+        Returns:
+            Label of the leaf that was reached
+        """
+        hooks = instrumentation.hooks
+        documents = self.prepare(text, llm)
+        if hooks is not None:
+            return self._classify_instrumented(text, documents, llm, hooks)
+
+        labels = self.labels
+        rules = self.rules
+        node = 0
+        while True:
+            if rules[node] is not None:
+                node = self.follow_rules(text, node)
+            label = labels[node]
+            if label is not None:
+                return label
+            response = self._ask(llm, documents, node)
+            node = self.next_node[node].get(response, self.fallback[node])
+
+    def _classify_instrumented(
+        self,
+        text: str,
+        documents: List[str],
+        llm: LLMBackend,
+        hooks: instrumentation.Hooks,
+    ) -> str:
+        """Walk the tree for one text, reporting every node to hooks."""
+        labels = self.labels
+        node = 0
+        while True:
+            node = self.follow_rules(text, node, hooks)
+            label = labels[node]
+            if label is not None:
+                return label
+            hooks.node_enter(self.name, node)
+            start = time.perf_counter()
+            response = self._ask(llm, documents, node)
+            node = self._record(hooks, node, response, time.perf_counter() - start)
+
+    def _ask(self, llm: LLMBackend, documents: List[str], node: int) -> str:
+        """Ask a node's question, once per document chunk."""
+        suffix = self.prompt_suffixes[node]
+        valid_responses = self.valid_responses[node]
+        if len(documents) == 1:
+            return llm.get_response(documents[0] + suffix, valid_responses)
+        responses = llm.get_responses_batch(
+            [document + suffix for document in documents],
+            [valid_responses] * len(documents),
+        )
+        return self.documents.combine(  # type: ignore[union-attr]
+            responses, valid_responses
+        )
+
+    async def _aask(self, llm: AsyncLLMBackend, documents: List[str], node: int) -> str:
+        """Ask a node's question with an asyncio backend."""
+        suffix = self.prompt_suffixes[node]
+        valid_responses = self.valid_responses[node]
+        if len(documents) == 1:
+            return await llm.get_response(documents[0] + suffix, valid_responses)
+        responses = await llm.get_responses_batch(
+            [document + suffix for document in documents],
+            [valid_responses] * len(documents),
         )
+        return self.documents.combine(  # type: ignore[union-attr]
+            responses, valid_responses
+        )
+
+    def _record(
+        self, hooks: instrumentation.Hooks, node: int, response: str, seconds: float
+    ) -> int:
+        """Report an answered node to hooks and return the child reached."""
+        child = self.next_node[node].get(response)
+        hooks.node_exit(
+            self.name, node, self.questions[node], response, seconds, child is None
+        )
+        return self.fallback[node] if child is None else child
+
+    async def aclassify(self, text: str, llm: AsyncLLMBackend) -> str:
+        """Walk the tree for one text with an asyncio backend.
+
+        Args:
+            text: The text to classify
+            llm: The async LLM backend to use for decisions
+
+        Returns:
+            Label of the leaf that was reached
+        """
+        hooks = instrumentation.hooks
+        documents = self.prepare(text, llm)
+        labels = self.labels
+        rules = self.rules
+        node = 0
+        while True:
+            if rules[node] is not None:
+                node = self.follow_rules(text, node, hooks)
+            label = labels[node]
+            if label is not None:
+                return label
+            if hooks is None:
+                response = await self._aask(llm, documents, node)
+                node = self.next_node[node].get(response, self.fallback[node])
+                continue
+            hooks.node_enter(self.name, node)
+            start = time.perf_counter()
+            response = await self._aask(llm, documents, node)
+            node = self._record(hooks, node, response, time.perf_counter() - start)
+
+    def classify_batch(self, texts: List[str], llm: LLMBackend) -> List[str]:
+        """Walk the tree for several texts, one level at a time.
+
+        Every step sends the prompts of all texts that have not reached a
+        leaf yet to the backend in a single get_responses_batch call.
+
+        Args:
+            texts: The texts to classify
+            llm: The LLM backend to use for decisions
+
+        Returns:
+            Label of the leaf reached by each text
+        """
+        return [labels[0] for labels in classify_trees([self], texts, llm)]
+
+
+def classify_trees(  # noqa: PLR0912
+    trees: Sequence[CompiledTree], texts: List[str], llm: LLMBackend
+) -> List[List[str]]:
+    """Walk several trees for several texts, one level at a time.
+
+    Every step sends the pending prompts of all (text, tree) pairs to the
+    backend in a single get_responses_batch call; pairs whose node rules
+    fire move on without a prompt. Prompts for one text are
+    adjacent, so backends that share prompt prefixes within a batch evaluate
+    each document once and branch it into every tree.
+
+    Args:
+        trees: The trees to run
+        texts: The texts to classify
+        llm: The LLM backend to use for decisions
+
+    Returns:
+        For each text, the label reached in each tree, in tree order
+    """
+    if not trees:
+        return [[] for _ in texts]
+    rendered = [[render_document(text)] for text in texts]
+    pairs = [(i, tree) for i in range(len(texts)) for tree in trees]
+    # Document chunks per pair; trees without a policy share the rendering
+    documents = [
+        rendered[i] if tree.documents is None else tree.prepare(texts[i], llm)
+        for i, tree in pairs
+    ]
+    chunked = any(len(chunks) > 1 for chunks in documents)
+    hooks = instrumentation.hooks
+    nodes = [
+        tree.follow_rules(texts[i], 0, hooks) if tree.rules[0] is not None else 0
+        for i, tree in pairs
+    ]
+    active = [k for k, (_, tree) in enumerate(pairs) if tree.labels[nodes[k]] is None]
+    while active:
+        if hooks is not None:
+            for k in active:
+                hooks.node_enter(pairs[k][1].name, nodes[k])
+            start = time.perf_counter()
+        if chunked:
+            responses = _ask_chunks(pairs, nodes, documents, active, llm)
+        else:
+            responses = llm.get_responses_batch(
+                [
+                    documents[k][0] + pairs[k][1].prompt_suffixes[nodes[k]]
+                    for k in active
+                ],
+                [pairs[k][1].valid_responses[nodes[k]] for k in active],
+            )
+        if hooks is not None:
+            seconds = (time.perf_counter() - start) / len(active)
+            for k, response in zip(active, responses, strict=True):
+                nodes[k] = pairs[k][1]._record(hooks, nodes[k], response, seconds)
+        else:
+            for k, response in zip(active, responses, strict=True):
+                nodes[k] = pairs[k][1].step(nodes[k], response)
+        for k in active:
+            i, tree = pairs[k]
+            if tree.rules[nodes[k]] is not None:
+                nodes[k] = tree.follow_rules(texts[i], nodes[k], hooks)
+        active = [k for k in active if pairs[k][1].labels[nodes[k]] is None]
+
+    labels: List[str] = []
+    for (_, tree), node in zip(pairs, nodes, strict=True):
+        label = tree.labels[node]
+        assert label is not None  # every walk ends at a leaf
+        labels.append(label)
+    return [
+        labels[start : start + len(trees)]
+        for start in range(0, len(labels), len(trees))
+    ]
+
+
+def _ask_chunks(
+    pairs: List[Tuple[int, CompiledTree]],
+    nodes: List[int],
+    documents: List[List[str]],
+    active: List[int],
+    llm: LLMBackend,
+) -> List[str]:
+    """Ask the current node of every active pair once per document chunk.
+
+    All prompts go to the backend in one batch, and the answers of each
+    pair's chunks are combined by its tree's document policy.
+
+    Returns:
+        One answer per active pair
+    """
+    prompts = []
+    valid_responses_list = []
+    for k in active:
+        tree = pairs[k][1]
+        for document in documents[k]:
+            prompts.append(document + tree.prompt_suffixes[nodes[k]])
+            valid_responses_list.append(tree.valid_responses[nodes[k]])
+    flat = llm.get_responses_batch(prompts, valid_responses_list)
+
+    responses = []
+    start = 0
+    for k in active:
+        tree = pairs[k][1]
+        end = start + len(documents[k])
+        if end - start == 1:
+            responses.append(flat[start])
+        else:
+            responses.append(
+                tree.documents.combine(  # type: ignore[union-attr]
+                    flat[start:end], tree.valid_responses[nodes[k]]
+                )
+            )
+        start = end
+    return responses
 
 
 class DecisionTree:
     """A decision tree for classification."""
 
-    def __init__(self, name: str, root: DecisionNode) -> None:
+    def __init__(
+        self,
+        name: str,
+        root: DecisionNode,
+        optimize: bool = True,
+        cascade_margins: Optional[Dict[str, float]] = None,
+        documents: Optional[DocumentPolicy] = None,
+    ) -> None:
         """Initialize a decision tree.
 
         Args:
             name: The name of the tree
             root: The root node of the tree
+            optimize: Whether to fold nodes whose answer cannot change the
+                label and merge identical subtrees before compiling
+            cascade_margins: Score margin below which a CascadeBackend
+                escalates, per node question
+            documents: How texts are fitted into a token budget (None to
+                send them unchanged)
         """
         self.name = name
         self.root = root
+        self.cascade_margins = cascade_margins or {}
+        self.documents = documents
+        self.optimization: Optional[OptimizationReport] = None
+        if optimize:
+            root, self.optimization = optimize_tree(root)
+            if self.optimization.max_calls_saved:
+                logger.info(
+                    "Tree '%s': folded %d nodes, up to %d LLM calls saved per text",
+                    name,
+                    self.optimization.folded_nodes,
+                    self.optimization.max_calls_saved,
+                )
+        self.compiled = CompiledTree(name, root, documents=documents)
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "DecisionTree":
+        """Create a tree from a configuration dictionary.
+
+        Args:
+            config: The tree configuration with 'name' and 'root' keys, an
+                optional 'optimize' flag (default true), an optional
+                'cascade_margin' that nodes may override and optional
+                'documents' settings (see llm_tree_classifier.documents)
+
+        Returns:
+            A new DecisionTree instance
+        """
+        root = DecisionNode.from_dict(config["root"])
+        margins: Dict[str, float] = {}
+        default = config.get("cascade_margin")
+
+        def collect(node_config: Dict[str, Any]) -> None:
+            if "question" not in node_config:
+                return
+            margin = node_config.get("cascade_margin", default)
+            if margin is not None:
+                margins[node_config["question"]] = float(margin)
+            for option in node_config["options"]:
+                collect(option["next"])
+
+        collect(config["root"])
+        return cls(
+            name=config["name"],
+            root=root,
+            optimize=config.get("optimize", True),
+            cascade_margins=margins,
+            documents=(
+                DocumentPolicy.from_dict(config["documents"])
+                if config.get("documents") is not None
+                else None
+            ),
+        )
 
     def classify(self, text: str, llm: LLMBackend) -> bool:
         """Classify text using this tree.
@@ -91,21 +574,28 @@ class DecisionTree:
         Returns:
             True if the text matches this tree's classification, False otherwise
         """
-        node = self.root
-        while not node.is_leaf():
-            # Get valid response options
-            valid_responses = [opt["value"] for opt in node.options]
-            
-            # Get response from LLM
-            response = llm.get_response(node.question, valid_responses)
-            
-            # Find matching option
-            for option in node.options:
-                if option["value"] == response:
-                    node = option["next"]
-                    break
-            else:
-                # If no match found, use first option as fallback
-                node = node.options[0]["next"]
-
-        return node.label == "yes" 
\ No newline at end of file
+        return self.compiled.classify(text, llm) == "yes"
+
+    async def aclassify(self, text: str, llm: AsyncLLMBackend) -> bool:
+        """Classify text using this tree with an asyncio backend.
+
+        Args:
+            text: The text to classify
+            llm: The async LLM backend to use for decisions
+
+        Returns:
+            True if the text matches this tree's classification, False otherwise
+        """
+        return await self.compiled.aclassify(text, llm) == "yes"
+
+    def classify_batch(self, texts: List[str], llm: LLMBackend) -> List[bool]:
+        """Classify several texts, advancing all of them one level at a time.
+
+        Args:
+            texts: The texts to classify
+            llm: The LLM backend to use for decisions
+
+        Returns:
+            For each text, True if it matches this tree's classification
+        """
+        return [label == "yes" for label in self.compiled.classify_batch(texts, llm)]
@@ -1,9 +1,10 @@
 """Pytest configuration and fixtures."""
 
+from typing import Any, Dict
+
 import pytest
-from typing import Dict, Any
 
-from llm_tree_classifier import LlamaCppBackend, TreeClassifier
+from llm_tree_classifier import LlamaCppBackend
 
 
 @pytest.fixture
@@ -20,25 +21,32 @@ def sample_config() -> Dict[str, Any]:
                 "root": {
                     "question": "Is this a test?",
                     "options": [
-                        {
-                            "value": "yes",
-                            "next": {
-                                "label": "yes"
-                            }
-                        },
-                        {
-                            "value": "no",
-                            "next": {
-                                "label": "yes"
-                            }
-                        }
-                    ]
-                }
+                        {"value": "yes", "next": {"label": "yes"}},
+                        {"value": "no", "next": {"label": "yes"}},
+                    ],
+                },
             }
         ]
     }
 
 
+@pytest.fixture
+def branching_config(sample_config) -> Dict[str, Any]:
+    """Sample configuration whose root answer decides the label.
+
+    The plain sample configuration leads to label "yes" either way, so the
+    optimizer folds its only question and no LLM call is made.
+
+    Args:
+        sample_config: Sample tree configuration
+
+    Returns:
+        Configuration where "no" leads to label "no"
+    """
+    sample_config["trees"][0]["root"]["options"][1]["next"]["label"] = "no"
+    return sample_config
+
+
 @pytest.fixture
 def mock_llm(mocker):
     """Mock LLM backend for testing.
@@ -66,4 +74,5 @@ def classifier(mock_llm, sample_config):
         Configured TreeClassifier instance
     """
     from llm_tree_classifier import load_from_yaml
-    return load_from_yaml(sample_config, mock_llm) 
\ No newline at end of file
+
+    return load_from_yaml(sample_config, mock_llm)
@@ -0,0 +1,86 @@
+"""Tests for asyncio classification."""
+
+import asyncio
+from typing import List
+
+import pytest
+
+from llm_tree_classifier.classifier import MultiTreeClassifier, TreeClassifier
+from llm_tree_classifier.llm.async_adapter import AsyncBackendAdapter
+from llm_tree_classifier.llm.base import AsyncLLMBackend
+
+
+class SlowAsyncBackend(AsyncLLMBackend):
+    """Async backend that tracks how many calls overlap."""
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return "yes"
+
+
+def test_aclassify_many_bounded(branching_config) -> None:
+    """Documents overlap up to the concurrency limit.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+    """
+    llm = SlowAsyncBackend()
+    classifier = TreeClassifier(branching_config, llm)
+    results = asyncio.run(classifier.aclassify_many(["t"] * 10, concurrency=3))
+    assert results == [["test_tree"]] * 10
+    assert llm.max_in_flight == 3
+
+
+def test_aclassify_with_sync_backend(mock_llm, branching_config) -> None:
+    """Synchronous backends are run through the executor adapter.
+
+    Args:
+        mock_llm: Mock LLM backend
+        branching_config: Tree configuration whose answer matters
+    """
+    classifier = TreeClassifier(branching_config, mock_llm)
+    assert asyncio.run(classifier.aclassify("test text")) == ["test_tree"]
+    assert isinstance(classifier.async_llm, AsyncBackendAdapter)
+    mock_llm.get_response.assert_called_once()
+
+
+def test_multi_tree_aclassify(branching_config) -> None:
+    """Trees of a multi-tree classifier are walked concurrently.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+    """
+    branching_config["trees"].append(
+        dict(branching_config["trees"][0], name="other_tree")
+    )
+    llm = SlowAsyncBackend()
+    classifier = MultiTreeClassifier(branching_config, llm)
+    assert asyncio.run(classifier.aclassify("t")) == {
+        "test_tree": "yes",
+        "other_tree": "yes",
+    }
+    assert llm.max_in_flight == 2
+
+
+def test_sync_classify_rejects_async_backend(branching_config) -> None:
+    """Synchronous classification with an async-only backend fails loudly.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+    """
+    llm = SlowAsyncBackend()
+    for classifier in (
+        TreeClassifier(branching_config, llm),
+        MultiTreeClassifier(branching_config, llm),
+    ):
+        with pytest.raises(TypeError, match="aclassify"):
+            classifier.classify("t")
+        with pytest.raises(TypeError, match="aclassify"):
+            classifier.classify_batch(["t"])
@@ -0,0 +1,112 @@
+"""Tests for the decision cache."""
+
+from typing import List
+
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.llm.cache import CachingBackend, decision_key
+
+
+class CountingBackend(LLMBackend):
+    """Backend that answers with the last option and counts calls."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        self.calls += 1
+        return valid_responses[-1]
+
+
+def test_memory_hits() -> None:
+    """Repeated decisions are answered from memory."""
+    inner = CountingBackend()
+    cache = CachingBackend(inner)
+    assert cache.get_response("p", ["yes", "no"]) == "no"
+    assert cache.get_response("p", ["yes", "no"]) == "no"
+    assert cache.get_response("p", ["no", "yes"]) == "yes"
+    assert inner.calls == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_memory_eviction() -> None:
+    """The in-memory tier is bounded."""
+    cache = CachingBackend(CountingBackend(), max_entries=2)
+    for prompt in ("a", "b", "c"):
+        cache.get_response(prompt, ["yes", "no"])
+    assert cache.stats()["entries"] == 2
+
+
+def test_batch_only_sends_misses(mocker) -> None:
+    """Only uncached prompts reach the wrapped backend in a batch.
+
+    Args:
+        mocker: Pytest mocker fixture
+    """
+    inner = CountingBackend()
+    spy = mocker.spy(inner, "get_responses_batch")
+    cache = CachingBackend(inner)
+    cache.get_response("a", ["yes", "no"])
+    assert cache.get_responses_batch(["a", "b"], [["yes", "no"]] * 2) == ["no", "no"]
+    spy.assert_called_once_with(["b"], [["yes", "no"]])
+
+
+def test_sqlite_tier_persists(tmp_path) -> None:
+    """Decisions survive in the SQLite file across cache instances.
+
+    Args:
+        tmp_path: Pytest temporary directory
+    """
+    db_path = tmp_path / "decisions.sqlite"
+    CachingBackend(CountingBackend(), db_path=db_path).get_response("p", ["y", "n"])
+
+    inner = CountingBackend()
+    cache = CachingBackend(inner, db_path=db_path)
+    assert cache.get_response("p", ["y", "n"]) == "n"
+    assert inner.calls == 0
+    assert cache.stats()["db_hits"] == 1
+
+
+def test_sqlite_batch_lookup(tmp_path) -> None:
+    """A batch is looked up at once and hits are marked used with the next store.
+
+    Args:
+        tmp_path: Pytest temporary directory
+    """
+    db_path = tmp_path / "decisions.sqlite"
+    prompts = ["a", "b", "a"]
+    CachingBackend(CountingBackend(), db_path=db_path).get_responses_batch(
+        prompts, [["yes", "no"]] * 3
+    )
+
+    cache = CachingBackend(CountingBackend(), db_path=db_path)
+    conn = cache._connection()
+    before = dict(conn.execute("SELECT key, accessed FROM decisions").fetchall())
+    responses = cache.get_responses_batch([*prompts, "c"], [["yes", "no"]] * 4)
+    assert responses == ["no"] * 4
+    assert cache.stats()["db_hits"] == 3 and cache.stats()["misses"] == 1
+    after = dict(conn.execute("SELECT key, accessed FROM decisions").fetchall())
+    assert len(after) == 3
+    assert all(after[key] > accessed for key, accessed in before.items())
+
+
+def test_sqlite_tier_eviction(tmp_path) -> None:
+    """The SQLite tier keeps at most max_db_entries decisions.
+
+    Args:
+        tmp_path: Pytest temporary directory
+    """
+    cache = CachingBackend(
+        CountingBackend(), db_path=tmp_path / "d.sqlite", max_db_entries=5
+    )
+    for i in range(20):
+        cache.get_response(f"prompt {i}", ["yes", "no"])
+    count = cache._connection().execute("SELECT COUNT(*) FROM decisions").fetchone()
+    assert count[0] <= 5
+
+
+def test_key_depends_on_model() -> None:
+    """Keys differ between models and option sets."""
+    key = decision_key("model-a", "p", ["yes", "no"])
+    assert key != decision_key("model-b", "p", ["yes", "no"])
+    assert key != decision_key("model-a", "p", ["yes", "no", "maybe"])
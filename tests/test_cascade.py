@@ -0,0 +1,99 @@
+"""Tests for the model cascade backend."""
+
+from typing import Dict, List
+
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.llm.cascade import CascadeBackend, score_margin
+from llm_tree_classifier.llm.simulated import SimulatedLLMBackend
+from llm_tree_classifier.prompts import build_prompt
+
+
+class FixedScoresBackend(LLMBackend):
+    """Backend scoring options from a prompt -> scores table."""
+
+    def __init__(self, table: Dict[str, Dict[str, float]]) -> None:
+        self.table = table
+        self.batches: List[int] = []
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        scores = self.score_responses(prompt, valid_responses)
+        return max(scores, key=scores.__getitem__)
+
+    def score_responses(
+        self, prompt: str, valid_responses: List[str]
+    ) -> Dict[str, float]:
+        return self.table[prompt]
+
+    def score_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[Dict[str, float]]:
+        self.batches.append(len(prompts))
+        return [self.table[prompt] for prompt in prompts]
+
+
+def test_score_margin() -> None:
+    """The margin is the gap between the two best options."""
+    assert score_margin({"a": -0.1, "b": -2.1, "c": -5.0}) == 2.0
+    assert score_margin({"a": 0.0}) == float("inf")
+    assert score_margin({"a": 0.0, "b": float("-inf")}) == float("inf")
+
+
+def test_cascade_escalates_unsure_prompts() -> None:
+    """Only prompts below the margin reach the large model, in one batch."""
+    sure = build_prompt("clear text", "Is it?")
+    unsure = build_prompt("vague text", "Is it?")
+    picky = build_prompt("clear text", "Is it really?")
+    small = FixedScoresBackend(
+        {
+            sure: {"yes": -0.1, "no": -3.0},
+            unsure: {"yes": -0.6, "no": -0.8},
+            picky: {"yes": -0.1, "no": -3.0},
+        }
+    )
+    large = SimulatedLLMBackend(answer_weights=[0, 1])
+    cascade = CascadeBackend(small, large, margin=1.0, margins={"Is it really?": 5.0})
+
+    assert cascade.get_responses_batch([sure, unsure, picky], [["yes", "no"]] * 3) == [
+        "yes",
+        "no",
+        "no",
+    ]
+    assert small.batches == [3]
+    assert large.calls == 1 and large.prompts == 2
+    assert cascade.get_response(sure, ["yes", "no"]) == "yes"
+    scores = cascade.score_responses(unsure, ["yes", "no"])
+    assert max(scores, key=scores.__getitem__) == "no"
+
+    stats = cascade.stats()
+    assert (stats["calls"], stats["escalations"]) == (5, 3)
+    assert stats["questions"]["Is it really?"]["escalation_rate"] == 1.0
+    assert stats["questions"]["Is it?"]["escalations"] == 2
+    cascade.reset_stats()
+    assert cascade.stats()["calls"] == 0
+
+
+def test_cascade_margins_from_config(branching_config) -> None:
+    """Trees set a default margin that nodes can override.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+    """
+    tree = branching_config["trees"][0]
+    tree["cascade_margin"] = 2.0
+    tree["root"]["options"][0]["next"] = {
+        "question": "Sure?",
+        "cascade_margin": 0.5,
+        "options": [
+            {"value": "yes", "next": {"label": "yes"}},
+            {"value": "no", "next": {"label": "no"}},
+        ],
+    }
+    small = SimulatedLLMBackend()
+    cascade = CascadeBackend.from_config(small, SimulatedLLMBackend(), branching_config)
+    assert cascade.margins == {"Is this a test?": 2.0, "Sure?": 0.5}
+    assert cascade.model_id != CascadeBackend(small, small).model_id
+
+    classifier = TreeClassifier(branching_config, cascade)
+    classifier.classify_batch([f"text {i}" for i in range(20)])
+    assert cascade.stats()["calls"] >= 20
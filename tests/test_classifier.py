@@ -1,10 +1,9 @@
 """Tests for the classifier module."""
 
 import pytest
-from typing import List
 
-from llm_tree_classifier import TreeNotFoundError, InvalidTreeConfigError
-from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier import InvalidTreeConfigError, TreeNotFoundError
+from llm_tree_classifier.classifier import MultiTreeClassifier, TreeClassifier
 
 
 def test_classify_with_single_tree(mock_llm, sample_config) -> None:
@@ -56,26 +55,16 @@ def test_initialization_with_multiple_trees(mock_llm) -> None:
                 "name": "tree1",
                 "root": {
                     "question": "Is this tree 1?",
-                    "options": [
-                        {
-                            "value": "yes",
-                            "next": {"label": "yes"}
-                        }
-                    ]
-                }
+                    "options": [{"value": "yes", "next": {"label": "yes"}}],
+                },
             },
             {
                 "name": "tree2",
                 "root": {
                     "question": "Is this tree 2?",
-                    "options": [
-                        {
-                            "value": "yes",
-                            "next": {"label": "yes"}
-                        }
-                    ]
-                }
-            }
+                    "options": [{"value": "yes", "next": {"label": "yes"}}],
+                },
+            },
         ]
     }
 
@@ -87,4 +76,62 @@ def test_initialization_with_multiple_trees(mock_llm) -> None:
     classifier = TreeClassifier(config, mock_llm, tree_name="tree1")
     result = classifier.classify("test text")
     assert isinstance(result, list)
-    assert "tree1" in result 
\ No newline at end of file
+    assert "tree1" in result
+
+
+def test_classify_batch(mock_llm, branching_config) -> None:
+    """Test classifying several texts in one call.
+
+    Args:
+        mock_llm: Mock LLM backend
+        branching_config: Tree configuration whose answer matters
+    """
+    mock_llm.get_responses_batch.side_effect = lambda prompts, options: [
+        "no" for _ in prompts
+    ]
+    classifier = TreeClassifier(branching_config, mock_llm)
+    results = classifier.classify_batch(["one", "two", "three"])
+    assert results == [[]] * 3
+    mock_llm.get_responses_batch.assert_called_once()
+
+
+def test_folded_tree_skips_llm(mock_llm, sample_config) -> None:
+    """A tree whose options all lead to the same label never asks the LLM.
+
+    Args:
+        mock_llm: Mock LLM backend
+        sample_config: Sample tree configuration
+    """
+    classifier = TreeClassifier(sample_config, mock_llm)
+    assert classifier.classify("test text") == ["test_tree"]
+    assert classifier.classify_batch(["a", "b"]) == [["test_tree"]] * 2
+    mock_llm.get_response.assert_not_called()
+    mock_llm.get_responses_batch.assert_not_called()
+
+
+def test_multi_tree_classifier(mock_llm, branching_config) -> None:
+    """All or selected trees run on each text, one backend batch per level.
+
+    Args:
+        mock_llm: Mock LLM backend
+        branching_config: Tree configuration whose answer matters
+    """
+    second = dict(branching_config["trees"][0], name="other_tree")
+    branching_config["trees"].append(second)
+    mock_llm.get_responses_batch.side_effect = lambda prompts, options: [
+        "yes" if "one" in prompt else "no" for prompt in prompts
+    ]
+
+    classifier = MultiTreeClassifier(branching_config, mock_llm)
+    assert classifier.classify("one") == {"test_tree": "yes", "other_tree": "yes"}
+    assert classifier.classify_batch(["one", "two"]) == [
+        {"test_tree": "yes", "other_tree": "yes"},
+        {"test_tree": "no", "other_tree": "no"},
+    ]
+    prompts = mock_llm.get_responses_batch.call_args.args[0]
+    assert len(prompts) == 4
+
+    selected = MultiTreeClassifier(branching_config, mock_llm, ["other_tree"])
+    assert selected.classify("one") == {"other_tree": "yes"}
+    with pytest.raises(TreeNotFoundError):
+        MultiTreeClassifier(branching_config, mock_llm, ["missing"])
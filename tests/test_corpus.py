@@ -0,0 +1,130 @@
+"""Tests for the memory-mapped corpus reader."""
+
+import json
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from llm_tree_classifier.corpus import Corpus, index_path
+
+
+@pytest.fixture
+def jsonl(tmp_path):
+    """A JSONL file with CRLF endings, a blank line and no final newline.
+
+    Args:
+        tmp_path: Temporary directory
+
+    Returns:
+        Path of the file
+    """
+    lines = [json.dumps({"id": i, "text": f"text {i} é"}) for i in range(10)]
+    lines[4] = ""
+    lines[6] = "[1, 2]"
+    path = tmp_path / "corpus.jsonl"
+    path.write_bytes("\r\n".join(lines).encode("utf-8"))
+    return path
+
+
+def test_lines_and_records(jsonl) -> None:
+    """Lines and records are read from the mapped file by index.
+
+    Args:
+        jsonl: Input file
+    """
+    with Corpus(jsonl) as corpus:
+        assert len(corpus) == 10
+        assert corpus[0] == json.dumps({"id": 0, "text": "text 0 é"})
+        assert corpus[4] == ""
+        assert corpus.record(-1)["id"] == 9
+        assert bytes(corpus.raw(9)).endswith(b"}")
+        with pytest.raises(IndexError):
+            corpus[10]
+        with pytest.raises(ValueError):
+            corpus.record(6)
+
+        records = list(corpus.view().records())
+        assert len(records) == 9
+        assert records[5] == {"error": "Line 7 is not a JSON object"}
+        assert [r["id"] for r in corpus.view(7, 9).records()] == [7, 8]
+
+
+def test_index_is_saved_and_reused(jsonl, mocker) -> None:
+    """The index is built once, then loaded until the file changes.
+
+    Args:
+        jsonl: Input file
+        mocker: Pytest mocker fixture
+    """
+    Corpus(jsonl).close()
+    assert index_path(jsonl).exists()
+
+    build = mocker.spy(Corpus, "_build_index")
+    corpus = Corpus(jsonl)
+    assert build.call_count == 0 and len(corpus) == 10
+    assert isinstance(corpus.offsets, np.memmap)
+    corpus.close()
+
+    with jsonl.open("ab") as f:
+        f.write(b'\n{"id": 10}\n')
+    os.utime(jsonl, ns=(1, 1))
+    with Corpus(jsonl) as corpus:
+        assert build.call_count == 1
+        assert len(corpus) == 11 and corpus.record(10) == {"id": 10}
+
+    empty = jsonl.with_name("empty.jsonl")
+    empty.write_bytes(b"")
+    with Corpus(empty, save_index=False) as corpus:
+        assert len(corpus) == 0 and list(corpus.view()) == []
+        assert not index_path(empty).exists()
+
+
+def test_index_is_built_in_a_per_process_file(jsonl, mocker) -> None:
+    """Concurrent openers build the index under different names.
+
+    Args:
+        jsonl: Input file
+        mocker: Pytest mocker fixture
+    """
+    build = mocker.spy(Corpus, "_build_index")
+    Corpus(jsonl).close()
+    target = build.call_args.args[2]
+    assert str(os.getpid()) in target.name
+    assert target.name != index_path(jsonl).name
+    assert sorted(p.name for p in jsonl.parent.iterdir()) == [
+        jsonl.name,
+        index_path(jsonl).name,
+    ]
+
+
+def test_shards(jsonl) -> None:
+    """Shards cover every line once, balanced by bytes, and pickle cheaply.
+
+    Args:
+        jsonl: Input file
+    """
+    corpus = Corpus(jsonl)
+    for n in (1, 3, 10, 50):
+        shards = corpus.shards(n)
+        assert 1 <= len(shards) <= n
+        assert [line for shard in shards for line in shard] == list(corpus.view())
+    shards = corpus.shards(3)
+    # Balanced by bytes, to within one line
+    longest = max(end - start for start, end in (s.byte_range for s in shards))
+    assert longest <= jsonl.stat().st_size / 3 + 40
+    assert shards[0].byte_range[0] == 0
+    assert shards[-1].byte_range[1] == jsonl.stat().st_size
+
+    assert len(corpus.split(1)) == len(corpus)
+    assert [len(view) for view in corpus.split(10**6)] == [len(corpus)]
+    view = corpus.view_bytes(*shards[1].byte_range)
+    assert (view.start, view.stop) == (shards[1].start, shards[1].stop)
+
+    data = pickle.dumps(shards[1])
+    assert len(data) < 200
+    restored = pickle.loads(data)
+    assert list(restored) == list(shards[1])
+    assert restored[0] == shards[1][0]
+    corpus.close()
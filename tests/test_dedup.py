@@ -0,0 +1,138 @@
+"""Tests for exact and near-duplicate deduplication."""
+
+import asyncio
+import io
+import json
+from typing import List
+
+import numpy as np
+import pytest
+
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.dedup import Deduplicator, MinHasher, normalize_text
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.prompts import split_prompt
+from llm_tree_classifier.streaming import classify_jsonl
+
+TEMPLATE = (
+    "Thank you for contacting support about order {}. A member of our team "
+    "will reply within two business days. Please do not reply to this email."
+)
+
+
+class KeywordBackend(LLMBackend):
+    """Answers "yes" for documents mentioning "refund" and counts prompts."""
+
+    def __init__(self) -> None:
+        self.prompts: List[str] = []
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        self.prompts.append(prompt)
+        document, _ = split_prompt(prompt)
+        return "yes" if "refund" in document else "no"
+
+
+def upper_all(texts: List[str]) -> List[List[str]]:
+    return [[text.upper()] for text in texts]
+
+
+def test_exact_duplicates() -> None:
+    """Texts equal up to whitespace are classified once, with copied results."""
+    assert normalize_text(" a \t b\n") == "a b"
+    dedup = Deduplicator()
+    calls: List[List[str]] = []
+
+    def classify(texts: List[str]) -> List[List[str]]:
+        calls.append(texts)
+        return upper_all(texts)
+
+    results = dedup.classify(["a b", "c", "a  b ", "A b", "c"], classify)
+    assert calls == [["a b", "c", "A b"]]
+    assert results == [["A B"], ["C"], ["A B"], ["A B"], ["C"]]
+    results[2].append("changed")
+    assert results[0] == ["A B"]
+
+    # Remembered across batches
+    assert dedup.classify(["c", "a b"], classify) == [["C"], ["A B"]]
+    assert len(calls) == 1
+    assert dedup.stats()["misses"] == 3
+    assert dedup.stats()["exact_hits"] == 4
+
+
+def test_minhash_estimates_jaccard() -> None:
+    """Signature agreement approximates the Jaccard similarity of shingles."""
+    hasher = MinHasher(num_perm=256)
+    a, b = TEMPLATE.format(1234), TEMPLATE.format(98765)
+    sa, sb = hasher.shingles(a), hasher.shingles(b)
+    jaccard = len(np.intersect1d(sa, sb)) / len(np.union1d(sa, sb))
+    estimate = np.mean(hasher.signature(a) == hasher.signature(b))
+    assert abs(estimate - jaccard) < 0.1
+    assert hasher.signature("").shape == (256,)
+    assert np.array_equal(hasher.signature("Hi  there"), hasher.signature("hi there"))
+
+
+def test_near_duplicates() -> None:
+    """Templated texts share a representative; different texts do not."""
+    texts = [TEMPLATE.format(n) for n in (101, 202, 303)] + [
+        "Your refund has been processed and will arrive in 3-5 days.",
+        "Thank you!",
+    ]
+    exact = Deduplicator()
+    assert len(exact.plan(texts).texts) == 5
+
+    near = Deduplicator(near=True)
+    plan = near.plan(texts)
+    assert plan.texts == [texts[0], texts[3], texts[4]]
+    assert plan.resolve(upper_all(plan.texts))[2] == [texts[0].upper()]
+    assert near.stats()["near_hits"] == 2
+
+    # A later near duplicate is answered from memory
+    assert near.plan([TEMPLATE.format(404)]).texts == []
+    assert Deduplicator(near=True, threshold=1.0).plan(texts[:2]).texts == texts[:2]
+
+
+def test_memory_is_bounded() -> None:
+    """Old results are forgotten first; max_entries=0 only dedups a batch."""
+    dedup = Deduplicator(near=True, max_entries=2)
+    for text in ("one", "two", "three"):
+        dedup.classify([text], upper_all)
+    assert dedup.stats()["entries"] == 2
+    assert dedup.plan(["one", "three"]).texts == ["one"]
+
+    batch_only = Deduplicator(max_entries=0)
+    assert batch_only.classify(["x", "x"], upper_all) == [["X"], ["X"]]
+    assert batch_only.plan(["x"]).texts == ["x"]
+
+    with pytest.raises(ValueError):
+        Deduplicator().plan(["x"]).resolve([["X"], ["Y"]])
+    for settings in ({"threshold": 0}, {"bands": 3}, {"max_entries": -1}):
+        with pytest.raises(ValueError):
+            Deduplicator(**settings)
+
+
+def test_classifier_paths(branching_config) -> None:
+    """Batch, streaming and async classification only walk representatives.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+    """
+    llm = KeywordBackend()
+    classifier = TreeClassifier(branching_config, llm, dedup=Deduplicator(near=True))
+    texts = [TEMPLATE.format(n) for n in range(10)] + ["refund please"] * 5
+    expected = [[]] * 10 + [["test_tree"]] * 5
+
+    assert classifier.classify_batch(texts) == expected
+    assert len(llm.prompts) == 2
+
+    llm.prompts.clear()
+    lines = [json.dumps({"text": text}) for text in reversed(texts)]
+    output = io.StringIO()
+    classify_jsonl(classifier, io.StringIO("\n".join(lines)), output, batch_size=4)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [r["classifications"] for r in records] == expected[::-1]
+    assert llm.prompts == []
+
+    llm.prompts.clear()
+    fresh = TreeClassifier(branching_config, llm, dedup=Deduplicator())
+    assert asyncio.run(fresh.aclassify_many(texts[9:])) == expected[9:]
+    assert len(llm.prompts) == 2
@@ -0,0 +1,148 @@
+"""Tests for distilled node classifiers."""
+
+import random
+from typing import List
+
+import numpy as np
+import pytest
+import yaml
+
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.distill import (
+    DistilledModels,
+    distilled_path,
+    hash_features,
+    main,
+    train_from_recording,
+)
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.llm.distilled import DistilledBackend
+from llm_tree_classifier.llm.recording import RecordingBackend
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta"]
+
+
+class KeywordBackend(LLMBackend):
+    """Backend answering "yes" when the document mentions "great"."""
+
+    def __init__(self) -> None:
+        self.prompts = 0
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        self.prompts += 1
+        document = prompt.split("Question:", maxsplit=1)[0]
+        return "yes" if "great" in document else "no"
+
+
+def make_texts(count: int, seed: int) -> List[str]:
+    """Random texts, half of them containing the keyword."""
+    rng = random.Random(seed)
+    texts = []
+    for i in range(count):
+        words = rng.choices(WORDS, k=12)
+        if i % 2:
+            words.insert(rng.randrange(len(words)), "great")
+        texts.append(" ".join(words))
+    return texts
+
+
+@pytest.fixture
+def recording(branching_config, tmp_path):
+    """Record a keyword backend classifying 400 texts.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+        tmp_path: Temporary directory
+
+    Returns:
+        Path of the recording
+    """
+    path = tmp_path / "run.jsonl"
+    with RecordingBackend(KeywordBackend(), path) as llm:
+        TreeClassifier(branching_config, llm).classify_batch(make_texts(400, 0))
+    return path
+
+
+def test_hash_features() -> None:
+    """Rows are L2-normalized and hashing is stable across calls."""
+    features = hash_features(["a b a", "", "c"], n_features=64)
+    assert features.n_rows == 3
+    # Unigrams "a", "b" and bigrams "a b", "b a"
+    assert list(np.diff(features.indptr)) == [4, 0, 1]
+    row = features.values[:4]
+    assert np.isclose(row @ row, 1.0)
+    again = hash_features(["c"], n_features=64)
+    assert again.indices.tolist() == features.indices[4:].tolist()
+    taken = features.take(np.array([2, 0]))
+    assert taken.indices.tolist() == features.indices[[4, 0, 1, 2, 3]].tolist()
+
+
+def test_distilled_backend(branching_config, recording, tmp_path) -> None:
+    """Trained models answer confident nodes locally and agree with the LLM.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+        recording: Recorded decisions
+        tmp_path: Temporary directory
+    """
+    models = train_from_recording([recording], min_samples=50, n_features=2**12)
+    (model,) = models.models.values()
+    assert model.samples == 400
+    assert model.accuracy is not None and model.accuracy >= 0.95
+
+    path = tmp_path / "models.npz"
+    models.save(path)
+    loaded = DistilledModels.load(path)
+    assert loaded.digest == models.digest
+
+    live = KeywordBackend()
+    llm = DistilledBackend(path, live, threshold=0.8)
+    texts = make_texts(200, 1)
+    reference = TreeClassifier(branching_config, KeywordBackend())
+    expected = reference.classify_batch(texts)
+    classifier = TreeClassifier(branching_config, llm)
+    results = classifier.classify_batch(texts)
+    agreement = sum(a == b for a, b in zip(results, expected, strict=True)) / len(texts)
+    assert agreement >= 0.95
+    stats = llm.stats()
+    assert stats["calls"] == 200
+    assert stats["local"] + live.prompts == 200
+    assert stats["local_rate"] > 0.5
+
+    assert classifier.classify(texts[0]) == expected[0]
+    strict = DistilledBackend(loaded, live, threshold=1.01)
+    assert strict.get_response(texts[0], ["yes", "no"]) in ("yes", "no")
+    assert strict.stats()["local"] == 0
+
+
+def test_untrained_nodes_are_deferred(recording) -> None:
+    """Nodes without a model, or with too few decisions, go to the LLM.
+
+    Args:
+        recording: Recorded decisions
+    """
+    assert len(train_from_recording([recording], min_samples=1000)) == 0
+    live = KeywordBackend()
+    llm = DistilledBackend(DistilledModels([]), live)
+    assert llm.get_responses_batch(["x great", "y"], [["yes", "no"]] * 2) == [
+        "yes",
+        "no",
+    ]
+    assert live.prompts == 2
+
+
+def test_distill_command(branching_config, recording, tmp_path) -> None:
+    """The distill command saves models next to the configuration.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+        recording: Recorded decisions
+        tmp_path: Temporary directory
+    """
+    config = tmp_path / "trees.yaml"
+    config.write_text(yaml.safe_dump(branching_config))
+    argv = ["--config", str(config), "--recording", str(recording)]
+    assert main([*argv, "--min-samples", "10", "--features", "1024"]) == 0
+    assert distilled_path(config) == tmp_path / "trees.distilled.npz"
+    llm = DistilledBackend.for_config(config, KeywordBackend())
+    assert len(llm.models) == 1
@@ -0,0 +1,161 @@
+"""Tests for token-budgeted document preparation."""
+
+import asyncio
+from typing import List
+
+import pytest
+
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.documents import (
+    ELLIPSIS,
+    DocumentPolicy,
+    WhitespaceTokenizer,
+    tokenizer_for,
+)
+from llm_tree_classifier.llm.async_adapter import AsyncBackendAdapter
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.prompts import split_prompt
+
+
+class NeedleBackend(LLMBackend):
+    """Answers "yes" when the document part of the prompt holds "needle"."""
+
+    def __init__(self) -> None:
+        self.prompts: List[str] = []
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        self.prompts.append(prompt)
+        document, _ = split_prompt(prompt)
+        return "yes" if "needle" in document else "no"
+
+
+def words(n: int, needle_at: int = -1) -> str:
+    """Return n numbered words, with "needle" at one position."""
+    return " ".join("needle" if i == needle_at else f"w{i}" for i in range(n))
+
+
+def test_strategies() -> None:
+    """Long texts are cut to their head, tail or both, or split into chunks."""
+    tokenizer = WhitespaceTokenizer()
+    text = words(10)
+
+    assert DocumentPolicy(10).prepare(text, tokenizer) == [text]
+    assert DocumentPolicy(3, "head").prepare(text, tokenizer) == ["w0 w1 w2 "]
+    assert DocumentPolicy(3, "tail").prepare(text, tokenizer) == ["w7 w8 w9"]
+    assert DocumentPolicy(4, "head_tail").prepare(text, tokenizer) == [
+        "w0 w1 " + ELLIPSIS + "w8 w9"
+    ]
+    assert DocumentPolicy(4, "chunk").prepare(text, tokenizer) == [
+        "w0 w1 w2 w3 ",
+        "w4 w5 w6 w7 ",
+        "w8 w9",
+    ]
+    assert DocumentPolicy(4, "chunk", overlap=2).prepare(text, tokenizer) == [
+        "w0 w1 w2 w3 ",
+        "w2 w3 w4 w5 ",
+        "w4 w5 w6 w7 ",
+        "w6 w7 w8 w9",
+    ]
+    # Limited chunks are spread evenly and keep both ends
+    chunks = DocumentPolicy(1, "chunk", max_chunks=3).prepare(text, tokenizer)
+    assert [chunk.strip() for chunk in chunks] == ["w0", "w4", "w9"]
+
+
+def test_combine() -> None:
+    """Chunk answers are reduced by majority or by any occurrence."""
+    majority = DocumentPolicy(10, "chunk")
+    assert majority.combine(["no", "yes", "no"], ["yes", "no"]) == "no"
+    # Ties go to the earlier option
+    assert majority.combine(["no", "yes"], ["yes", "no"]) == "yes"
+
+    any_yes = DocumentPolicy(10, "chunk", reduce="any", any_option="yes")
+    assert any_yes.combine(["no", "yes", "no"], ["yes", "no"]) == "yes"
+    assert any_yes.combine(["no", "no"], ["yes", "no"]) == "no"
+    # Nodes without the option fall back to majority
+    assert any_yes.combine(["b", "a", "b"], ["a", "b"]) == "b"
+
+
+def test_tokenizer_cache(mocker) -> None:
+    """A text is tokenized once, whichever node or tree asks for it."""
+    tokenizer = WhitespaceTokenizer(cache_size=1)
+    encode = mocker.spy(tokenizer, "encode")
+    for _ in range(3):
+        tokenizer.tokenize("a b c")
+    assert encode.call_count == 1
+    tokenizer.tokenize("d")
+    tokenizer.tokenize("a b c")
+    assert encode.call_count == 3
+
+    assert tokenizer_for(object()) is not None
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {},
+        {"token_budget": 0},
+        {"token_budget": 10, "strategy": "middle"},
+        {"token_budget": 10, "overlap": 10},
+        {"token_budget": 10, "reduce": "any"},
+        {"token_budget": 10, "reduce": "mean"},
+        {"token_budget": 10, "max_chunks": 0},
+    ],
+)
+def test_invalid_policy(sample_config, settings) -> None:
+    """Invalid document settings are rejected when the tree is loaded.
+
+    Args:
+        sample_config: Sample tree configuration
+        settings: Invalid 'documents' settings
+    """
+    sample_config["trees"][0]["documents"] = settings
+    with pytest.raises(ValueError):
+        TreeClassifier(sample_config, None)
+
+
+def test_chunked_classification(branching_config) -> None:
+    """Every code path asks each node once per chunk and reduces the answers.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+    """
+    branching_config["trees"][0]["documents"] = {
+        "token_budget": 5,
+        "strategy": "chunk",
+        "reduce": "any",
+        "any_option": "yes",
+    }
+    llm = NeedleBackend()
+    classifier = TreeClassifier(branching_config, llm)
+    texts = [words(20, needle_at=17), words(20), "needle"]
+    expected = [["test_tree"], [], ["test_tree"]]
+
+    assert [classifier.classify(text) for text in texts] == expected
+    assert len(llm.prompts) == 4 + 4 + 1
+    assert all(len(split_prompt(p)[0].split()) <= 6 for p in llm.prompts)
+
+    llm.prompts.clear()
+    assert classifier.classify_batch(texts) == expected
+    assert len(llm.prompts) == 9
+
+    async_llm = AsyncBackendAdapter(llm)
+    async_classifier = TreeClassifier(branching_config, async_llm)
+    assert asyncio.run(async_classifier.aclassify_many(texts)) == expected
+
+    # Without a policy the needle is found in the single full prompt
+    del branching_config["trees"][0]["documents"]
+    llm.prompts.clear()
+    assert TreeClassifier(branching_config, llm).classify_batch(texts) == expected
+    assert len(llm.prompts) == 3
+
+
+def test_truncation_drops_middle(branching_config) -> None:
+    """head_tail keeps both ends of a text and drops its middle.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+    """
+    branching_config["trees"][0]["documents"] = {"token_budget": 4}
+    classifier = TreeClassifier(branching_config, NeedleBackend())
+    assert classifier.classify(words(20, needle_at=19)) == ["test_tree"]
+    assert classifier.classify(words(20, needle_at=10)) == []
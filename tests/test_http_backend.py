@@ -0,0 +1,137 @@
+"""Tests for the HTTP completion backend."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+from llm_tree_classifier.exceptions import LLMError
+from llm_tree_classifier.llm.http_backend import HttpLLMBackend
+
+
+class StubServer(ThreadingHTTPServer):
+    """Completion server that answers with the last option of each prompt."""
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests: List[Dict[str, Any]] = []
+        self.failures = 0
+        self.fail_status = 503
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Handler for StubServer."""
+
+    protocol_version = "HTTP/1.1"
+    server: StubServer
+
+    def do_POST(self) -> None:
+        length = int(self.headers["Content-Length"])
+        body = json.loads(self.rfile.read(length))
+        with self.server.lock:
+            self.server.requests.append(body)
+            fail = self.server.failures > 0
+            if fail:
+                self.server.failures -= 1
+        if fail:
+            self._reply(self.server.fail_status, {"error": "busy"})
+            return
+        options = body["prompt"].rsplit("Options: ", 1)[1].split("\n")[0]
+        answer = " " + options.split(", ")[-1]
+        self._reply(200, {"choices": [{"text": answer}]})
+
+    def _reply(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def stub_server() -> Iterator[StubServer]:
+    """Run a stub completion server on a free port.
+
+    Yields:
+        Running server
+    """
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_backend_response(stub_server) -> None:
+    """Answers are matched to options and the grammar is sent along.
+
+    Args:
+        stub_server: Running stub server
+    """
+    llm = HttpLLMBackend(stub_server.url, model="tiny", backoff=0.0)
+    assert llm.get_response("Text: hi\n\nQuestion: Is it?", ["yes", "no"]) == "no"
+    llm.close()
+
+    body = stub_server.requests[0]
+    assert body["model"] == "tiny"
+    assert body["temperature"] == 0.0
+    assert body["prompt"].endswith("Question: Is it?\nOptions: yes, no\nAnswer:")
+    assert '"yes" | "no"' in body["grammar"]
+
+
+def test_http_backend_batch_reuses_connections(stub_server) -> None:
+    """Batches are answered in order over pooled connections.
+
+    Args:
+        stub_server: Running stub server
+    """
+    llm = HttpLLMBackend(stub_server.url, grammar=False, max_connections=2)
+    prompts = [f"prompt {i}" for i in range(10)]
+    options = [["a", "b"] if i % 2 else ["c", "d"] for i in range(10)]
+    assert llm.get_responses_batch(prompts, options) == ["d", "b"] * 5
+    assert llm._pool.qsize() <= 2
+    llm.close()
+    assert all("grammar" not in body for body in stub_server.requests)
+
+
+def test_http_backend_retries(stub_server) -> None:
+    """Transient failures are retried, persistent ones raise LLMError.
+
+    Args:
+        stub_server: Running stub server
+    """
+    llm = HttpLLMBackend(stub_server.url, max_retries=2, backoff=0.0)
+    stub_server.failures = 2
+    assert llm.get_response("prompt", ["yes", "no"]) == "no"
+    assert len(stub_server.requests) == 3
+
+    stub_server.failures = 3
+    with pytest.raises(LLMError):
+        llm.get_response("prompt", ["yes", "no"])
+
+    stub_server.failures = 1
+    stub_server.fail_status = 400
+    with pytest.raises(LLMError):
+        llm.get_response("prompt", ["yes", "no"])
+    llm.close()
+
+
+def test_http_backend_invalid_url() -> None:
+    """Non-HTTP URLs are rejected."""
+    with pytest.raises(LLMError):
+        HttpLLMBackend("ftp://localhost")
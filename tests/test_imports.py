@@ -0,0 +1,35 @@
+"""Tests for the package import graph."""
+
+import subprocess
+import sys
+
+import pytest
+
+import llm_tree_classifier
+
+
+def test_import_is_lightweight() -> None:
+    """Importing the package loads no backend and configures no logging."""
+    code = (
+        "import logging, sys\n"
+        "import llm_tree_classifier\n"
+        "from llm_tree_classifier.classifier import load_trees\n"
+        "heavy = ('llama_cpp', 'numpy', 'asyncio')\n"
+        "print(sorted(m for m in heavy if m in sys.modules))\n"
+        "print(len(logging.getLogger().handlers))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout.split("\n")
+    assert output[0] == "[]"
+    assert output[1] == "0"
+
+
+def test_lazy_attributes() -> None:
+    """Backends resolve on first access and unknown names still fail."""
+    from llm_tree_classifier.llm.cache import CachingBackend
+
+    assert llm_tree_classifier.CachingBackend is CachingBackend
+    assert "LlamaCppBackend" in dir(llm_tree_classifier)
+    with pytest.raises(AttributeError):
+        _ = llm_tree_classifier.MissingBackend
@@ -0,0 +1,117 @@
+"""Tests for traversal instrumentation."""
+
+import json
+from typing import Iterator, List
+
+import pytest
+
+from llm_tree_classifier import instrumentation
+from llm_tree_classifier.classifier import MultiTreeClassifier, TreeClassifier
+from llm_tree_classifier.instrumentation import Hooks, MetricsRecorder
+from llm_tree_classifier.llm.cache import CachingBackend
+from llm_tree_classifier.llm.simulated import SimulatedLLMBackend
+
+
+@pytest.fixture
+def recorder() -> Iterator[MetricsRecorder]:
+    """Install a metrics recorder for one test.
+
+    Yields:
+        The installed recorder
+    """
+    recorder = instrumentation.enable()
+    yield recorder
+    instrumentation.disable()
+
+
+def test_node_metrics(recorder, branching_config, mock_llm) -> None:
+    """Visits, timing and fallbacks are recorded per node.
+
+    Args:
+        recorder: Installed recorder
+        branching_config: Tree configuration whose answer matters
+        mock_llm: Mock LLM backend
+    """
+    mock_llm.get_response.side_effect = ["yes", "maybe"]
+    mock_llm.get_responses_batch.side_effect = lambda prompts, options: [
+        "no" for _ in prompts
+    ]
+    classifier = TreeClassifier(branching_config, mock_llm)
+    assert classifier.classify("a") == ["test_tree"]
+    # "maybe" matches no option and falls back to the first one
+    assert classifier.classify("b") == ["test_tree"]
+    assert classifier.classify_batch(["c", "d"]) == [[], []]
+
+    (node,) = recorder.snapshot()["nodes"]
+    assert node["tree"] == "test_tree"
+    assert node["question"] == "Is this a test?"
+    assert node["visits"] == 4
+    assert node["fallbacks"] == 1
+    assert node["seconds"] >= node["max_seconds"] >= 0
+
+
+def test_backend_metrics(recorder, branching_config) -> None:
+    """Backends report tokens and cache lookups.
+
+    Args:
+        recorder: Installed recorder
+        branching_config: Tree configuration whose answer matters
+    """
+    branching_config["trees"].append(
+        dict(branching_config["trees"][0], name="other_tree")
+    )
+    llm = CachingBackend(SimulatedLLMBackend())
+    classifier = MultiTreeClassifier(branching_config, llm)
+    classifier.classify("some words here")
+    classifier.classify("some words here")
+
+    snapshot = recorder.snapshot()
+    assert snapshot["cache_misses"] == 2
+    assert snapshot["cache_hits"] == 2
+    assert snapshot["prompt_tokens"] > 0
+    assert {node["tree"] for node in snapshot["nodes"]} == {"test_tree", "other_tree"}
+
+
+def test_exporters(recorder) -> None:
+    """Measurements are exported as Prometheus text and JSON.
+
+    Args:
+        recorder: Installed recorder
+    """
+    recorder.node_exit('tree "x"', 0, "Q?", "yes", 0.5, False)
+    recorder.tokens(10, 2)
+
+    text = recorder.to_prometheus()
+    assert "# TYPE llm_tree_node_seconds_total counter" in text
+    assert 'llm_tree_node_seconds_total{tree="tree \\"x\\"",node="0"} 0.5' in text
+    assert "llm_tree_prompt_tokens_total 10" in text
+    assert json.loads(recorder.to_json())["completion_tokens"] == 2
+
+    recorder.reset()
+    assert recorder.snapshot()["nodes"] == []
+
+
+def test_custom_hooks(branching_config, mock_llm) -> None:
+    """Custom hooks see node enter and exit events; disabling removes them.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+        mock_llm: Mock LLM backend
+    """
+    events: List[str] = []
+
+    class Recorder(Hooks):
+        def node_enter(self, tree: str, node: int) -> None:
+            events.append(f"enter {tree} {node}")
+
+        def node_exit(self, tree, node, question, response, seconds, fallback):
+            events.append(f"exit {tree} {node} {response}")
+
+    classifier = TreeClassifier(branching_config, mock_llm)
+    instrumentation.set_hooks(Recorder())
+    try:
+        classifier.classify("a")
+    finally:
+        instrumentation.disable()
+    classifier.classify("b")
+    assert events == ["enter test_tree 0", "exit test_tree 0 yes"]
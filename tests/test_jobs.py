@@ -0,0 +1,203 @@
+"""Tests for resumable bulk classification jobs."""
+
+import itertools
+import json
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from llm_tree_classifier.corpus import Corpus, index_path
+from llm_tree_classifier.dedup import Deduplicator
+from llm_tree_classifier.exceptions import JobError, LLMError
+from llm_tree_classifier.jobs import (
+    load_manifest,
+    merge_outputs,
+    plan_shards,
+    run_job,
+    shard_path,
+)
+
+
+class LengthClassifier:
+    """Labels texts by length and can crash after a number of batches."""
+
+    def __init__(self, fail_after: int = -1) -> None:
+        self.batches = 0
+        self.fail_after = fail_after
+
+    def classify_batch(self, texts: List[str]) -> List[List[str]]:
+        if self.batches == self.fail_after:
+            raise RuntimeError("worker crashed")
+        self.batches += 1
+        return [["long"] if len(text) > 6 else [] for text in texts]
+
+
+class RejectingClassifier(LengthClassifier):
+    """LengthClassifier whose backend rejects texts of length 7."""
+
+    def classify_batch(self, texts: List[str]) -> List[List[str]]:
+        if any(len(text) == 7 for text in texts):
+            raise LLMError("Prompt exceeds the context window")
+        return super().classify_batch(texts)
+
+
+class DedupClassifier(LengthClassifier):
+    """LengthClassifier that classifies one text per group of duplicates."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.dedup = Deduplicator()
+
+    def classify_batch(self, texts: List[str]) -> List[List[str]]:
+        return self.dedup.classify(texts, super().classify_batch)
+
+
+@pytest.fixture
+def corpus(tmp_path) -> Path:
+    """A JSONL file with 50 records, one blank line and one broken line.
+
+    Args:
+        tmp_path: Temporary directory
+
+    Returns:
+        Path of the file
+    """
+    lines = [json.dumps({"id": i, "text": "x" * (i % 10)}) for i in range(50)]
+    lines[20] = ""
+    lines[30] = "{broken"
+    path = tmp_path / "corpus.jsonl"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def test_plan_shards(corpus) -> None:
+    """Shards cover the file without gaps and only end at line boundaries.
+
+    Args:
+        corpus: Input file
+    """
+    data = corpus.read_bytes()
+    lines = data.decode().splitlines()
+    for shard_bytes in (1, 100, 333, len(data), 10 * len(data)):
+        shards = plan_shards(corpus, shard_bytes)
+        assert shards[0].start == 0 and shards[-1].end == len(data)
+        for before, after in itertools.pairwise(shards):
+            assert before.end == after.start
+            assert data[before.end - 1 : before.end] == b"\n"
+            assert after.start - before.start >= shard_bytes
+        with Corpus(corpus) as mapped:
+            read = [
+                line
+                for shard in shards
+                for line in mapped.view_bytes(shard.start, shard.end)
+            ]
+            with pytest.raises(ValueError):
+                mapped.view_bytes(1, len(data))
+        assert read == lines
+    assert len(plan_shards(corpus, 1)) == 50
+    assert index_path(corpus).exists()
+
+
+def test_resume_after_crash(corpus, tmp_path) -> None:
+    """A crashed job resumes at the interrupted shard with identical output.
+
+    Args:
+        corpus: Input file
+        tmp_path: Temporary directory
+    """
+    reference = tmp_path / "reference"
+    report = run_job(LengthClassifier(), corpus, reference, shard_bytes=300)
+    assert report.records == 49 and report.skipped == 0
+    merge_outputs(reference, tmp_path / "reference.jsonl")
+
+    job = tmp_path / "job"
+    with pytest.raises(RuntimeError):
+        run_job(LengthClassifier(fail_after=3), corpus, job, 300, batch_size=4)
+    done = sum(entry["records"] is not None for entry in load_manifest(job)["shards"])
+    assert 0 < done < report.shards
+    # The interrupted shard never reached its final name
+    assert not shard_path(job, done).exists()
+    with pytest.raises(JobError):
+        merge_outputs(job, tmp_path / "early.jsonl")
+
+    with pytest.raises(JobError):
+        run_job(LengthClassifier(), corpus, job, shard_bytes=300)
+    resumed = run_job(LengthClassifier(), corpus, job, 300, batch_size=4, resume=True)
+    assert resumed.skipped == done
+    assert resumed.records == report.records
+    assert merge_outputs(job, tmp_path / "job.jsonl") == 49
+    assert (tmp_path / "job.jsonl").read_bytes() == (
+        tmp_path / "reference.jsonl"
+    ).read_bytes()
+
+    records = [
+        json.loads(line)
+        for line in (tmp_path / "job.jsonl").read_text(encoding="utf-8").splitlines()
+    ]
+    assert [r.get("id") for r in records[:3]] == [0, 1, 2]
+    assert records[7]["classifications"] == ["long"]
+    assert "error" in records[29]
+
+
+def test_resume_rejects_changes(corpus, tmp_path) -> None:
+    """A job is only resumed with the input, settings and fingerprint it had.
+
+    Args:
+        corpus: Input file
+        tmp_path: Temporary directory
+    """
+    job = tmp_path / "job"
+    run_job(LengthClassifier(), corpus, job, shard_bytes=300, fingerprint="a")
+    # Resuming a finished job does no work
+    assert run_job(
+        LengthClassifier(fail_after=0), corpus, job, 300, resume=True, fingerprint="a"
+    ).skipped == len(load_manifest(job)["shards"])
+
+    with pytest.raises(JobError, match="fingerprint"):
+        run_job(LengthClassifier(), corpus, job, 300, resume=True, fingerprint="b")
+    with pytest.raises(JobError, match="shard_bytes"):
+        run_job(LengthClassifier(), corpus, job, 200, resume=True, fingerprint="a")
+    with corpus.open("a", encoding="utf-8") as f:
+        f.write('{"text": "more"}\n')
+    with pytest.raises(JobError, match="input"):
+        run_job(LengthClassifier(), corpus, job, 300, resume=True, fingerprint="a")
+
+
+def test_dedup_scoped_per_shard(corpus, tmp_path) -> None:
+    """Duplicates are grouped within a shard, so resuming changes nothing.
+
+    Args:
+        corpus: Input file
+        tmp_path: Temporary directory
+    """
+    classifier = DedupClassifier()
+    report = run_job(classifier, corpus, tmp_path / "job", shard_bytes=300)
+    # Each shard classifies its own distinct texts again
+    assert report.shards > 1 and classifier.dedup.stats()["misses"] > 10
+    merge_outputs(tmp_path / "job", tmp_path / "dedup.jsonl")
+
+    run_job(LengthClassifier(), corpus, tmp_path / "plain", shard_bytes=300)
+    merge_outputs(tmp_path / "plain", tmp_path / "plain.jsonl")
+    assert (tmp_path / "dedup.jsonl").read_bytes() == (
+        tmp_path / "plain.jsonl"
+    ).read_bytes()
+
+
+def test_rejected_record_does_not_stop_job(corpus, tmp_path) -> None:
+    """Records the backend rejects get an error and the job finishes.
+
+    Args:
+        corpus: Input file
+        tmp_path: Temporary directory
+    """
+    report = run_job(RejectingClassifier(), corpus, tmp_path / "job", 300)
+    assert report.records == 49
+    merge_outputs(tmp_path / "job", tmp_path / "job.jsonl")
+    records = [
+        json.loads(line)
+        for line in (tmp_path / "job.jsonl").read_text(encoding="utf-8").splitlines()
+    ]
+    rejected = [r["id"] for r in records if "context window" in r.get("error", "")]
+    assert rejected == [7, 17, 27, 37, 47]
+    assert records[8]["classifications"] == ["long"]
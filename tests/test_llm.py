@@ -1,10 +1,15 @@
 """Tests for the LLM backend."""
 
-import pytest
+import ctypes
+import threading
 from typing import List
 
-from llm_tree_classifier.llm.llama_cpp import LlamaCppBackend
+import numpy as np
+import pytest
+
 from llm_tree_classifier.exceptions import LLMError
+from llm_tree_classifier.llm.llama_cpp import LlamaCppBackend
+from llm_tree_classifier.prompts import build_prompt
 
 
 def test_llama_cpp_initialization(mocker) -> None:
@@ -14,20 +19,17 @@ def test_llama_cpp_initialization(mocker) -> None:
         mocker: Pytest mocker fixture
     """
     # Mock llama_cpp.Llama
-    mock_llama = mocker.patch("llama_cpp.Llama")
-    mock_llama.return_value = mocker.Mock()
+    mock_llama = mocker.patch(
+        "llm_tree_classifier.llm.llama_cpp.Llama", side_effect=FakeLlama
+    )
 
     # Initialize backend
     backend = LlamaCppBackend(
-        model_path="test_model.bin",
-        n_ctx=512,
-        n_batch=512,
-        n_threads=4,
-        n_gpu_layers=0
+        model_path="test_model.bin", n_ctx=512, n_batch=512, n_threads=4, n_gpu_layers=0
     )
 
     # Verify initialization
-    assert backend.model is not None
+    assert isinstance(backend.model, FakeLlama)
     mock_llama.assert_called_once()
 
 
@@ -38,7 +40,7 @@ def test_llama_cpp_initialization_error(mocker) -> None:
         mocker: Pytest mocker fixture
     """
     # Mock llama_cpp.Llama to raise an error
-    mock_llama = mocker.patch("llama_cpp.Llama")
+    mock_llama = mocker.patch("llm_tree_classifier.llm.llama_cpp.Llama")
     mock_llama.side_effect = Exception("Test error")
 
     # Verify initialization raises LLMError
@@ -48,7 +50,7 @@ def test_llama_cpp_initialization_error(mocker) -> None:
             n_ctx=512,
             n_batch=512,
             n_threads=4,
-            n_gpu_layers=0
+            n_gpu_layers=0,
         )
 
 
@@ -59,27 +61,16 @@ def test_get_response(mocker) -> None:
         mocker: Pytest mocker fixture
     """
     # Mock llama_cpp.Llama
-    mock_llama = mocker.patch("llama_cpp.Llama")
-    mock_model = mocker.Mock()
-    mock_model.create_completion.return_value = {
-        "choices": [{"text": "yes"}]
-    }
-    mock_llama.return_value = mock_model
+    mocker.patch("llm_tree_classifier.llm.llama_cpp.Llama", FakeLlama)
 
     # Initialize backend
     backend = LlamaCppBackend(
-        model_path="test_model.bin",
-        n_ctx=512,
-        n_batch=512,
-        n_threads=4,
-        n_gpu_layers=0
+        model_path="test_model.bin", n_ctx=512, n_batch=512, n_threads=4, n_gpu_layers=0
     )
 
     # Test response
     response = backend.get_response(
-        question="Is this a test?",
-        text="This is a test",
-        valid_options=["yes", "no"]
+        build_prompt("This is a test", "Is this a test?"), ["yes", "no"]
     )
     assert response == "yes"
 
@@ -91,24 +82,322 @@ def test_get_response_error(mocker) -> None:
         mocker: Pytest mocker fixture
     """
     # Mock llama_cpp.Llama
-    mock_llama = mocker.patch("llama_cpp.Llama")
-    mock_model = mocker.Mock()
-    mock_model.create_completion.side_effect = Exception("Test error")
-    mock_llama.return_value = mock_model
+    mocker.patch("llm_tree_classifier.llm.llama_cpp.Llama", FakeLlama)
 
     # Initialize backend
     backend = LlamaCppBackend(
-        model_path="test_model.bin",
-        n_ctx=512,
-        n_batch=512,
-        n_threads=4,
-        n_gpu_layers=0
+        model_path="test_model.bin", n_ctx=512, n_batch=512, n_threads=4, n_gpu_layers=0
+    )
+    mocker.patch.object(
+        backend.model, "create_completion", side_effect=Exception("Test error")
     )
 
     # Test error handling
     with pytest.raises(LLMError):
         backend.get_response(
-            question="Is this a test?",
-            text="This is a test",
-            valid_options=["yes", "no"]
-        ) 
\ No newline at end of file
+            build_prompt("This is a test", "Is this a test?"), ["yes", "no"]
+        )
+
+
+class FakeContext:
+    """Stand-in for the llama.cpp context that prefers the answer "no"."""
+
+    def get_logits_ith(self, i: int):
+        logits = (ctypes.c_float * 256)()
+        logits[ord("n")] = logits[ord("o")] = 5.0
+        return logits
+
+
+class FakeLlama:
+    """Minimal stand-in for llama_cpp.Llama that tracks evaluated tokens."""
+
+    def __init__(self, **kwargs) -> None:
+        self.input_ids = np.zeros(4096, dtype=np.intc)
+        self.n_tokens = 0
+        self.evaluated = 0
+        self.states = 0
+        self._ctx = FakeContext()
+        self.completions: List[dict] = []
+
+    def n_vocab(self) -> int:
+        return 256
+
+    def tokenize(self, text: bytes, add_bos: bool = True) -> List[int]:
+        return ([1] if add_bos else []) + list(text)
+
+    def eval(self, tokens: List[int]) -> None:
+        self.input_ids[self.n_tokens : self.n_tokens + len(tokens)] = tokens
+        self.n_tokens += len(tokens)
+        self.evaluated += len(tokens)
+
+    def save_state(self):
+        self.states += 1
+        return (self.input_ids.copy(), self.n_tokens)
+
+    def load_state(self, state) -> None:
+        self.input_ids, self.n_tokens = state[0].copy(), state[1]
+
+    def create_completion(self, tokens: List[int], **kwargs):
+        self.completions.append(kwargs)
+        # Pretend the whole prompt ends up in the context
+        common = 0
+        for a, b in zip(self.input_ids[: self.n_tokens].tolist(), tokens, strict=False):
+            if a != b:
+                break
+            common += 1
+        self.n_tokens = common
+        self.eval(tokens[common:])
+        return {"choices": [{"text": "yes"}]}
+
+
+@pytest.fixture
+def fake_backend(mocker) -> LlamaCppBackend:
+    """LlamaCppBackend running on FakeLlama.
+
+    Args:
+        mocker: Pytest mocker fixture
+
+    Returns:
+        Backend with a fake model
+    """
+    mocker.patch("llm_tree_classifier.llm.llama_cpp.Llama", FakeLlama)
+    return LlamaCppBackend(model_path="test_model.bin", prefix_cache_size=2)
+
+
+def test_prefix_reused_across_nodes(fake_backend) -> None:
+    """Deeper nodes of one document only evaluate their question suffix.
+
+    Args:
+        fake_backend: Backend with a fake model
+    """
+    text = "some long document " * 20
+    fake_backend.get_response(build_prompt(text, "First?"), ["yes", "no"])
+    first = fake_backend.model.evaluated
+    fake_backend.get_response(build_prompt(text, "Second?"), ["yes", "no"])
+    second = fake_backend.model.evaluated - first
+
+    assert second < len(text)
+    assert fake_backend.model.states == 0
+
+
+def test_prefix_cache_restores_evicted_document(fake_backend) -> None:
+    """Interleaved documents are saved once they return, then restored.
+
+    Args:
+        fake_backend: Backend with a fake model
+    """
+    text_a = "document a " * 20
+    text_b = "document b " * 20
+    for text in (text_a, text_b):
+        fake_backend.get_response(build_prompt(text, "Q?"), ["yes", "no"])
+    assert fake_backend.model.states == 0
+
+    for text in (text_a, text_b):
+        fake_backend.get_response(build_prompt(text, "Again?"), ["yes", "no"])
+    assert fake_backend.model.states == 2
+
+    before = fake_backend.model.evaluated
+    fake_backend.get_response(build_prompt(text_a, "Other?"), ["yes", "no"])
+    assert fake_backend.model.evaluated - before < len(text_a)
+    assert fake_backend.model.states == 2
+
+
+def test_grammar_compiled_once(fake_backend) -> None:
+    """Each option set is compiled into one LlamaGrammar, reused across calls.
+
+    Args:
+        fake_backend: Backend with a fake model
+    """
+    from llama_cpp import LlamaGrammar
+
+    fake_backend.warm_up([("First?", ["yes", "no"]), ("Second?", ["a", "b"])])
+    assert len(fake_backend._grammars) == 2
+
+    for text in ("one", "two"):
+        assert (
+            fake_backend.get_response(build_prompt(text, "First?"), ["yes", "no"])
+            == "yes"
+        )
+    first, second = (c["grammar"] for c in fake_backend.model.completions)
+    assert isinstance(first, LlamaGrammar)
+    assert first is second
+    assert '"yes" | "no"' in first._grammar
+    assert len(fake_backend._grammars) == 2
+
+
+def test_logprob_scoring(mocker) -> None:
+    """Logprob mode picks the most likely option without sampling.
+
+    Args:
+        mocker: Pytest mocker fixture
+    """
+    mocker.patch("llm_tree_classifier.llm.llama_cpp.Llama", FakeLlama)
+    backend = LlamaCppBackend(model_path="test_model.bin", scoring="logprob")
+    backend.model.create_completion = mocker.Mock()
+
+    prompt = build_prompt("some text", "Is this a test?")
+    scores = backend.score_responses(prompt, ["yes", "no"])
+    answer = backend.get_response(prompt, ["yes", "no"])
+
+    assert answer == "no"
+    assert scores["no"] > scores["yes"]
+    backend.model.create_completion.assert_not_called()
+
+
+def test_unknown_scoring_mode() -> None:
+    """An unknown scoring mode is rejected."""
+    with pytest.raises(LLMError):
+        LlamaCppBackend(model_path="test_model.bin", scoring="beam")
+
+
+class FakeBatchContext(FakeContext):
+    """Stand-in for the multi-sequence batch context."""
+
+    def __init__(self) -> None:
+        self.decoded = 0
+        self.copies = 0
+
+    def kv_cache_clear(self) -> None:
+        pass
+
+    def kv_cache_seq_cp(self, src: int, dst: int, p0: int, p1: int) -> None:
+        self.copies += 1
+
+    def decode(self, batch) -> None:
+        self.decoded += batch.batch.n_tokens
+
+
+def test_get_responses_batch(mocker) -> None:
+    """Batched prompts are decoded together and scored like single prompts.
+
+    Args:
+        mocker: Pytest mocker fixture
+    """
+    mocker.patch("llm_tree_classifier.llm.llama_cpp.Llama", FakeLlama)
+    backend = LlamaCppBackend(model_path="test_model.bin", scoring="logprob")
+    ctx = FakeBatchContext()
+    mocker.patch.object(backend, "_get_batch_context", return_value=ctx)
+
+    prompts = [build_prompt(f"text {i}", "Is this a test?") for i in range(3)]
+    options = [["yes", "no"]] * 3
+    answers = backend.get_responses_batch(prompts, options)
+    scores = backend.score_responses_batch(prompts, options)
+
+    assert answers == ["no", "no", "no"]
+    assert scores[0] == pytest.approx(backend.score_responses(prompts[0], options[0]))
+    assert ctx.decoded > 0
+
+
+@pytest.mark.parametrize("scoring", ["grammar", "logprob"])
+def test_batch_answers_match_single(mocker, scoring) -> None:
+    """A prompt gets the same answer alone and in a batch, in every mode.
+
+    Args:
+        mocker: Pytest mocker fixture
+        scoring: Scoring mode of the backend
+    """
+    mocker.patch("llm_tree_classifier.llm.llama_cpp.Llama", FakeLlama)
+    backend = LlamaCppBackend(model_path="test_model.bin", scoring=scoring)
+    mocker.patch.object(backend, "_get_batch_context", return_value=FakeBatchContext())
+    prompts = [build_prompt(f"text {i}", "Is this a test?") for i in range(3)]
+    options = [["yes", "no"]] * 3
+
+    single = [backend.get_response(p, o) for p, o in zip(prompts, options, strict=True)]
+    assert backend.get_responses_batch(prompts, options) == single
+
+
+def test_micro_batch_is_one_batched_decode(mocker) -> None:
+    """Concurrent prompts merged by MicroBatchingBackend are decoded together.
+
+    Args:
+        mocker: Pytest mocker fixture
+    """
+    from llm_tree_classifier.llm.batching import MicroBatchingBackend
+
+    mocker.patch("llm_tree_classifier.llm.llama_cpp.Llama", FakeLlama)
+    backend = LlamaCppBackend(model_path="test_model.bin", scoring="logprob")
+    mocker.patch.object(backend, "_get_batch_context", return_value=FakeBatchContext())
+    score_batch = mocker.spy(backend, "score_responses_batch")
+    single = mocker.spy(backend, "get_response")
+    llm = MicroBatchingBackend(backend, max_batch_size=4, max_wait=5.0)
+
+    results: List[str] = []
+    threads = [
+        threading.Thread(
+            target=lambda i=i: results.append(
+                llm.get_response(build_prompt(f"text {i}", "Q?"), ["yes", "no"])
+            )
+        )
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    llm.close()
+
+    assert results == ["no"] * 4
+    score_batch.assert_called_once()
+    assert len(score_batch.call_args.args[0]) == 4
+    single.assert_not_called()
+
+
+def test_get_responses_batch_shares_document(mocker) -> None:
+    """A document shared by several prompts of a batch is decoded once.
+
+    Args:
+        mocker: Pytest mocker fixture
+    """
+    mocker.patch("llm_tree_classifier.llm.llama_cpp.Llama", FakeLlama)
+    backend = LlamaCppBackend(model_path="test_model.bin", scoring="logprob")
+    options = [["yes", "no"]] * 3
+
+    decoded = []
+    for texts in (["same text"] * 3, ["text a1", "text b2", "text c3"]):
+        ctx = FakeBatchContext()
+        mocker.patch.object(backend, "_get_batch_context", return_value=ctx)
+        prompts = [build_prompt(text, f"Question {i}?") for i, text in enumerate(texts)]
+        scores = backend.score_responses_batch(prompts, options)
+        single = backend.score_responses(prompts[1], options[1])
+        assert scores[1] == pytest.approx(single)
+        decoded.append(ctx.decoded)
+
+    assert decoded[0] < decoded[1]
+
+
+def test_backends_share_registry_model(mocker) -> None:
+    """Backends with the same model and load parameters share one Llama.
+
+    Args:
+        mocker: Pytest mocker fixture
+    """
+    from llm_tree_classifier.llm.registry import ModelRegistry
+
+    llama = mocker.patch("llm_tree_classifier.llm.llama_cpp.Llama")
+    registry = ModelRegistry(ttl=0, loader=FakeLlama)
+    first = LlamaCppBackend("test_model.bin", registry=registry)
+    second = LlamaCppBackend("test_model.bin", registry=registry)
+    mlocked = LlamaCppBackend("test_model.bin", use_mlock=True, registry=registry)
+
+    assert first.model is second.model is not mlocked.model
+    assert registry.loads == 2 and not llama.called
+    assert first.get_response(build_prompt("a", "Q?"), ["yes", "no"]) == "yes"
+    assert second.get_response(build_prompt("b", "Q?"), ["yes", "no"]) == "yes"
+
+    # The batch context belongs to the shared model
+    mocker.patch.object(
+        LlamaCppBackend, "_create_batch_context", side_effect=mocker.Mock
+    )
+    with first._model_lock:
+        context = first._get_batch_context()
+    assert second._get_batch_context() is context
+    assert mlocked._get_batch_context() is not context
+
+    first.close()
+    del second
+    mlocked.close()
+    assert len(registry) == 0
+    context.close.assert_called_once()
+
+    LlamaCppBackend("test_model.bin", use_mmap=False, prefix_cache_size=0)
+    assert llama.call_args.kwargs["use_mmap"] is False
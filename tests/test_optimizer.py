@@ -0,0 +1,111 @@
+"""Tests for the static tree optimizer."""
+
+from llm_tree_classifier.optimizer import optimize_tree
+from llm_tree_classifier.tree import DecisionNode, DecisionTree
+
+
+def make_root() -> DecisionNode:
+    """Build a tree with a foldable node and duplicated subtrees.
+
+    Returns:
+        Root node. "Detail?" always ends in "yes", and both branches of
+        "Sure?" repeat the same "Recent?" subtree.
+    """
+    recent = {
+        "question": "Recent?",
+        "options": [
+            {"value": "yes", "next": {"label": "yes"}},
+            {"value": "no", "next": {"label": "no"}},
+        ],
+    }
+    return DecisionNode.from_dict(
+        {
+            "question": "Topic?",
+            "options": [
+                {
+                    "value": "a",
+                    "next": {
+                        "question": "Detail?",
+                        "options": [
+                            {"value": "x", "next": {"label": "yes"}},
+                            {"value": "y", "next": {"label": "yes"}},
+                        ],
+                    },
+                },
+                {
+                    "value": "b",
+                    "next": {
+                        "question": "Sure?",
+                        "options": [
+                            {"value": "yes", "next": recent},
+                            {"value": "no", "next": recent},
+                        ],
+                    },
+                },
+                {"value": "c", "next": recent},
+            ],
+        }
+    )
+
+
+def test_optimize_folds_and_merges() -> None:
+    """Foldable nodes disappear and identical subtrees are shared."""
+    root = make_root()
+    optimized, report = optimize_tree(root)
+
+    assert optimized.question == "Topic?"
+    a, b, c = (option["next"] for option in optimized.options)
+    assert a.label == "yes"
+    assert b is c
+    assert b.question == "Recent?"
+    assert b.options[0]["next"] is a
+    # Input nodes are left untouched
+    assert root.options[0]["next"].question == "Detail?"
+
+    assert report.nodes_before == 14
+    assert report.nodes_after == 4
+    assert report.folded_nodes == 2
+    assert report.max_calls_saved == 1
+
+
+def test_optimize_reports_paths() -> None:
+    """Calls saved are reported for every original path."""
+    _, report = optimize_tree(make_root())
+    saved = {path.answers: path.calls_saved for path in report.paths}
+    assert saved == {
+        ("a", "x"): 1,
+        ("a", "y"): 1,
+        ("b", "yes", "yes"): 1,
+        ("b", "yes", "no"): 1,
+        ("b", "no", "yes"): 1,
+        ("b", "no", "no"): 1,
+        ("c", "yes"): 0,
+        ("c", "no"): 0,
+    }
+    assert report.summary()["paths"][0] == {
+        "answers": ["a", "x"],
+        "label": "yes",
+        "calls_before": 2,
+        "calls_after": 1,
+        "calls_saved": 1,
+    }
+
+
+def test_tree_classify_uses_optimized_plan(mocker) -> None:
+    """Folded nodes are never sent to the backend.
+
+    Args:
+        mocker: Pytest mocker fixture
+    """
+    tree = DecisionTree("topics", make_root())
+    llm = mocker.Mock()
+    llm.get_response.side_effect = ["b", "no"]
+    assert not tree.classify("text", llm)
+    assert [call.args[1] for call in llm.get_response.call_args_list] == [
+        ["a", "b", "c"],
+        ["yes", "no"],
+    ]
+
+    unoptimized = DecisionTree("topics", make_root(), optimize=False)
+    assert unoptimized.optimization is None
+    assert len(unoptimized.compiled) == 14
@@ -0,0 +1,79 @@
+"""Tests for multi-process classification."""
+
+import functools
+import os
+from pathlib import Path
+from typing import List
+
+from llm_tree_classifier.dedup import Deduplicator
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.parallel import ParallelTreeClassifier
+
+
+class EchoBackend(LLMBackend):
+    """Answers "no" for texts containing "skip" and "yes" otherwise."""
+
+    def __init__(self, crash_marker: str = "") -> None:
+        self.crash_marker = crash_marker
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        if "crash" in prompt and self.crash_marker:
+            marker = Path(self.crash_marker)
+            if not marker.exists():
+                marker.touch()
+                os._exit(1)
+        return "no" if "skip" in prompt else "yes"
+
+
+CONFIG = {
+    "trees": [
+        {
+            "name": "keep",
+            "root": {
+                "question": "Keep?",
+                "options": [
+                    {"value": "yes", "next": {"label": "yes"}},
+                    {"value": "no", "next": {"label": "no"}},
+                ],
+            },
+        }
+    ]
+}
+
+
+def test_parallel_results_in_order() -> None:
+    """Results come back in input order across workers."""
+    texts = [f"text {i}" if i % 3 else f"skip {i}" for i in range(25)]
+    with ParallelTreeClassifier(
+        CONFIG, backend_factory=EchoBackend, n_workers=2, chunk_size=4
+    ) as classifier:
+        results = classifier.classify_batch(texts)
+    assert results == [["keep"] if i % 3 else [] for i in range(25)]
+
+
+def test_parallel_dedup() -> None:
+    """Only one text per duplicate group is sent to the workers."""
+    texts = [f"text {i % 4}" if i % 3 else "skip" for i in range(25)]
+    dedup = Deduplicator()
+    with ParallelTreeClassifier(
+        CONFIG, backend_factory=EchoBackend, n_workers=2, chunk_size=2, dedup=dedup
+    ) as classifier:
+        results = classifier.classify_batch(texts)
+    assert results == [["keep"] if i % 3 else [] for i in range(25)]
+    assert dedup.stats()["misses"] == 5
+
+
+def test_parallel_restarts_crashed_worker(tmp_path) -> None:
+    """A crashed worker pool is restarted and the chunks are retried.
+
+    Args:
+        tmp_path: Pytest temporary directory
+    """
+    factory = functools.partial(EchoBackend, str(tmp_path / "crashed"))
+    texts = ["a", "b", "crash", "c", "skip"]
+    with ParallelTreeClassifier(
+        CONFIG, backend_factory=factory, n_workers=2, chunk_size=2
+    ) as classifier:
+        results = list(classifier.classify_many(texts))
+        assert classifier.restarts == 1
+    assert results == [["keep"], ["keep"], ["keep"], ["keep"], []]
@@ -0,0 +1,157 @@
+"""Tests for the record-and-replay backends."""
+
+import json
+
+import pytest
+
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.exceptions import LLMError
+from llm_tree_classifier.llm.recording import RecordingBackend, ReplayBackend
+from llm_tree_classifier.llm.simulated import SimulatedLLMBackend
+from llm_tree_classifier.prompts import build_prompt
+
+
+def test_replay_reproduces_recorded_run(branching_config, tmp_path) -> None:
+    """A replayed run answers every prompt from the file without a model.
+
+    Args:
+        branching_config: Tree configuration whose answers change the label
+        tmp_path: Temporary directory
+    """
+    path = tmp_path / "run.jsonl"
+    texts = [f"document {i}" for i in range(20)]
+    live = SimulatedLLMBackend(seed=3)
+    with RecordingBackend(live, path) as recorder:
+        expected = TreeClassifier(branching_config, recorder).classify_batch(texts)
+        assert recorder.records == live.prompts
+
+    replay = ReplayBackend(path)
+    assert len(replay) == live.prompts
+    assert replay.model_id == live.model_id
+    classifier = TreeClassifier(branching_config, replay)
+    assert classifier.classify_batch(texts) == expected
+    assert [classifier.classify(text) for text in texts] == expected
+    assert replay.misses == 0
+
+    with pytest.raises(LLMError):
+        classifier.classify("never recorded")
+
+
+def test_recording_stores_each_document_once(tmp_path) -> None:
+    """Documents are written once and decisions refer to them by hash.
+
+    Args:
+        tmp_path: Temporary directory
+    """
+    path = tmp_path / "run.jsonl"
+    prompts = [
+        build_prompt("a long shared document", f"Question {i}?") for i in range(5)
+    ]
+    with RecordingBackend(SimulatedLLMBackend(), path, record_scores=True) as recorder:
+        recorder.get_responses_batch(prompts, [["yes", "no"]] * 5)
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert "model" in records[0]
+    assert sum("text" in record for record in records) == 1
+    decisions = [record for record in records if "a" in record]
+    assert len(decisions) == 5
+    assert all(set(record["s"]) == {"yes", "no"} for record in decisions)
+
+    replay = ReplayBackend(path)
+    scores = replay.score_responses(prompts[0], ["yes", "no"])
+    assert max(scores, key=scores.__getitem__) == decisions[0]["a"]
+
+
+def test_replay_falls_through_on_misses(tmp_path) -> None:
+    """Only unrecorded prompts reach the live backend, and can be recorded.
+
+    Args:
+        tmp_path: Temporary directory
+    """
+    path = tmp_path / "run.jsonl"
+    prompts = [build_prompt(f"doc {i}", "Is it?") for i in range(6)]
+    options = [["yes", "no"]] * 6
+    with RecordingBackend(SimulatedLLMBackend(), path) as recorder:
+        expected = recorder.get_responses_batch(prompts[:4], options[:4])
+
+    live = SimulatedLLMBackend()
+    with RecordingBackend(live, path) as recorder:
+        replay = ReplayBackend(path, backend=recorder)
+        answers = replay.get_responses_batch(prompts, options)
+    assert answers[:4] == expected
+    assert live.prompts == 2
+    assert (replay.hits, replay.misses) == (4, 2)
+    assert len(ReplayBackend(path)) == 6
+
+
+def test_replay_skips_truncated_lines(tmp_path) -> None:
+    """A line cut short by an interrupted run does not prevent loading.
+
+    Args:
+        tmp_path: Temporary directory
+    """
+    path = tmp_path / "run.jsonl"
+    prompt = build_prompt("doc", "Is it?")
+    with RecordingBackend(SimulatedLLMBackend(), path) as recorder:
+        answer = recorder.get_response(prompt, ["yes", "no"])
+    with open(path, "a") as f:
+        f.write('{"d":"abc","q":"Quest')
+
+    assert ReplayBackend(path).get_response(prompt, ["yes", "no"]) == answer
+    with pytest.raises(LLMError):
+        ReplayBackend(tmp_path / "missing.jsonl")
+
+
+def test_records_are_flushed_per_call(tmp_path) -> None:
+    """Decisions reach the file before the recorder is closed.
+
+    Args:
+        tmp_path: Temporary directory
+    """
+    path = tmp_path / "run.jsonl"
+    prompts = [build_prompt(f"doc {i}", "Is it?") for i in range(3)]
+    recorder = RecordingBackend(SimulatedLLMBackend(), path)
+    recorder.get_response(prompts[0], ["yes", "no"])
+    recorder.get_responses_batch(prompts[1:], [["yes", "no"]] * 2)
+
+    assert len(ReplayBackend(path)) == 3
+    recorder.close()
+
+
+def test_append_after_truncated_line(tmp_path) -> None:
+    """A run appending to an interrupted recording starts on a new line.
+
+    Args:
+        tmp_path: Temporary directory
+    """
+    path = tmp_path / "run.jsonl"
+    prompts = [build_prompt(f"doc {i}", "Is it?") for i in range(2)]
+    with RecordingBackend(SimulatedLLMBackend(), path) as recorder:
+        recorder.get_response(prompts[0], ["yes", "no"])
+    with open(path, "a") as f:
+        f.write('{"d":"abc","q":"Quest')
+
+    second = SimulatedLLMBackend(seed=1)
+    with RecordingBackend(second, path) as recorder:
+        recorder.get_response(prompts[1], ["yes", "no"])
+    replay = ReplayBackend(path)
+    assert len(replay) == 2
+    # The second run's header was not glued to the truncated line
+    assert replay.recorded_model_id == second.model_id
+
+
+def test_replay_warns_about_other_fallback_model(tmp_path, caplog) -> None:
+    """A fallback backend for a different model is reported.
+
+    Args:
+        tmp_path: Temporary directory
+        caplog: Log capture fixture
+    """
+    path = tmp_path / "run.jsonl"
+    with RecordingBackend(SimulatedLLMBackend(), path) as recorder:
+        recorder.get_response(build_prompt("doc", "Is it?"), ["yes", "no"])
+
+    ReplayBackend(path, backend=SimulatedLLMBackend())
+    assert "different models" not in caplog.text
+    ReplayBackend(path, backend=SimulatedLLMBackend(seed=1))
+    assert "different models" in caplog.text
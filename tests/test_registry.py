@@ -0,0 +1,89 @@
+"""Tests for the shared model registry."""
+
+import time
+from typing import ClassVar, List
+
+import pytest
+
+from llm_tree_classifier.llm.registry import ModelRegistry
+
+
+class FakeModel:
+    """Model stand-in recording its load parameters and whether it was closed."""
+
+    loaded: ClassVar[List["FakeModel"]] = []
+
+    def __init__(self, model_path: str, **params) -> None:
+        self.model_path = model_path
+        self.params = params
+        self.closed = False
+        FakeModel.loaded.append(self)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def clear_loaded() -> None:
+    """Start every test without loaded fake models."""
+    FakeModel.loaded.clear()
+
+
+def test_handles_share_models(tmp_path) -> None:
+    """Equal paths and parameters share a model; others load their own.
+
+    Args:
+        tmp_path: Temporary directory
+    """
+    registry = ModelRegistry(ttl=0, loader=FakeModel)
+    path = str(tmp_path / "model.gguf")
+    first = registry.acquire(path, n_ctx=512, use_mlock=False)
+    second = registry.acquire(
+        str(tmp_path / "." / "model.gguf"), use_mlock=False, n_ctx=512
+    )
+    other = registry.acquire(path, n_ctx=512, use_mlock=True)
+
+    assert first.model is second.model and first.lock is second.lock
+    assert other.model is not first.model
+    assert other.model.params == {"n_ctx": 512, "use_mlock": True}
+    assert registry.loads == 2 and len(registry) == 2
+    assert sorted(s["refs"] for s in registry.stats()) == [1, 2]
+
+    context = first.context("batch", lambda: FakeModel("context"))
+    assert second.context("batch", lambda: FakeModel("other")) is context
+    assert other.context("batch", lambda: FakeModel("other")) is not context
+
+    first.release()
+    first.release()
+    assert not second.model.closed
+    with second:
+        pass
+    assert second.model.closed and context.closed and len(registry) == 1
+    other.release()
+    assert len(registry) == 0
+
+
+def test_idle_models_unload_after_ttl() -> None:
+    """Unused models stay loaded for the TTL and are reused within it."""
+    registry = ModelRegistry(ttl=0.1, loader=FakeModel)
+    registry.acquire("a.gguf").release()
+    handle = registry.acquire("a.gguf")
+    assert registry.loads == 1
+    handle.release()
+    assert registry.stats()[0]["idle"] is not None
+
+    deadline = time.monotonic() + 5
+    while len(registry) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert len(registry) == 0 and FakeModel.loaded[0].closed
+
+    kept = ModelRegistry(ttl=None, loader=FakeModel)
+    kept.acquire("b.gguf").release()
+    held = kept.acquire("c.gguf")
+    time.sleep(0.05)
+    assert kept.unload_idle(min_idle=10) == 0
+    assert kept.unload_idle() == 1
+    assert len(kept) == 1 and not held.model.closed
+
+    with pytest.raises(ValueError):
+        ModelRegistry(ttl=-1)
@@ -0,0 +1,154 @@
+"""Tests for node pre-decision rules."""
+
+import asyncio
+
+import pytest
+
+from llm_tree_classifier import instrumentation
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.rules import RuleSet
+from llm_tree_classifier.tree import DecisionNode, DecisionTree
+
+
+def test_rule_kinds_and_priority() -> None:
+    """The first rule in configuration order wins, wherever it matches."""
+    rules = RuleSet(
+        [
+            {"regex": "bc", "option": "b"},
+            {"keywords": ["Refund", "money back"], "option": "a"},
+            {"max_length": 3, "option": "c"},
+            {"regex": "ab", "option": "c"},
+        ],
+        ["a", "b", "c"],
+    )
+    assert len(rules) == 4
+    # "ab" matches first in the text, but the earlier "bc" rule wins
+    assert rules.match("xxabc") == "b"
+    assert rules.match("I want a REFUND now") == "a"
+    assert rules.match("give my money back") == "a"
+    assert rules.match("refunds please") is None
+    assert rules.match("ab") == "c"
+    assert rules.match("nothing to see") is None
+
+
+def test_rule_options() -> None:
+    """Case sensitivity can be switched and length rules take ranges."""
+    rules = RuleSet(
+        [
+            {"regex": "urgent", "ignore_case": True, "option": "yes"},
+            {"keywords": "c++", "ignore_case": False, "option": "yes"},
+            {"min_length": 5, "max_length": 10, "option": "no"},
+        ],
+        ["yes", "no"],
+    )
+    assert rules.match("URGENT: read this") == "yes"
+    assert rules.match("written in c++ mostly") == "yes"
+    assert rules.match("written in C++ mostly") is None
+    assert rules.match("short") == "no"
+    assert rules.match("tiny") is None
+
+
+def test_regexes_with_groups_and_global_flags() -> None:
+    """Backreferences and inline global flags keep their meaning."""
+    rules = RuleSet(
+        [
+            {"keywords": ["refund"], "option": "a"},
+            {"regex": r"(\w)\1", "option": "b"},
+            {"regex": r"(?x) order \s \#", "option": "c"},
+            {"regex": "(?P<word>ok)-(?P=word)", "ignore_case": True, "option": "a"},
+        ],
+        ["a", "b", "c"],
+    )
+    assert rules.match("a bookkeeper") == "b"
+    assert rules.match("no refund for the bookkeeper") == "a"
+    assert rules.match("my order #12") == "c"
+    assert rules.match("OK-ok then") == "a"
+    assert rules.match("abc") is None
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        {"keywords": ["x"], "option": "maybe"},
+        {"keywords": ["x"], "regex": "x", "option": "yes"},
+        {"option": "yes"},
+        {"regex": "(", "option": "yes"},
+        {"keywords": [], "option": "yes"},
+    ],
+)
+def test_invalid_rules(sample_config, rule) -> None:
+    """Malformed rules are rejected when the tree is loaded.
+
+    Args:
+        sample_config: Sample tree configuration
+        rule: Invalid rule configuration
+    """
+    sample_config["trees"][0]["root"]["rules"] = [rule]
+    with pytest.raises(ValueError):
+        TreeClassifier(sample_config, None)
+
+
+def test_rules_skip_llm(branching_config, mock_llm) -> None:
+    """The LLM is only asked when no rule fires, on every traversal path.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+        mock_llm: Mock LLM backend answering "yes"
+    """
+    branching_config["trees"][0]["root"]["rules"] = [
+        {"keywords": ["spam"], "option": "no"}
+    ]
+    mock_llm.get_responses_batch.side_effect = lambda prompts, options: [
+        "yes" for _ in prompts
+    ]
+    classifier = TreeClassifier(branching_config, mock_llm)
+    texts = ["buy spam now", "hello", "SPAM"]
+
+    assert [classifier.classify(text) for text in texts] == [[], ["test_tree"], []]
+    assert mock_llm.get_response.call_count == 1
+    assert classifier.classify_batch(texts) == [[], ["test_tree"], []]
+    (prompts, _), _ = mock_llm.get_responses_batch.call_args
+    assert len(prompts) == 1 and "hello" in prompts[0]
+
+    recorder = instrumentation.enable()
+    try:
+        assert classifier.classify("spam") == []
+        assert asyncio.run(classifier.aclassify_many(texts)) == [
+            [],
+            ["test_tree"],
+            [],
+        ]
+    finally:
+        instrumentation.disable()
+    (node,) = recorder.snapshot()["nodes"]
+    assert (node["rule_hits"], node["visits"]) == (3, 1)
+    assert "llm_tree_node_rule_hits_total" in recorder.to_prometheus()
+
+
+def test_optimizer_keeps_rules() -> None:
+    """Nodes that differ only in their rules are not merged."""
+
+    def node(rules):
+        return {
+            "question": "Q?",
+            "rules": rules,
+            "options": [
+                {"value": "yes", "next": {"label": "a"}},
+                {"value": "no", "next": {"label": "b"}},
+            ],
+        }
+
+    root = DecisionNode.from_dict(
+        {
+            "question": "Root?",
+            "options": [
+                {"value": "x", "next": node([{"regex": "a", "option": "yes"}])},
+                {"value": "y", "next": node([{"regex": "b", "option": "yes"}])},
+                {"value": "z", "next": node([{"regex": "b", "option": "yes"}])},
+            ],
+        }
+    )
+    tree = DecisionTree("t", root)
+    assert tree.optimization.nodes_after == 5
+    assert tree.compiled.rules[0] is None
+    assert sum(rules is not None for rules in tree.compiled.rules) == 2
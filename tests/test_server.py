@@ -0,0 +1,160 @@
+"""Tests for the micro-batching backend and the HTTP server."""
+
+import json
+import threading
+import time
+from http.client import HTTPConnection
+from typing import Iterator, List
+
+import pytest
+
+from llm_tree_classifier import instrumentation
+from llm_tree_classifier.llm.base import LLMBackend
+from llm_tree_classifier.llm.batching import MicroBatchingBackend
+from llm_tree_classifier.server import ClassificationServer, parse_args
+
+
+class SlowBatchBackend(LLMBackend):
+    """Backend that records batch sizes and takes a while per batch."""
+
+    def __init__(self) -> None:
+        self.batch_sizes: List[int] = []
+
+    def get_response(self, prompt: str, valid_responses: List[str]) -> str:
+        return self.get_responses_batch([prompt], [valid_responses])[0]
+
+    def get_responses_batch(
+        self, prompts: List[str], valid_responses_list: List[List[str]]
+    ) -> List[str]:
+        self.batch_sizes.append(len(prompts))
+        time.sleep(0.01)
+        return [options[0] for options in valid_responses_list]
+
+
+def test_micro_batching_merges_concurrent_calls() -> None:
+    """Prompts from concurrent threads are answered in shared batches."""
+    inner = SlowBatchBackend()
+    llm = MicroBatchingBackend(inner, max_batch_size=8, max_wait=0.05)
+    results: List[str] = []
+
+    def ask() -> None:
+        results.append(llm.get_response("prompt", ["yes", "no"]))
+
+    threads = [threading.Thread(target=ask) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    llm.close()
+
+    assert results == ["yes"] * 8
+    assert sum(inner.batch_sizes) == 8
+    assert len(inner.batch_sizes) < 8
+
+
+@pytest.fixture
+def server(sample_config) -> Iterator[ClassificationServer]:
+    """Serve the sample configuration on a free port.
+
+    Args:
+        sample_config: Sample tree configuration
+
+    Yields:
+        Running server
+    """
+    llm = MicroBatchingBackend(SlowBatchBackend(), max_wait=0.001)
+    server = ClassificationServer.from_config(("127.0.0.1", 0), sample_config, llm)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    llm.close()
+
+
+def request(server: ClassificationServer, method: str, path: str, body=None):
+    """Send one request to the server.
+
+    Args:
+        server: Running server
+        method: HTTP method
+        path: Request path
+        body: Optional JSON body
+
+    Returns:
+        Tuple of (status, decoded body)
+    """
+    conn = HTTPConnection(*server.server_address[:2])
+    conn.request(method, path, body=json.dumps(body) if body is not None else None)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_server_classify(server) -> None:
+    """Single and batch classify requests are answered.
+
+    Args:
+        server: Running server
+    """
+    assert request(server, "GET", "/health") == (
+        200,
+        {"status": "ok", "trees": ["test_tree"]},
+    )
+    status, body = request(server, "POST", "/classify", {"text": "hello"})
+    assert status == 200
+    assert body == {"tree": "test_tree", "classifications": ["test_tree"]}
+    status, body = request(server, "POST", "/classify", {"texts": ["a", "b"]})
+    assert body["results"] == [["test_tree"], ["test_tree"]]
+
+
+def test_server_errors(server, mocker) -> None:
+    """Malformed requests and unknown trees are rejected.
+
+    Args:
+        server: Running server
+        mocker: Pytest mocker fixture
+    """
+    assert request(server, "POST", "/classify", {"foo": 1})[0] == 400
+    assert request(server, "POST", "/classify", {"text": "a", "tree": "x"})[0] == 404
+    assert request(server, "GET", "/missing")[0] == 404
+
+    status, body = request(server, "POST", "/classify", {"text": "a", "tree": "x"})
+    assert status == 404 and "'x' not found" in body["error"]
+
+    # Unexpected errors, KeyError included, still get a JSON 500
+    mocker.patch.object(server, "classify", side_effect=KeyError("text"))
+    assert request(server, "POST", "/classify", {"text": "a"})[0] == 500
+    # Unexpected errors still get a JSON response
+    mocker.patch.object(server, "classify", side_effect=RuntimeError("boom"))
+    assert request(server, "POST", "/classify", {"text": "a"}) == (
+        500,
+        {"error": "Internal server error"},
+    )
+
+
+def test_server_metrics(server) -> None:
+    """Metrics are served when a recorder is installed.
+
+    Args:
+        server: Running server
+    """
+    assert request(server, "GET", "/metrics.json")[0] == 404
+    instrumentation.enable()
+    try:
+        status, body = request(server, "GET", "/metrics.json")
+        assert status == 200
+        assert body["nodes"] == []
+        conn = HTTPConnection(*server.server_address[:2])
+        conn.request("GET", "/metrics")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert b"llm_tree_prompt_tokens_total 0" in response.read()
+    finally:
+        instrumentation.disable()
+
+
+def test_serve_scores_batches_by_default() -> None:
+    """The server batches decoding unless grammar sampling is asked for."""
+    args = ["--config", "trees.yaml", "--model", "model.gguf"]
+    assert parse_args(args).scoring == "logprob"
+    assert parse_args([*args, "--scoring", "grammar"]).scoring == "grammar"
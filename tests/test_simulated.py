@@ -0,0 +1,50 @@
+"""Tests for the simulated backend."""
+
+import time
+
+import pytest
+
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.llm.simulated import SimulatedLLMBackend
+
+
+def test_simulated_answers_are_deterministic() -> None:
+    """Answers depend only on seed, prompt and options, not on the call path."""
+    prompts = [f"prompt {i}" for i in range(50)]
+    options = [["a", "b", "c"]] * 50
+    llm = SimulatedLLMBackend(seed=1)
+    single = [llm.get_response(p, o) for p, o in zip(prompts, options, strict=True)]
+    assert SimulatedLLMBackend(seed=1).get_responses_batch(prompts, options) == single
+    assert SimulatedLLMBackend(seed=2).get_responses_batch(prompts, options) != single
+    assert set(single) == {"a", "b", "c"}
+    for prompt, answer in zip(prompts, single, strict=True):
+        scores = llm.score_responses(prompt, ["a", "b", "c"])
+        assert max(scores, key=scores.__getitem__) == answer
+
+
+def test_simulated_answer_weights() -> None:
+    """Options are picked in proportion to their weights."""
+    llm = SimulatedLLMBackend(answer_weights=[3, 1, 0])
+    answers = [llm.get_response(f"p{i}", ["x", "y", "z", "w"]) for i in range(400)]
+    assert "z" not in answers and "w" not in answers
+    assert 250 < answers.count("x") < 350
+    with pytest.raises(ValueError):
+        SimulatedLLMBackend(answer_weights=[0, 0])
+
+
+def test_simulated_cost_and_counters(sample_config) -> None:
+    """Latency is paid per call and per token, and usage is counted.
+
+    Args:
+        sample_config: Sample tree configuration
+    """
+    llm = SimulatedLLMBackend(latency=0.02, token_latency=0.001)
+    start = time.perf_counter()
+    llm.get_responses_batch(["one two", "three"], [["a"], ["b"]])
+    assert time.perf_counter() - start >= 0.023
+    assert (llm.calls, llm.prompts, llm.tokens) == (1, 2, 3)
+
+    llm.reset_stats()
+    assert (llm.calls, llm.prompts, llm.tokens) == (0, 0, 0)
+    TreeClassifier(sample_config, llm).classify("text")
+    assert llm.calls == 0
@@ -0,0 +1,71 @@
+"""Tests for streaming JSONL classification."""
+
+import io
+import json
+
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.exceptions import LLMError
+from llm_tree_classifier.streaming import classify_jsonl
+
+
+def test_classify_jsonl(mock_llm, branching_config) -> None:
+    """Records are classified in batches and written in input order.
+
+    Args:
+        mock_llm: Mock LLM backend
+        branching_config: Tree configuration whose answer matters
+    """
+    mock_llm.get_responses_batch.side_effect = lambda prompts, options: [
+        "yes" for _ in prompts
+    ]
+    classifier = TreeClassifier(branching_config, mock_llm)
+    lines = [json.dumps({"id": i, "text": f"text {i}"}) for i in range(5)]
+    lines.insert(2, "not json")
+    lines.insert(4, json.dumps({"id": "no-text"}))
+    output = io.StringIO()
+
+    count = classify_jsonl(
+        classifier, io.StringIO("\n".join(lines) + "\n"), output, batch_size=2
+    )
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert count == 7
+    assert [r.get("id") for r in records] == [0, 1, None, 2, "no-text", 3, 4]
+    assert records[0]["classifications"] == ["test_tree"]
+    assert "error" in records[2]
+    assert "error" in records[4]
+    assert mock_llm.get_responses_batch.call_count == 4
+
+
+def test_failing_record_gets_error(mock_llm, branching_config) -> None:
+    """A record the backend rejects gets an error; its batch is retried.
+
+    Args:
+        mock_llm: Mock LLM backend
+        branching_config: Tree configuration whose answer matters
+    """
+
+    def answer(prompts, options):
+        if any("huge" in prompt for prompt in prompts):
+            raise LLMError("Prompt exceeds the context window")
+        return ["yes" for _ in prompts]
+
+    mock_llm.get_responses_batch.side_effect = answer
+    classifier = TreeClassifier(branching_config, mock_llm)
+    texts = ["text 0", "text 1", "huge text", "text 3", "text 4"]
+    lines = [json.dumps({"id": i, "text": text}) for i, text in enumerate(texts)]
+    output = io.StringIO()
+
+    count = classify_jsonl(
+        classifier, io.StringIO("\n".join(lines)), output, batch_size=4
+    )
+    assert count == 5
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [r.get("classifications") for r in records] == [
+        ["test_tree"],
+        ["test_tree"],
+        None,
+        ["test_tree"],
+        ["test_tree"],
+    ]
+    assert "context window" in records[2]["error"]
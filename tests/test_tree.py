@@ -0,0 +1,99 @@
+"""Tests for the tree module."""
+
+from llm_tree_classifier.classifier import TreeClassifier
+from llm_tree_classifier.prompts import build_prompt
+from llm_tree_classifier.tree import CompiledTree, DecisionNode, DecisionTree
+
+
+def make_tree() -> DecisionTree:
+    """Build a two-level tree.
+
+    Returns:
+        Tree whose "yes" label is reached via positive -> very
+    """
+    return DecisionTree.from_dict(
+        {
+            "name": "sentiment",
+            "root": {
+                "question": "Positive?",
+                "options": [
+                    {
+                        "value": "positive",
+                        "next": {
+                            "question": "How strongly?",
+                            "options": [
+                                {"value": "very", "next": {"label": "yes"}},
+                                {"value": "somewhat", "next": {"label": "no"}},
+                            ],
+                        },
+                    },
+                    {"value": "negative", "next": {"label": "no"}},
+                ],
+            },
+        }
+    )
+
+
+def test_compiled_tree_layout() -> None:
+    """Nodes are numbered depth-first with the root at 0.
+
+    The two "no" leaves are merged by the optimizer.
+    """
+    compiled = make_tree().compiled
+    assert len(compiled) == 4
+    assert compiled.questions[0] == "Positive?"
+    assert compiled.valid_responses[0] == ["positive", "negative"]
+    assert compiled.labels[compiled.next_node[0]["negative"]] == "no"
+    assert compiled.step(0, "unknown") == compiled.next_node[0]["positive"]
+
+
+def test_compiled_tree_shares_nodes() -> None:
+    """A node reachable along several paths is compiled once."""
+    leaf = DecisionNode(label="yes")
+    root = DecisionNode(
+        question="Q?",
+        options=[{"value": "a", "next": leaf}, {"value": "b", "next": leaf}],
+    )
+    compiled = CompiledTree("shared", root)
+    assert len(compiled) == 2
+    assert compiled.next_node[0] == {"a": 1, "b": 1}
+
+
+def test_classify_prompts(mocker) -> None:
+    """Traversal sends the text and node question to the backend.
+
+    Args:
+        mocker: Pytest mocker fixture
+    """
+    llm = mocker.Mock()
+    llm.get_response.side_effect = ["positive", "very"]
+    assert make_tree().classify("great", llm)
+    llm.get_response.assert_called_with(
+        build_prompt("great", "How strongly?"), ["very", "somewhat"]
+    )
+
+
+def test_classify_batch_levels(mocker) -> None:
+    """Batch traversal asks once per level for all pending texts.
+
+    Args:
+        mocker: Pytest mocker fixture
+    """
+    llm = mocker.Mock()
+    llm.get_responses_batch.side_effect = [
+        ["positive", "negative", "positive"],
+        ["very", "somewhat"],
+    ]
+    assert make_tree().classify_batch(["a", "b", "c"], llm) == [True, False, False]
+    assert llm.get_responses_batch.call_count == 2
+
+
+def test_classifier_warms_up_backend(branching_config, mock_llm) -> None:
+    """Loading a classifier hands every decision node to the backend once.
+
+    Args:
+        branching_config: Tree configuration whose answer matters
+        mock_llm: Mock LLM backend
+    """
+    TreeClassifier(branching_config, mock_llm)
+    mock_llm.warm_up.assert_called_once_with([("Is this a test?", ["yes", "no"])])